@@ -1,15 +1,33 @@
 """Support for XComfort Bridge."""
 import asyncio
+import importlib
 import logging
+import re
+import time
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_IP_ADDRESS,Platform
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, ServiceCall, callback
+from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.helpers import entity_registry as er
 from homeassistant.helpers.typing import ConfigType
 
-from .const import CONF_AUTH_KEY, CONF_IDENTIFIER, DOMAIN
-from .hub import XComfortHub
-
+from .const import (
+    CONF_AUTH_KEY,
+    CONF_DIMM_INTERVAL,
+    CONF_IDENTIFIER,
+    CONF_RECORD_MESSAGES,
+    CONF_WRITE_WINDOW,
+    DEFAULT_DIMM_INTERVAL,
+    DEFAULT_WRITE_WINDOW,
+    DOMAIN,
+    SERVICE_DUMP_TRACE,
+)
+from . import trace
+from .reporting import policies_from_options
+from .session import async_take
+
+# All platforms of the integration. An entry only sets up those it has entities for
 PLATFORMS = [Platform.LIGHT, Platform.CLIMATE, Platform.SENSOR, Platform.COVER]
 
 
@@ -17,43 +35,143 @@ _LOGGER = logging.getLogger(__name__)
 
 
 async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
-    """Boilerplate."""
+    """Registers the integration's services."""
     hass.data.setdefault(DOMAIN, {})
+
+    async def dump_trace(call: ServiceCall) -> None:
+        """Writes the trace of one bridge, or of all, to a file in the configuration directory."""
+        identifier = call.data.get(CONF_IDENTIFIER)
+        lines = trace.dump(identifier)
+        if call.data.get("clear", False):
+            trace.clear(identifier)
+        path = hass.config.path(f"{DOMAIN}.trace.log")
+        await hass.async_add_executor_job(_write_lines, path, lines)
+        _LOGGER.info(f"Wrote {len(lines)} trace events to {path}")
+
+    hass.services.async_register(DOMAIN, SERVICE_DUMP_TRACE, dump_trace)
     return True
 
 
+def _write_lines(path: str, lines: list) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        file.writelines(line + "\n" for line in lines)
+
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Connects to bridge and loads devices."""
+    start = time.monotonic()
+    # The hub pulls in xcomfort, rx and the crypto stack, which takes long enough
+    # to matter on slow hosts, so it is imported off the event loop
+    hub_module = await hass.async_add_executor_job(importlib.import_module, f"{__name__}.hub")
+    import_time = time.monotonic() - start
+
     config = entry.data
     identifier = str(config.get(CONF_IDENTIFIER))
     ip = str(config.get(CONF_IP_ADDRESS))
     auth_key = str(config.get(CONF_AUTH_KEY))
-
-    hub = XComfortHub(hass, identifier=identifier, ip=ip, auth_key=auth_key)
+    write_window = float(entry.options.get(CONF_WRITE_WINDOW, DEFAULT_WRITE_WINDOW))
+    dimm_interval = float(entry.options.get(CONF_DIMM_INTERVAL, DEFAULT_DIMM_INTERVAL))
+
+    hub = hub_module.XComfortHub(
+        hass,
+        identifier=identifier,
+        ip=ip,
+        auth_key=auth_key,
+        write_window=write_window,
+        entry_id=entry.entry_id,
+        dimm_interval=dimm_interval,
+        reporting=policies_from_options(entry.options),
+        # The config flow logged in already when the entry was just created
+        handoff=async_take(hass, entry.unique_id),
+    )
+    hub.timings["import"] = import_time
+    if entry.options.get(CONF_RECORD_MESSAGES, False):
+        hub.start_recording(hass.config.path(f"{DOMAIN}.{entry.entry_id}.jsonl.gz"))
     hub.start()
     hass.data[DOMAIN][entry.entry_id] = hub
 
-    await hub.load_devices()
+    # Platforms are set up while devices load, as soon as there are entities for
+    # them, and get entities as devices come in. Sensors for the bridge itself always exist
+    loading = asyncio.create_task(hub.load_devices())
+    hub.forward_platforms([Platform.SENSOR])
+
+    try:
+        await loading
+        await hub.wait_for_platforms()
+    except Exception as e:
+        loading.cancel()
+        await hub.stop()
+        # Platforms still being set up can only be unloaded once they are
+        await asyncio.gather(hub.wait_for_platforms(), return_exceptions=True)
+        await asyncio.gather(*_unload_platforms(hass, entry, hub), return_exceptions=True)
+        hass.data[DOMAIN].pop(entry.entry_id)
+        raise ConfigEntryNotReady(f"Loading devices of {identifier} failed: {e!r}") from e
+    hub.timings["setup"] = time.monotonic() - start
+    hub.log_timings()
+
+    hub.start_reconciling()
 
-    await hass.config_entries.async_forward_entry_setups (entry, PLATFORMS)
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
 
     return True
 
 
+# Unique IDs of version 1 entries that did not include the bridge identifier,
+# and would collide between bridges
+_UNSCOPED_UNIQUE_IDS = (
+    (re.compile(r"energy_(\d+)$"), "energy"),
+    (re.compile(r"energy_kwh_(\d+)$"), "energy_kwh"),
+    (re.compile(r"humidity_.*_(\d+)$"), "humidity"),
+)
+
+
+async def async_migrate_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Migrates entity unique IDs to include the bridge identifier."""
+    if entry.version == 1:
+        identifier = str(entry.data.get(CONF_IDENTIFIER))
+
+        @callback
+        def migrate(entity_entry: er.RegistryEntry):
+            for pattern, prefix in _UNSCOPED_UNIQUE_IDS:
+                if match := pattern.match(entity_entry.unique_id):
+                    return {"new_unique_id": f"{prefix}_{DOMAIN}_{identifier}-{match.group(1)}"}
+            return None
+
+        await er.async_migrate_entries(hass, entry.entry_id, migrate)
+        try:
+            hass.config_entries.async_update_entry(entry, version=2)
+        except TypeError:
+            # Home Assistant releases before 2024.1 do not update the version
+            entry.version = 2
+            hass.config_entries.async_update_entry(entry)
+        _LOGGER.info(f"Migrated {entry.title} to version 2")
+
+    return True
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Removes the topology and session caches of a deleted entry."""
+    from .hub import XComfortHub
+
+    await XComfortHub.remove_cache(hass, entry)
+
+
+async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reloads the entry when its options change."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Disconnects from bridge and removes devices loaded."""
-    hub = XComfortHub.get_hub(hass, entry)
+    hub = hass.data[DOMAIN][entry.entry_id]
     await hub.stop()
 
-    unload_ok = all(
-        await asyncio.gather(
-            *[
-                hass.config_entries.async_forward_entry_unload(entry, platform)
-                for platform in PLATFORMS
-            ]
-        )
-    )
+    unload_ok = all(await asyncio.gather(*_unload_platforms(hass, entry, hub)))
     if unload_ok:
         hass.data[DOMAIN].pop(entry.entry_id)
 
     return unload_ok
+
+
+def _unload_platforms(hass: HomeAssistant, entry: ConfigEntry, hub) -> list:
+    return [hass.config_entries.async_forward_entry_unload(entry, platform) for platform in hub.platforms]
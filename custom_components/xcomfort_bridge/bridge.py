@@ -0,0 +1,186 @@
+"""Bridge subclass used by the hub."""
+
+from __future__ import annotations
+
+import time
+
+from xcomfort.bridge import Bridge
+from xcomfort.connection import Messages
+
+from .handshake import Handshake, SessionCache, connect
+from .metrics import Metrics
+from .recorder import DIRECTION_IN, DIRECTION_OUT, MessageRecorder
+from .scheduler import CommandScheduler
+
+
+def _message_name(message_type) -> str:
+    try:
+        return Messages(message_type).name
+    except ValueError:
+        return str(message_type)
+
+
+class XComfortBridge(Bridge):
+    """Bridge that keeps the topology payloads reported over the current connection,
+    and measures the messages going in and out.
+
+    The library only keeps the objects it builds from SET_ALL_DATA, so the
+    payloads are kept here to know what the bridge reported, and to cache it.
+
+    A command's round trip is measured from sending it until the bridge reports a
+    state for the device or room it addressed.
+
+    With a recorder set, every decoded message received and every command sent
+    is recorded. With a scheduler set, commands are sent when it lets them.
+
+    The topology is complete once the bridge sent its last SET_ALL_DATA message
+    on the current connection. topology_version counts completed topologies,
+    and on_topology is called after each.
+
+    A handshake done ahead of time, e.g. by the config flow, can be set as
+    handoff, and its connection is used by the next connect instead of a new
+    handshake. With a session cache set, connects resume with the cached login
+    token, see handshake.py. Handshakes are timed per kind, resumed or full."""
+
+    def __init__(self, ip_address: str, authkey: str, session=None, metrics: Metrics | None = None):
+        super().__init__(ip_address, authkey, session)
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._pending_commands = dict()
+        self.comp_payloads = dict()
+        self.device_payloads = dict()
+        self.room_payloads = dict()
+        # Called with the devices and rooms created by each SET_ALL_DATA message
+        self.on_all_data = None
+        self.on_topology = None
+        self.topology_complete = False
+        self.topology_version = 0
+        self.connect_time = None
+        self.recorder: MessageRecorder | None = None
+        self.scheduler: CommandScheduler | None = None
+        self.handoff: Handshake | None = None
+        self.session_cache: SessionCache | None = None
+
+    async def _connect(self):
+        self.topology_complete = False
+        self.comp_payloads.clear()
+        self.device_payloads.clear()
+        self.room_payloads.clear()
+        self._pending_commands.clear()
+        start = time.monotonic()
+        if self.handoff is not None:
+            result, self.handoff = self.handoff, None
+            self.metrics.increment("connects_handed_off")
+            if self.session_cache is not None:
+                self.session_cache.update(result)
+        elif self.session_cache is not None:
+            result = await self.session_cache.connect(self._session, self.ip_address)
+        else:
+            result = await connect(self._session, self.ip_address, self.authkey)
+        kind = "resumed" if result.resumed else "full"
+        self.metrics.increment(f"handshakes_{kind}")
+        self.metrics.record(f"handshake.{kind}", result.duration)
+        self.connection = result.connection
+        self.connection_subscription = self.connection.messages.subscribe(self._onMessage)
+        self.connect_time = time.monotonic() - start
+
+    async def close(self):
+        if self.handoff is not None:
+            handoff, self.handoff = self.handoff, None
+            await handoff.connection.close()
+        await super().close()
+
+    async def send_message(self, message_type, message):
+        if self.scheduler is None:
+            await self._send_message(message_type, message)
+        else:
+            await self.scheduler.run(lambda: self._send_message(message_type, message), _target(message))
+
+    async def _send_message(self, message_type, message):
+        name = _message_name(message_type)
+        self.metrics.increment("messages_sent")
+        self.metrics.increment(f"sent.{name}")
+        if self.recorder is not None:
+            self.recorder.record(DIRECTION_OUT, {"type_int": int(message_type), "payload": message})
+        start = time.perf_counter()
+        try:
+            await super().send_message(message_type, message)
+        except Exception:
+            self.metrics.increment("send_errors")
+            raise
+        self.metrics.record("command_send", time.perf_counter() - start)
+
+        key = _target(message)
+        if key is not None:
+            self._pending_commands[key] = (name, start)
+
+    def _onMessage(self, message):
+        if self.recorder is not None:
+            self.recorder.record(DIRECTION_IN, message)
+        self.metrics.increment("messages_received")
+        self.metrics.increment(f"received.{_message_name(message.get('type_int'))}")
+        with self.metrics.timed("message_handling"):
+            super()._onMessage(message)
+
+    def _confirm_command(self, item: dict) -> None:
+        key = _target(item)
+        if self.scheduler is not None:
+            self.scheduler.confirmed(key)
+        pending = self._pending_commands.pop(key, None)
+        if pending is not None:
+            name, start = pending
+            rtt = time.perf_counter() - start
+            self.metrics.record("command_rtt", rtt)
+            self.metrics.record(f"command_rtt.{name}", rtt)
+
+    def _awaiting_states(self) -> bool:
+        return bool(self._pending_commands) or (self.scheduler is not None and self.scheduler.holding)
+
+    def _handle_SET_DEVICE_STATE(self, payload):
+        if self._awaiting_states():
+            self._confirm_command(payload)
+        super()._handle_SET_DEVICE_STATE(payload)
+
+    def _handle_SET_STATE_INFO(self, payload):
+        if self._awaiting_states():
+            for item in payload.get("item", ()):
+                self._confirm_command(item)
+        super()._handle_SET_STATE_INFO(payload)
+
+    def _handle_SET_ALL_DATA(self, payload):
+        for comp_payload in payload.get("comps", ()):
+            if "compId" in comp_payload:
+                self.comp_payloads[comp_payload["compId"]] = comp_payload
+        for device_payload in payload.get("devices", ()):
+            if "deviceId" in device_payload:
+                self.device_payloads[device_payload["deviceId"]] = device_payload
+        for room_payload in [*payload.get("rooms", ()), *payload.get("roomHeating", ())]:
+            if "roomId" in room_payload:
+                self.room_payloads.setdefault(room_payload["roomId"], dict()).update(room_payload)
+
+        if self.on_all_data is None:
+            super()._handle_SET_ALL_DATA(payload)
+        else:
+            device_ids = [
+                p.get("deviceId") for p in payload.get("devices", ()) if p.get("deviceId") not in self._devices
+            ]
+            room_ids = [p.get("roomId") for p in payload.get("rooms", ()) if p.get("roomId") not in self._rooms]
+            super()._handle_SET_ALL_DATA(payload)
+            self.on_all_data(
+                [self._devices[i] for i in device_ids if i in self._devices],
+                [self._rooms[i] for i in room_ids if i in self._rooms],
+            )
+
+        if "lastItem" in payload:
+            self.topology_complete = True
+            self.topology_version += 1
+            if self.on_topology is not None:
+                self.on_topology()
+
+
+def _target(payload: dict):
+    """The device or room a command or state item is about."""
+    if "deviceId" in payload:
+        return ("device", payload["deviceId"])
+    if "roomId" in payload:
+        return ("room", payload["roomId"])
+    return None
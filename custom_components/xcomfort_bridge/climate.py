@@ -4,7 +4,7 @@ from xcomfort.connection import Messages
 from xcomfort.bridge import Room, RctMode, RctState
 from homeassistant.components.climate import ClimateEntity
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.components.climate.const import (
     CURRENT_HVAC_HEAT,
@@ -18,7 +18,11 @@ from homeassistant.components.climate.const import (
 from homeassistant.const import TEMP_CELSIUS
 
 from .hub import XComfortHub
-from .const import DOMAIN, VERBOSE
+from .index import CAP_SETPOINT, DeviceIndex
+from .const import DOMAIN
+from .optimistic import OptimisticEntity
+from .scheduler import PrioritizedEntity
+from .trace import get_tracer
 
 SUPPORT_FLAGS = SUPPORT_TARGET_TEMPERATURE | SUPPORT_PRESET_MODE
 
@@ -26,35 +30,30 @@ SUPPORT_FLAGS = SUPPORT_TARGET_TEMPERATURE | SUPPORT_PRESET_MODE
 _LOGGER = logging.getLogger(__name__)
 
 
-def log(msg: str):
-    if VERBOSE:
-        _LOGGER.info(msg)
-
-
 async def async_setup_entry(
     hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
 ) -> None:
 
     hub = XComfortHub.get_hub(hass, entry)
+    log = get_tracer(__name__, hub.identifier)
 
-    rooms = hub.rooms
+    log("Found %s xcomfort rooms with a setpoint", len(hub.index.rooms_with(CAP_SETPOINT)))
 
-    _LOGGER.info(f"Found {len(rooms)} xcomfort rooms")
+    @callback
+    def create_rcts(batch: DeviceIndex):
+        rcts = list()
+        for room in batch.rooms_with(CAP_SETPOINT):
+            rct = HASSXComfortRcTouch(hass, hub, room)
+            rcts.append(rct)
 
-    rcts = list()
-    for room in rooms:
-        if room.state.value is not None:
-            if room.state.value.setpoint is not None:
-                # _LOGGER.info(f"Adding {room}")
-                rct = HASSXComfortRcTouch(hass, hub, room)
-                rcts.append(rct)
+        log("Added %s rc touch units", len(rcts))
+        async_add_entities(rcts)
+        return rcts
 
-    _LOGGER.info(f"Added {len(rcts)} rc touch units")
-    async_add_entities(rcts)
-    return
+    hub.add_entity_factory(create_rcts)
 
 
-class HASSXComfortRcTouch(ClimateEntity):
+class HASSXComfortRcTouch(PrioritizedEntity, OptimisticEntity, ClimateEntity):
     _attr_temperature_unit = TEMP_CELSIUS
     _attr_hvac_modes = [HVAC_MODE_AUTO]
     _attr_supported_features = SUPPORT_FLAGS
@@ -62,8 +61,10 @@ class HASSXComfortRcTouch(ClimateEntity):
     def __init__(self, hass: HomeAssistant, hub: XComfortHub, room: Room):
         self.hass = hass
         self.hub = hub
+        self.log = get_tracer(__name__, hub.identifier)
         self._room = room
         self._name = room.name
+        self.room_id = room.room_id
         self._state = None
 
         self.rctpreset = RctMode.Comfort
@@ -74,11 +75,11 @@ class HASSXComfortRcTouch(ClimateEntity):
         self._unique_id = f"climate_{DOMAIN}_{hub.identifier}-{room.room_id}"
 
     async def async_added_to_hass(self):
-        log(f"Added to hass {self._name} ")
+        self.log("Added to hass %s", self._name)
         if self._room.state is None:
-            log(f"State is null for {self._name}")
+            self.log("State is null for %s", self._name)
         else:
-            self._room.state.subscribe(lambda state: self._state_change(state))
+            self.async_on_remove(self.hub.subscribe_room(self._room, self._state_change))
 
     def _state_change(self, state):
         self._state = state
@@ -91,12 +92,26 @@ class HASSXComfortRcTouch(ClimateEntity):
             self.temperature = state.temperature
             self.currentsetpoint = state.setpoint
 
-            log(f"State changed {self._name} : {state}")
+            self.log("State changed %s : %s", self._name, state)
 
-            self.schedule_update_ha_state()
+            self.hub.schedule_write(self)
+
+    @property
+    def _ack_key(self):
+        return ("room", self.room_id)
+
+    def _reported_value(self, name, state):
+        if name == "rctpreset":
+            mode = state.raw.get("mode", state.raw.get("currentMode"))
+            return RctMode(mode) if mode is not None else None
+        return getattr(state, name)
+
+    @property
+    def _preset(self) -> RctMode:
+        return self._optimistic_value("rctpreset", self.rctpreset)
 
     async def async_set_preset_mode(self, preset_mode):
-        log(f"Set Preset mode {preset_mode}")
+        self.log("Set Preset mode %s", preset_mode)
 
         if preset_mode == "Cool":
             mode = RctMode.Cool
@@ -104,13 +119,16 @@ class HASSXComfortRcTouch(ClimateEntity):
             mode = RctMode.Eco
         if preset_mode == PRESET_COMFORT:
             mode = RctMode.Comfort
-        if self.rctpreset != mode:
-            await self._room.set_mode(mode)
-            self.rctpreset = mode
-            self.schedule_update_ha_state()
+        if self._preset != mode:
+            self._set_optimistic(rctpreset=mode)
+            try:
+                await self._room.set_mode(mode)
+            except Exception:
+                self._clear_optimistic()
+                raise
 
     async def async_set_temperature(self, **kwargs):
-        log(f"Set temperature {kwargs}")
+        self.log("Set temperature %s", kwargs)
 
         # TODO: Move everything below into Room class in xcomfort-python library.
         # Latest implementation in the base library is broken, so everything moved here
@@ -118,9 +136,8 @@ class HASSXComfortRcTouch(ClimateEntity):
         # Also consider changing the `mode` object on RoomState class to be just a number,
         # at current it is an object(possibly due to erroneous parsing of the 300/310-messages)
         setpoint = kwargs["temperature"]
-        setpointrange = self._room.bridge.rctsetpointallowedvalues[
-            RctMode(self.rctpreset)
-        ]
+        mode = self._preset
+        setpointrange = self._room.bridge.rctsetpointallowedvalues[RctMode(mode)]
 
         if setpointrange.Max < setpoint:
             setpoint = setpointrange.Max
@@ -130,14 +147,18 @@ class HASSXComfortRcTouch(ClimateEntity):
 
         payload = {
             "roomId": self._room.room_id,
-            "mode": self.rctpreset.value,
+            "mode": mode.value,
             "state": self._room.state.value.rctstate.value,
             "setpoint": setpoint,
             "confirmed": False,
         }
-        await self._room.bridge.send_message(Messages.SET_HEATING_STATE, payload)
-        self._room.modesetpoints[self.rctpreset] = setpoint
-        self.currentsetpoint = setpoint
+        self._set_optimistic(rctpreset=mode, setpoint=setpoint)
+        try:
+            await self._room.bridge.send_message(Messages.SET_HEATING_STATE, payload)
+        except Exception:
+            self._clear_optimistic()
+            raise
+        self._room.modesetpoints[mode] = setpoint
         # After moving everything to base library, ideally line below should be the entry point
         # into the library for setting target temperature.
         # await self._room.set_target_temperature(kwargs["temperature"])
@@ -191,18 +212,18 @@ class HASSXComfortRcTouch(ClimateEntity):
     def max_temp(self):
         if self._state is None:
             return 40.0
-        return self._room.bridge.rctsetpointallowedvalues[self.rctpreset].Max
+        return self._room.bridge.rctsetpointallowedvalues[self._preset].Max
 
     @property
     def min_temp(self):
         if self._state is None:
             return 5.0
-        return self._room.bridge.rctsetpointallowedvalues[self.rctpreset].Min
+        return self._room.bridge.rctsetpointallowedvalues[self._preset].Min
 
     @property
     def target_temperature(self):
         """Returns the setpoint from RC touch, e.g. target_temperature"""
-        return self.currentsetpoint
+        return self._optimistic_value("setpoint", self.currentsetpoint)
 
     @property
     def preset_modes(self):
@@ -210,9 +231,10 @@ class HASSXComfortRcTouch(ClimateEntity):
 
     @property
     def preset_mode(self):
-        if self.rctpreset == RctMode.Cool:
+        preset = self._preset
+        if preset == RctMode.Cool:
             return "Cool"
-        if self.rctpreset == RctMode.Eco:
+        if preset == RctMode.Eco:
             return PRESET_ECO
-        if self.rctpreset == RctMode.Comfort:
+        if preset == RctMode.Comfort:
             return PRESET_COMFORT
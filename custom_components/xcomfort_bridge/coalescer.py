@@ -0,0 +1,61 @@
+"""Coalesces Home Assistant state writes of xComfort entities."""
+
+from __future__ import annotations
+
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.entity import Entity
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class StateWriteCoalescer:
+    """Collects state writes requested within a window and flushes them in one callback.
+
+    An entity that requests several writes before the flush is written once,
+    with whatever state it has at flush time."""
+
+    def __init__(self, hass: HomeAssistant, window: float):
+        self.hass = hass
+        self.window = window
+        self._pending = dict()
+        self._handle = None
+        self.requested = 0
+        self.written = 0
+
+    @callback
+    def schedule(self, entity: Entity) -> None:
+        """Marks entity as needing a state write."""
+        self.requested += 1
+        # Entity defines __eq__ but not __hash__, so its instances are not
+        # hashable, and are indexed by identity
+        self._pending[id(entity)] = entity
+        if self._handle is None:
+            if self.window > 0:
+                self._handle = self.hass.loop.call_later(self.window, self.flush)
+            else:
+                self._handle = self.hass.loop.call_soon(self.flush)
+
+    @callback
+    def flush(self) -> None:
+        """Writes the state of every pending entity."""
+        self._handle = None
+        pending, self._pending = self._pending, dict()
+        for entity in pending.values():
+            # Entity may have been removed, or not added yet, since it was scheduled
+            if entity.hass is None or entity.entity_id is None:
+                continue
+            try:
+                entity.async_write_ha_state()
+                self.written += 1
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception(f"Error writing state of {entity.entity_id}")
+
+    @callback
+    def cancel(self) -> None:
+        """Drops pending writes."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._pending.clear()
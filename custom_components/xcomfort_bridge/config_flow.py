@@ -16,7 +16,18 @@ from homeassistant.core import callback
 from homeassistant.helpers import aiohttp_client, config_validation as cv
 from homeassistant.helpers.typing import ConfigType
 
-from .const import CONF_AUTH_KEY, CONF_IDENTIFIER, DOMAIN
+from .session import ConnectError, async_connect, async_hand_off
+from .const import (
+    CONF_AUTH_KEY,
+    CONF_DIMM_INTERVAL,
+    CONF_IDENTIFIER,
+    CONF_RECORD_MESSAGES,
+    CONF_WRITE_WINDOW,
+    DEFAULT_DIMM_INTERVAL,
+    DEFAULT_REPORTING,
+    DEFAULT_WRITE_WINDOW,
+    DOMAIN,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -24,7 +35,7 @@ _LOGGER = logging.getLogger(__name__)
 @config_entries.HANDLERS.register(DOMAIN)
 class XComfortBridgeConfigFlow(config_entries.ConfigFlow):
 
-    VERSION = 1
+    VERSION = 2
     CONNECTION_CLASS = config_entries.CONN_CLASS_LOCAL_PUSH
 
     def __init__(self):
@@ -32,11 +43,8 @@ class XComfortBridgeConfigFlow(config_entries.ConfigFlow):
 
     async def async_step_user(self, user_input=None):
 
-        entries = self.hass.config_entries.async_entries(DOMAIN)
-        if entries:
-            return self.async_abort(reason="already_setup")
-
         errors = {}
+        placeholders = {"error": ""}
 
         if user_input is not None:
 
@@ -44,12 +52,36 @@ class XComfortBridgeConfigFlow(config_entries.ConfigFlow):
             self.data[CONF_AUTH_KEY] = user_input[CONF_AUTH_KEY]
             self.data[CONF_IDENTIFIER] = user_input.get(CONF_IDENTIFIER)
 
+            # Each bridge is its own entry
             await self.async_set_unique_id(self.data[CONF_IP_ADDRESS])
-
-            return self.async_create_entry(
-                title=f"{user_input[CONF_IP_ADDRESS]}",
-                data=user_input,
-            )
+            self._abort_if_unique_id_configured()
+
+            # The identifier is part of the unique IDs of the bridge's entities
+            identifiers = [
+                entry.data.get(CONF_IDENTIFIER) for entry in self.hass.config_entries.async_entries(DOMAIN)
+            ]
+            if self.data[CONF_IDENTIFIER] in identifiers:
+                if self.source == config_entries.SOURCE_IMPORT:
+                    return self.async_abort(reason="identifier_in_use")
+                errors[CONF_IDENTIFIER] = "identifier_in_use"
+            else:
+                try:
+                    handshake = await async_connect(
+                        self.hass, self.data[CONF_IP_ADDRESS], self.data[CONF_AUTH_KEY]
+                    )
+                except ConnectError as e:
+                    _LOGGER.debug(f"Validating bridge {self.data[CONF_IP_ADDRESS]} failed: {e}")
+                    if self.source == config_entries.SOURCE_IMPORT:
+                        return self.async_abort(reason=e.reason, description_placeholders={"error": e.detail})
+                    errors["base"] = e.reason
+                    placeholders["error"] = e.detail
+                else:
+                    # The entry's setup goes on with the connection, instead of logging in again
+                    async_hand_off(self.hass, self.unique_id, handshake)
+                    return self.async_create_entry(
+                        title=f"{user_input[CONF_IP_ADDRESS]}",
+                        data=user_input,
+                    )
 
         data_schema = {
             vol.Required(CONF_IP_ADDRESS): str,
@@ -58,8 +90,61 @@ class XComfortBridgeConfigFlow(config_entries.ConfigFlow):
         }
 
         return self.async_show_form(
-            step_id="user", data_schema=vol.Schema(data_schema), errors=errors
+            step_id="user",
+            data_schema=vol.Schema(data_schema),
+            errors=errors,
+            description_placeholders=placeholders,
         )
 
     async def async_step_import(self, import_data: dict):
         return await self.async_step_user(import_data)
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        return XComfortBridgeOptionsFlow(config_entry)
+
+
+class XComfortBridgeOptionsFlow(config_entries.OptionsFlow):
+    def __init__(self, config_entry):
+        self.config_entry = config_entry
+
+    async def async_step_init(self, user_input=None):
+        if user_input is not None:
+            self._options = user_input
+            return await self.async_step_reporting()
+
+        options = self.config_entry.options
+        data_schema = {
+            vol.Optional(
+                CONF_WRITE_WINDOW,
+                default=options.get(CONF_WRITE_WINDOW, DEFAULT_WRITE_WINDOW),
+            ): vol.All(vol.Coerce(float), vol.Range(min=0, max=5)),
+            vol.Optional(
+                CONF_DIMM_INTERVAL,
+                default=options.get(CONF_DIMM_INTERVAL, DEFAULT_DIMM_INTERVAL),
+            ): vol.All(vol.Coerce(float), vol.Range(min=0, max=5)),
+            vol.Optional(
+                CONF_RECORD_MESSAGES,
+                default=options.get(CONF_RECORD_MESSAGES, False),
+            ): bool,
+        }
+
+        return self.async_show_form(step_id="init", data_schema=vol.Schema(data_schema))
+
+    async def async_step_reporting(self, user_input=None):
+        """When sensor values are written, per sensor kind, see ReportingPolicy."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data={**self._options, **user_input})
+
+        options = self.config_entry.options
+        data_schema = {
+            vol.Optional(
+                f"{kind}_{field}",
+                default=options.get(f"{kind}_{field}", default),
+            ): vol.All(vol.Coerce(float), vol.Range(min=0))
+            for kind, defaults in DEFAULT_REPORTING.items()
+            for field, default in defaults.items()
+        }
+
+        return self.async_show_form(step_id="reporting", data_schema=vol.Schema(data_schema))
@@ -5,5 +5,68 @@ CONF_AUTH_KEY = "auth_key"
 CONF_IDENTIFIER = "identifier"
 CONF_DIMMING = "dimming"
 CONF_GATEWAYS = "gateways"
+CONF_WRITE_WINDOW = "write_window"
+CONF_DIMM_INTERVAL = "dimm_interval"
+CONF_RECORD_MESSAGES = "record_messages"
 
-VERBOSE = True
+SERVICE_DUMP_TRACE = "dump_trace"
+
+DEFAULT_WRITE_WINDOW = 0.05
+DEFAULT_DIMM_INTERVAL = 0.3
+
+# Seconds between writes of the energy total while power stays constant
+ENERGY_CHECKPOINT_INTERVAL = 60
+
+# Seconds past every full hour at which hourly room statistics are imported, see statistics.py
+STATISTICS_IMPORT_DELAY = 10
+
+# When sensor values are written, per sensor kind, see reporting.py. Deadbands are in the
+# sensor's unit (W, kWh, %), intervals in seconds. Options named <kind>_<field> override them
+REPORTING_FIELDS = ("deadband", "deadband_percent", "min_interval", "max_interval")
+DEFAULT_REPORTING = {
+    "power": {"deadband": 1.0, "deadband_percent": 0.0, "min_interval": 5.0, "max_interval": 300.0},
+    "energy": {"deadband": 0.001, "deadband_percent": 0.0, "min_interval": 10.0, "max_interval": 600.0},
+    "humidity": {"deadband": 1.0, "deadband_percent": 0.0, "min_interval": 30.0, "max_interval": 600.0},
+}
+
+# Seconds the config flow waits for the bridge to accept a login, and that the connection
+# it logged in with is kept for the setup of the entry, see session.py
+CONNECT_TIMEOUT = 10
+SESSION_HANDOFF_TIMEOUT = 60
+# Seconds a login token is reused for at most, even if the bridge accepts it for longer, see handshake.py
+SESSION_MAX_AGE = 7 * 24 * 3600
+
+# Reconnect backoff, in seconds. Backoff starts over once a connection stayed up for RECONNECT_STABLE_AFTER
+RECONNECT_INITIAL_DELAY = 1
+RECONNECT_MAX_DELAY = 300
+RECONNECT_STABLE_AFTER = 60
+
+# Seconds to wait for the bridge to report the state a command asked for, before
+# entities fall back to the reported state. Shades report when they reach their position
+ACK_TIMEOUT = 5
+SHADE_ACK_TIMEOUT = 120
+
+# Shade travel model, see travel.py. Seconds a shade is assumed to take to travel all the way
+# until it is learned, least travel in percent to learn from, and seconds between position
+# updates while a shade moves
+DEFAULT_SHADE_TRAVEL_TIME = 30
+SHADE_LEARN_MIN_TRAVEL = 20
+SHADE_PROGRESS_INTERVAL = 1
+
+# Seconds between passes comparing the entities with the devices and rooms the bridge reports.
+# Passes also run after every reconnect, and when a room reports a state it had no entity for
+TOPOLOGY_RECONCILE_INTERVAL = 60
+
+# Seconds between writes of recorded bridge messages to disk
+RECORDING_FLUSH_INTERVAL = 5
+
+# Events kept by the in-memory trace, see trace.py
+TRACE_BUFFER_SIZE = 2000
+
+# Most commands in flight at once when a room command is sent to each light
+ROOM_FANOUT_LIMIT = 4
+
+# Most commands in flight at once per bridge, see scheduler.py. A command is in flight until the
+# bridge reports the state of what it addressed, or for at most COMMAND_SLOT_TIMEOUT seconds
+COMMAND_WINDOW = 8
+COMMAND_SLOT_TIMEOUT = 1
@@ -1,8 +1,9 @@
 import asyncio
 import logging
+from datetime import timedelta
 from math import ceil
 
-from xcomfort.devices import Shade
+from xcomfort.devices import Shade, ShadeOperationState
 
 from homeassistant.components.cover import (
     ATTR_POSITION,
@@ -11,19 +12,26 @@ from homeassistant.components.cover import (
     CoverEntity,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.restore_state import RestoredExtraData, RestoreEntity
 
-from .const import DOMAIN, VERBOSE
+from .const import DOMAIN, SHADE_ACK_TIMEOUT, SHADE_PROGRESS_INTERVAL
 from .hub import XComfortHub
+from .index import DeviceIndex
+from .optimistic import OptimisticEntity
+from .scheduler import PrioritizedEntity
+from .trace import get_tracer
+from .travel import TravelModel
 
 _LOGGER = logging.getLogger(__name__)
 
 
-def log(msg: str):
-    if VERBOSE:
-        _LOGGER.info(msg)
+# Commands are ordered and limited by the hub's CommandScheduler, so Home
+# Assistant need not run service calls of these entities one at a time
+PARALLEL_UPDATES = 0
 
 
 # PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
@@ -37,31 +45,40 @@ async def async_setup_entry(
 ) -> None:
 
     hub = XComfortHub.get_hub(hass, entry)
+    log = get_tracer(__name__, hub.identifier)
 
-    devices = hub.devices
+    log("Found %s xcomfort shades", len(hub.index.of_type(Shade)))
 
-    _LOGGER.info(f"Found {len(devices)} xcomfort devices")
-
-    shades = list()
-    for device in devices:
-        if isinstance(device, Shade):
-            _LOGGER.info(f"Adding {device}")
+    @callback
+    def create_shades(batch: DeviceIndex):
+        shades = list()
+        for device in batch.of_type(Shade):
+            log("Adding %s", device)
             shade = HASSXComfortShade(hass, hub, device)
             shades.append(shade)
 
-    _LOGGER.info(f"Added {len(shades)} shades")
-    async_add_entities(shades)
+        log("Added %s shades", len(shades))
+        async_add_entities(shades)
+        return shades
+
+    hub.add_entity_factory(create_shades)
+
 
+class HASSXComfortShade(PrioritizedEntity, OptimisticEntity, CoverEntity, RestoreEntity):
+    """A shade, with its position estimated while it moves. See TravelModel."""
 
-class HASSXComfortShade(CoverEntity):
     def __init__(self, hass: HomeAssistant, hub: XComfortHub, device: Shade):
         self.hass = hass
         self.hub = hub
+        self.log = get_tracer(__name__, hub.identifier)
 
         self._device = device
         self._name = device.name
         self._state = None
         self.device_id = device.device_id
+        self._travel = TravelModel()
+        self._reported_operation = None
+        self._stop_progress = None
 
         self._unique_id = f"shade_{DOMAIN}_{hub.identifier}-{device.device_id}"
 
@@ -70,27 +87,105 @@ class HASSXComfortShade(CoverEntity):
         return DEVICE_CLASS_SHADE
 
     async def async_added_to_hass(self):
-        log(f"Added to hass {self._name} ")
+        self.log("Added to hass %s", self._name)
+        if (data := await self.async_get_last_extra_data()) is not None:
+            self._travel.from_dict(data.as_dict())
         if self._device.state is None:
-            log(f"State is null for {self._name}")
+            self.log("State is null for %s", self._name)
         else:
-            self._device.state.subscribe(lambda state: self._state_change(state))
+            self.async_on_remove(self.hub.subscribe_device(self._device, self._state_change))
+
+    async def async_will_remove_from_hass(self):
+        self._stop_progress_updates()
+
+    @property
+    def extra_restore_state_data(self):
+        return RestoredExtraData(self._travel.as_dict())
 
     def _state_change(self, state):
         self._state = state
 
         should_update = self._state is not None
+        if should_update:
+            self._track_travel(state)
 
-        log(f"State changed {self._name} : {state}")
+        self.log("State changed %s : %s", self._name, state)
 
         if should_update:
-            self.schedule_update_ha_state()
+            self.hub.schedule_write(self)
+
+    def _track_travel(self, state):
+        """Ends the position estimate once the bridge reports where the shade is, and
+        starts one for moves started elsewhere, like on a wall switch."""
+        previous, self._reported_operation = self._reported_operation, state.current_state
+        if self._travel.active:
+            if state.current_state == ShadeOperationState.STOP or state.position != self._travel.start_position:
+                if self._travel.finish(state.position):
+                    self.log("Learned travel times of %s: %s", self._name, self._travel.as_dict())
+                self._stop_progress_updates()
+        elif state.current_state != previous and state.current_state in (
+            ShadeOperationState.OPEN,
+            ShadeOperationState.CLOSE,
+        ):
+            self._travel.start(state.position, 0 if state.current_state == ShadeOperationState.OPEN else 100)
+            self._start_progress_updates()
+
+    @callback
+    def _start_progress_updates(self):
+        if self._travel.moving and self._stop_progress is None:
+            self._stop_progress = async_track_time_interval(
+                self.hass, self._progress, timedelta(seconds=SHADE_PROGRESS_INTERVAL)
+            )
+
+    @callback
+    def _stop_progress_updates(self):
+        if self._stop_progress is not None:
+            self._stop_progress()
+            self._stop_progress = None
+
+    @callback
+    def _progress(self, now=None):
+        """Writes the estimated position while the shade moves."""
+        if not self._travel.moving or self._travel.arrived():
+            self._stop_progress_updates()
+        self.hub.schedule_write(self)
+
+    @callback
+    def _optimistic_done(self, confirmed: bool) -> None:
+        if not confirmed:
+            # The bridge never reported the move, so go back to what it did report
+            self._travel.cancel()
+            self._stop_progress_updates()
+        super()._optimistic_done(confirmed)
 
     @property
-    def is_closed(self) -> bool | None:
+    def _ack_key(self):
+        return ("device", self.device_id)
+
+    @property
+    def _position(self) -> int | None:
+        """The position in xcomfort terms, 0 being open and 100 closed."""
         if not self._state:
             return None
-        return self._state.is_closed
+        estimate = self._travel.position()
+        if estimate is not None:
+            return estimate
+        return self._optimistic_value("position", self._state.position)
+
+    @property
+    def is_closed(self) -> bool | None:
+        position = self._position
+        if position is None or 0 < position < 100:
+            return None
+        return position == 100
+
+    @property
+    def is_opening(self) -> bool:
+        return self._travel.opening
+
+    @property
+    def is_closing(self) -> bool:
+        return self._travel.closing
 
     @property
     def device_info(self):
@@ -127,33 +222,56 @@ class HASSXComfortShade(CoverEntity):
 
     async def async_open_cover(self, **kwargs):
         """Open the cover."""
-        await self._device.move_up()
-    
+        await self._move(0, self._device.move_up())
+
     async def async_close_cover(self, **kwargs):
         """Close cover."""
-        await self._device.move_down()
+        await self._move(100, self._device.move_down())
 
     async def async_stop_cover(self, **kwargs):
         """Stop the cover."""
+        # Where it stops is only known once the shade reports it, until then it is estimated
+        self._travel.stop()
+        self._stop_progress_updates()
+        if self._optimistic is not None:
+            self._clear_optimistic()
+        else:
+            self.hub.schedule_write(self)
         await self._device.move_stop()
 
+    async def _move(self, position: int, command):
+        """Sends command, showing position until the shade reports reaching it."""
+        if self._state and self._state.is_safety_enabled:
+            # The library drops commands while safety is on
+            command.close()
+            return
+        self._travel.start(self._position, position)
+        self._set_optimistic(timeout=SHADE_ACK_TIMEOUT, position=position)
+        self._start_progress_updates()
+        try:
+            await command
+        except Exception:
+            self._travel.cancel()
+            self._stop_progress_updates()
+            self._clear_optimistic()
+            raise
+
     def update(self):
         pass
 
     @property
     def current_cover_position(self) -> int | None:
-        if self._state:
-            if self._state.position is None:
-                return None  # Return None if position is NoneType
-            # xcomfort interprets 90% to be almost fully closed,
-            # while HASS UI makes 90% look almost open, so we
-            # invert.
-            return 100 - self._state.position
-        return None  # Return None if _state is falsy or does not exist
+        position = self._position
+        if position is None:
+            return None
+        # xcomfort interprets 90% to be almost fully closed,
+        # while HASS UI makes 90% look almost open, so we
+        # invert.
+        return 100 - position
 
     async def async_set_cover_position(self, **kwargs) -> None:
         """Move the cover to a specific position."""
         if (position := kwargs.get(ATTR_POSITION)) is not None:
             # See above comment
             position = 100 - position
-            await self._device.move_to_position(position)
+            await self._move(position, self._device.move_to_position(position))
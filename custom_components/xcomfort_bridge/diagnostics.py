@@ -0,0 +1,23 @@
+"""Diagnostics support for xComfort Bridge."""
+
+from __future__ import annotations
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import CONF_AUTH_KEY
+from .hub import XComfortHub
+from .trace import dump
+
+TO_REDACT = {CONF_AUTH_KEY}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    """Returns diagnostics for a config entry."""
+    hub = XComfortHub.get_hub(hass, entry)
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "hub": hub.diagnostics(),
+        "trace": dump(hub.identifier),
+    }
@@ -0,0 +1,153 @@
+"""Energy integration of xComfort room power readings."""
+
+from __future__ import annotations
+
+import time
+from typing import Callable
+
+# Watt seconds per kWh
+WS_PER_KWH = 3600 * 1000
+
+METHOD_LEFT = "left"
+METHOD_TRAPEZOIDAL = "trapezoidal"
+
+
+class EnergyIntegrator:
+    """Accumulates energy in kWh from a series of power readings in W.
+
+    Every reading closes the interval since the previous one. With the left
+    rule the power of the previous reading applies to the whole interval, which
+    is exact for power that changes in steps, like switched loads. The
+    trapezoidal rule averages both readings, for power that ramps.
+
+    Timestamps default to a monotonic clock, but can be passed explicitly to
+    integrate a recorded or synthetic trace."""
+
+    def __init__(
+        self,
+        method: str = METHOD_LEFT,
+        total: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if method not in (METHOD_LEFT, METHOD_TRAPEZOIDAL):
+            raise ValueError(f"Unknown integration method {method}")
+        self.method = method
+        self.total = total
+        self._clock = clock
+        self._power = None
+        self._time = None
+
+    @property
+    def power(self) -> float | None:
+        """The last power reading."""
+        return self._power
+
+    def update(self, power: float | None, now: float | None = None) -> float:
+        """Adds the energy up to now and makes power the current reading. Returns the total.
+        A reading of None is ignored."""
+        if power is None:
+            return self.total
+        if now is None:
+            now = self._clock()
+
+        if self._power is not None and now > self._time:
+            if self.method == METHOD_TRAPEZOIDAL:
+                average = (self._power + power) / 2
+            else:
+                average = self._power
+            self.total += average * (now - self._time) / WS_PER_KWH
+
+        self._power = power
+        if self._time is None or now > self._time:
+            self._time = now
+        return self.total
+
+    def advance(self, now: float | None = None) -> float:
+        """Adds the energy up to now at the current power, e.g. for a periodic checkpoint."""
+        return self.update(self._power, now)
+
+
+HOUR = 3600
+
+
+class HourlyEnergy:
+    """Collects power readings into hourly buckets of energy and power statistics.
+
+    Like EnergyIntegrator with the left rule, the power of a reading applies
+    until the next one, and an interval spanning several hours is split over
+    them. Except after pause, e.g. while the bridge is unreachable: what the
+    power was then is not known, so those hours get no bucket, rather than one
+    made up from the last reading.
+
+    Buckets follow wall clock hours, so timestamps are POSIX seconds. They
+    default to time.time, but can be passed explicitly."""
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._power = None
+        self._time = None
+        # Hour start -> [Ws, seconds covered, min W, max W]
+        self._buckets = dict()
+
+    def update(self, power: float | None, now: float | None = None) -> None:
+        """Adds the energy up to now and makes power the current reading.
+        A reading of None is ignored."""
+        if power is None:
+            return
+        if now is None:
+            now = self._clock()
+        self.advance(now)
+        self._power = power
+        if self._time is None or now > self._time:
+            self._time = now
+
+    def advance(self, now: float | None = None) -> None:
+        """Adds the energy up to now at the current power."""
+        if now is None:
+            now = self._clock()
+        if self._power is None or now <= self._time:
+            return
+        start = self._time
+        while start < now:
+            hour = start - start % HOUR
+            end = min(now, hour + HOUR)
+            bucket = self._buckets.get(hour)
+            if bucket is None:
+                bucket = self._buckets[hour] = [0.0, 0.0, self._power, self._power]
+            bucket[0] += self._power * (end - start)
+            bucket[1] += end - start
+            bucket[2] = min(bucket[2], self._power)
+            bucket[3] = max(bucket[3], self._power)
+            start = end
+        self._time = now
+
+    def pause(self, now: float | None = None) -> None:
+        """Adds the energy up to now, and nothing more until the next reading."""
+        self.advance(now)
+        self._power = None
+
+    def take(self, now: float | None = None, include_current: bool = False) -> list[dict]:
+        """Removes and returns the buckets of the hours that ended by now, oldest
+        first, with the current hour too if include_current. Each has the hour's
+        start, its energy in kWh, the seconds of it with readings, and the mean,
+        min and max power in W over those."""
+        if now is None:
+            now = self._clock()
+        self.advance(now)
+        current = now - now % HOUR
+        taken = list()
+        for hour in sorted(self._buckets):
+            if hour >= current and not include_current:
+                break
+            ws, seconds, low, high = self._buckets.pop(hour)
+            taken.append(
+                {
+                    "start": hour,
+                    "energy": ws / WS_PER_KWH,
+                    "seconds": seconds,
+                    "mean": ws / seconds if seconds else self._power,
+                    "min": low,
+                    "max": high,
+                }
+            )
+        return taken
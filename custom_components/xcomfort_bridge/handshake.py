@@ -0,0 +1,286 @@
+"""The bridge handshake, resuming with a cached login token where it can."""
+
+from __future__ import annotations
+
+import json
+import time
+from base64 import b64decode, b64encode
+
+from Crypto.Cipher import AES, PKCS1_v1_5
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import RSA
+from Crypto.Random import get_random_bytes
+from xcomfort.connection import SecureBridgeConnection, generateSalt, hash as password_hash
+from xcomfort.messages import Messages
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, SESSION_MAX_AGE
+from .trace import get_tracer
+
+SESSION_STORAGE_VERSION = 1
+
+# The client the library connects as
+_CLIENT = {"client_type": "shl-app", "client_id": "c956e43f999f8004", "client_version": "3.0.0"}
+
+
+class HandshakeError(Exception):
+    """The bridge did not complete the handshake. The reason is an error key of the
+    config flow, detail what the bridge said, if anything."""
+
+    def __init__(self, reason: str, detail: str = ""):
+        super().__init__(f"{reason}: {detail}" if detail else reason)
+        self.reason = reason
+        self.detail = detail
+
+
+class TokenRejected(HandshakeError):
+    """The bridge did not accept a cached login token."""
+
+
+class Handshake:
+    """A completed handshake: the connection, ready to pump, the login token it
+    applied and the seconds the bridge accepts that for, whether it resumed with
+    a cached token, and how long it took."""
+
+    def __init__(self, connection, device_id: str, token: str, remaining, resumed: bool, duration: float):
+        self.connection = connection
+        self.device_id = device_id
+        self.token = token
+        self.remaining = remaining
+        self.resumed = resumed
+        self.duration = duration
+
+
+async def connect(session, ip_address: str, auth_key: str, resume: tuple[str, str] | None = None) -> Handshake:
+    """Connects to the bridge at ip_address, sets up the encrypted session, and
+    logs in with auth_key. With resume, the (device id, token) of an earlier login
+    to the same bridge, the token is applied instead of logging in again, which
+    saves three round trips. Raises TokenRejected if it is not accepted anymore,
+    or the bridge fails the handshake once it was applied.
+
+    Does what xcomfort's setup_secure_connection does, which keeps the token to itself."""
+    start = time.monotonic()
+    ws = await session.ws_connect(f"http://{ip_address}/")
+    try:
+        msg = await _receive_plain(ws)
+        if msg["type_int"] == Messages.NACK:
+            # E.g. "no client-connection available (all used)!"
+            raise HandshakeError("bridge_refused", msg.get("info", ""))
+        device_id = msg["payload"]["device_id"]
+
+        await _send_plain(
+            ws,
+            {
+                "type_int": Messages.CONNECTION_CONFIRM,
+                "mc": -1,
+                "payload": {**_CLIENT, "connection_id": msg["payload"]["connection_id"]},
+            },
+        )
+        msg = await _receive_plain(ws)
+        if msg["type_int"] == Messages.CONNECTION_DECLINED:
+            raise HandshakeError("bridge_refused", msg["payload"].get("error_message", ""))
+
+        await _send_plain(ws, {"type_int": Messages.SC_INIT, "mc": -1})
+        msg = await _receive_plain(ws)
+        rsa = RSA.import_key(msg["payload"]["public_key"])
+        key = get_random_bytes(32)
+        iv = get_random_bytes(16)
+        secret = PKCS1_v1_5.new(rsa).encrypt(f"{key.hex()}:::{iv.hex()}".encode())
+        await _send_plain(
+            ws, {"type_int": Messages.SC_SECRET, "mc": -1, "payload": {"secret": b64encode(secret).decode()}}
+        )
+
+        connection = SecureBridgeConnection(ws, key, iv, device_id)
+        msg = await connection.receive()
+        if msg.get("type_int") != Messages.SC_ESTABLISHED:
+            raise HandshakeError("handshake_failed", "Failed to establish secure connection")
+
+        if resume is not None and resume[0] == device_id:
+            token = resume[1]
+            try:
+                remaining = await _apply_token(connection, token)
+            except (HandshakeError, KeyError, TypeError, ValueError) as e:
+                # A bridge that closes the connection, or answers something
+                # else, has not accepted the token either
+                raise TokenRejected("token_rejected", repr(e)) from e
+            if remaining is None:
+                raise TokenRejected("token_rejected")
+            resumed = True
+        else:
+            token, remaining = await _login(connection, device_id, auth_key)
+            resumed = False
+    except HandshakeError:
+        await ws.close()
+        raise
+    except (KeyError, TypeError, ValueError) as e:
+        # Not what a bridge says
+        await ws.close()
+        raise HandshakeError("handshake_failed", repr(e)) from e
+    except BaseException:
+        await ws.close()
+        raise
+
+    return Handshake(connection, device_id, token, remaining, resumed, time.monotonic() - start)
+
+
+async def _login(connection, device_id: str, auth_key: str) -> tuple[str, int | None]:
+    salt = generateSalt()
+    await connection.send_message(
+        Messages.AUTH_LOGIN,
+        {
+            "username": "default",
+            "password": password_hash(device_id.encode(), auth_key.encode(), salt.encode()),
+            "salt": salt,
+        },
+    )
+    msg = await connection.receive()
+    if msg.get("type_int") != Messages.AUTH_LOGIN_SUCCESS:
+        raise HandshakeError("invalid_auth")
+
+    token = msg["payload"]["token"]
+    await _apply_token(connection, token)
+
+    # Like the app, log in with a renewed token
+    await connection.send_message(Messages.AUTH_RENEW_TOKEN, {"token": token})
+    msg = await connection.receive()
+    if msg.get("type_int") != Messages.AUTH_RENEW_TOKEN_RESPONSE:
+        raise HandshakeError("invalid_auth")
+
+    token = msg["payload"]["token"]
+    return token, await _apply_token(connection, token)
+
+
+async def _apply_token(connection, token: str) -> int | None:
+    """Applies token, and returns the seconds it stays valid, or None if it is not."""
+    await connection.send_message(Messages.AUTH_APPLY_TOKEN, {"token": token})
+    # {"type_int":34,"mc":-1,"payload":{"valid":true,"remaining":8640000}}
+    msg = await connection.receive()
+    payload = msg.get("payload") or {}
+    if msg.get("type_int") != Messages.AUTH_APPLY_TOKEN_RESPONSE or not payload.get("valid", False):
+        return None
+    return payload.get("remaining")
+
+
+async def _receive_plain(ws) -> dict:
+    msg = await ws.receive()
+    if not isinstance(msg.data, str):
+        raise HandshakeError("handshake_failed", f"Connection closed ({msg.type!r})")
+    return json.loads(msg.data[:-1])
+
+
+async def _send_plain(ws, data: dict) -> None:
+    await ws.send_str(json.dumps(data))
+
+
+class SessionCache:
+    """The login token of one bridge, kept so connects resume instead of logging in.
+
+    The token is stored encrypted with a key derived from the auth key, so it is
+    only used with the auth key it was issued for, and expires when the bridge
+    said it would, or after SESSION_MAX_AGE seconds, whichever is sooner. A token
+    the bridge rejects is dropped, and the connect falls back to a full login."""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, auth_key: str, context: str | None = None):
+        self.log = get_tracer(__name__, context)
+        self._store = Store(hass, SESSION_STORAGE_VERSION, storage_key(entry_id), private=True)
+        self._auth_key = auth_key
+        self._loaded = False
+        self._dirty = False
+        self.device_id = None
+        self.token = None
+        self.expires = 0.0
+
+    @property
+    def valid(self) -> bool:
+        return self.token is not None and time.time() < self.expires
+
+    async def connect(self, session, ip_address: str) -> Handshake:
+        """Resumes with the cached token if there is a valid one, else logs in, and caches the token."""
+        if not self._loaded:
+            await self._load()
+
+        result = None
+        if self.valid:
+            try:
+                result = await connect(session, ip_address, self._auth_key, (self.device_id, self.token))
+            except TokenRejected:
+                self.log("cached token of %s was rejected", ip_address)
+                self.forget()
+        if result is None:
+            result = await connect(session, ip_address, self._auth_key)
+        self.update(result)
+        return result
+
+    def update(self, result: Handshake) -> None:
+        """Caches the token of a handshake, instead of the stored one."""
+        self._loaded = True
+        max_age = SESSION_MAX_AGE if result.remaining is None else min(result.remaining, SESSION_MAX_AGE)
+        if result.resumed and result.token == self.token:
+            # The bridge counts down from the original login
+            self.expires = min(self.expires, time.time() + max_age)
+        else:
+            self.expires = time.time() + max_age
+        self.device_id = result.device_id
+        self.token = result.token
+        self._save()
+
+    def forget(self) -> None:
+        self.device_id = None
+        self.token = None
+        self.expires = 0.0
+        self._save()
+
+    async def flush(self) -> None:
+        """Writes a token not saved yet, so a reload of the entry resumes with it."""
+        if self._dirty:
+            self._dirty = False
+            await self._store.async_save(self._data())
+
+    def _save(self) -> None:
+        self._dirty = True
+        self._store.async_delay_save(self._flushed_data, 1)
+
+    def _flushed_data(self) -> dict:
+        self._dirty = False
+        return self._data()
+
+    async def _load(self) -> None:
+        self._loaded = True
+        data = await self._store.async_load()
+        if not data or data.get("expires", 0) <= time.time():
+            return
+        try:
+            cipher = AES.new(
+                self._key(b64decode(data["salt"])), AES.MODE_GCM, nonce=b64decode(data["nonce"])
+            )
+            session = json.loads(cipher.decrypt_and_verify(b64decode(data["data"]), b64decode(data["tag"])))
+        except (KeyError, ValueError) as e:
+            # E.g. stored with another auth key
+            self.log("cached session not usable: %r", e)
+            return
+        self.device_id = session["device_id"]
+        self.token = session["token"]
+        self.expires = data["expires"]
+
+    def _data(self) -> dict:
+        if self.token is None:
+            return {}
+        salt = get_random_bytes(16)
+        cipher = AES.new(self._key(salt), AES.MODE_GCM)
+        data, tag = cipher.encrypt_and_digest(json.dumps({"device_id": self.device_id, "token": self.token}).encode())
+        return {
+            "expires": self.expires,
+            "salt": b64encode(salt).decode(),
+            "nonce": b64encode(cipher.nonce).decode(),
+            "data": b64encode(data).decode(),
+            "tag": b64encode(tag).decode(),
+        }
+
+    def _key(self, salt: bytes) -> bytes:
+        return SHA256.new(salt + self._auth_key.encode()).digest()
+
+
+def storage_key(entry_id: str) -> str:
+    return f"{DOMAIN}.{entry_id}.session"
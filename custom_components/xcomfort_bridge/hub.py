@@ -4,69 +4,626 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from typing import List
+import time
+from datetime import timedelta
+from typing import Callable
 
-from xcomfort.bridge import Bridge, State
-from xcomfort.devices import Light, LightState
+from xcomfort.devices import Light, RcTouch, Shade
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP, Platform
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
 
-from .const import DOMAIN, VERBOSE
+from .bridge import XComfortBridge
+from .coalescer import StateWriteCoalescer
+from .handshake import SESSION_STORAGE_VERSION, Handshake, SessionCache, storage_key as session_storage_key
+from .index import CAP_POWER, CAP_SETPOINT, CAP_TEMPERATURE, DeviceIndex, room_capabilities, state_capabilities
+from .metrics import Metrics
+from .optimistic import AckTracker
+from .recorder import MessageRecorder
+from .reporting import ReportingPolicy, policies_from_options
+from .scheduler import CommandScheduler
+from .supervisor import STATE_CONNECTED, ConnectionSupervisor
+from .const import (
+    DEFAULT_DIMM_INTERVAL,
+    DEFAULT_WRITE_WINDOW,
+    DOMAIN,
+    RECORDING_FLUSH_INTERVAL,
+    TOPOLOGY_RECONCILE_INTERVAL,
+)
+from .throttle import LatestValueSender
+from . import trace
+from .trace import get_tracer
+from .topology import (
+    DEVICE_IDENTITY,
+    ROOM_IDENTITY,
+    diff_payloads,
+    restore_topology,
+    snapshot_topology,
+)
+
+TOPOLOGY_STORAGE_VERSION = 1
 
 _LOGGER = logging.getLogger(__name__)
 
-"""Logging function."""
-def log(msg: str):
-    if VERBOSE:
-        _LOGGER.info(msg)
+
+def platforms_for(index: DeviceIndex) -> set:
+    """The platforms with entities for the devices and rooms of index."""
+    platforms = set()
+    if index.has_type(Light):
+        platforms.add(Platform.LIGHT)
+    if index.has_type(Shade):
+        platforms.add(Platform.COVER)
+    if index.rooms_with(CAP_SETPOINT):
+        platforms.add(Platform.CLIMATE)
+    if index.has_type(RcTouch) or index.rooms_with(CAP_POWER) or index.rooms_with(CAP_TEMPERATURE):
+        platforms.add(Platform.SENSOR)
+    return platforms
 
 
 """Wrapper class over bridge library to emulate hub."""
 class XComfortHub:
-    def __init__(self, hass: HomeAssistant, identifier: str, ip: str, auth_key: str):
-        """Initialize underlying bridge"""
-        bridge = Bridge(ip, auth_key)
-        self.bridge = bridge
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        identifier: str,
+        ip: str,
+        auth_key: str,
+        write_window: float = DEFAULT_WRITE_WINDOW,
+        entry_id: str | None = None,
+        dimm_interval: float = DEFAULT_DIMM_INTERVAL,
+        reporting: dict[str, ReportingPolicy] | None = None,
+        handoff: Handshake | None = None,
+    ):
+        """Initialize underlying bridge. A handshake done already, e.g. by the
+        config flow, is used for the first connect."""
         self.identifier = identifier
         if self.identifier is None:
             self.identifier = ip
+        # Events of this hub, and of its entities, are traced with its identifier,
+        # to tell bridges apart
+        self.log = get_tracer(__name__, self.identifier)
+        self.metrics = Metrics()
+        bridge = XComfortBridge(ip, auth_key, metrics=self.metrics)
+        bridge.handoff = handoff
+        self.scheduler = CommandScheduler(self.metrics, context=self.identifier)
+        bridge.scheduler = self.scheduler
+        self.hass = hass
+        self.bridge = bridge
+        self.supervisor = ConnectionSupervisor(bridge, self.metrics)
         self._id = ip
-        self.devices = list()
-        log("getting event loop")
-        self._loop = asyncio.get_event_loop()
+        self.index = DeviceIndex()
+        self.entry_id = entry_id
+        # Platforms set up for the entry, see forward_platforms
+        self.platforms = set()
+        self._platform_setups = list()
+        self._store = None
+        if entry_id is not None:
+            self._store = Store(hass, TOPOLOGY_STORAGE_VERSION, f"{DOMAIN}.{entry_id}.topology")
+            # Reconnects and restarts resume with the login token of the last connect
+            bridge.session_cache = SessionCache(hass, entry_id, auth_key, self.identifier)
+        # The payloads the entities were built from, compared with what the bridge reports by reconcile
+        self._known_devices = dict()
+        self._known_rooms = dict()
+        self._known_version = 0
+        self._reconcile_task = None
+        self._reconcile_again = False
+        self._stop_reconciling = None
+        self._entity_factories = list()
+        self._entities = dict()
+        self._device_callbacks = dict()
+        self._room_callbacks = dict()
+        self._subscriptions = dict()
+        self.timings = dict()
+        self._load_start = time.monotonic()
+        self.writer = StateWriteCoalescer(hass, write_window)
+        self.acks = AckTracker(hass, self.metrics, context=self.identifier)
+        self.dimm_interval = dimm_interval
+        # Reporting policy per sensor kind, see reporting.py
+        self.reporting = reporting if reporting is not None else policies_from_options({})
+        self._dimm_senders = dict()
+        # Hourly room statistics, when the recorder is there to take them
+        self.statistics = None
+        if "recorder" in hass.config.components:
+            from .statistics import RoomStatistics
+
+            self.statistics = RoomStatistics(hass, self.identifier, self.metrics)
+            self.supervisor.add_listener(self._on_connection_state)
+        self._stop_listener = None
+        self._recording_lock = asyncio.Lock()
+        self._stop_recording_flush = None
 
     def start(self):
-        """Starts the event loop running the bridge."""
-        asyncio.create_task(self.bridge.run())
+        """Starts the supervised bridge connection."""
+        self.supervisor.start()
+        if self.statistics is not None:
+            self.statistics.start()
+            # Entries are not unloaded when Home Assistant stops, so import the current hour then
+            self._stop_listener = self.hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, self._on_hass_stop)
+
+    async def _on_hass_stop(self, event: Event) -> None:
+        self._stop_listener = None
+        await self.statistics.stop()
 
     async def stop(self):
         """Stops the bridge event loop.
         Will also shut down websocket, if open."""
-        await self.bridge.close()
+        self.bridge.on_topology = None
+        if self._stop_reconciling is not None:
+            self._stop_reconciling()
+            self._stop_reconciling = None
+        if self._reconcile_task is not None:
+            self._reconcile_task.cancel()
+            self._reconcile_task = None
+        for subscription in self._subscriptions.values():
+            subscription.dispose()
+        self._subscriptions.clear()
+        self._entity_factories.clear()
+        self._entities.clear()
+        self._device_callbacks.clear()
+        self._room_callbacks.clear()
+        self.writer.cancel()
+        self.acks.cancel()
+        self.scheduler.cancel()
+        if self._stop_listener is not None:
+            self._stop_listener()
+            self._stop_listener = None
+            await self.statistics.stop()
+        for sender in self._dimm_senders.values():
+            sender.cancel()
+        self._dimm_senders.clear()
+        await self.supervisor.stop()
+        if self.bridge.session_cache is not None:
+            await self.bridge.session_cache.flush()
+        await self.stop_recording()
+        # The trace outlives the hub, and would keep its devices referenced
+        trace.freeze(self.identifier)
 
     async def load_devices(self):
-        """Loads devices from bridge."""
-        log("loading devices")
-        devs = await self.bridge.get_devices()
-        self.devices = devs.values()
+        """Loads devices and rooms from the topology cache if there is one, else from bridge.
+        Entity factories get devices as soon as the bridge reports them, and rooms once all
+        are loaded. Call start_reconciling afterwards to follow changes, and after loading from
+        cache to catch up with the bridge."""
+        start = time.monotonic()
+        cached = None
+        if self._store is not None:
+            cached = await self._store.async_load()
+        self.timings["cache_load"] = time.monotonic() - start
+
+        if cached is not None:
+            self.log("loading devices and rooms from cache")
+            restore_topology(self.bridge, cached)
+            self._known_devices = {p["deviceId"]: p for p in cached.get("devices", ())}
+            self._known_rooms = {p["roomId"]: p for p in cached.get("rooms", ())}
+            self._update_topology()
+            self._add_to_platforms(self.index)
+            self.timings["cache_restore"] = time.monotonic() - start
+            self.log("loaded %s devices and %s rooms from cache", len(self.index.devices), len(self.index.rooms))
+            return
+
+        self.log("loading devices and rooms")
+        self._load_start = start
+        self.bridge.on_all_data = self._on_all_data
+        try:
+            devs, rooms = await asyncio.gather(self.bridge.get_devices(), self.bridge.get_rooms())
+        finally:
+            self.bridge.on_all_data = None
+
+        # Pick up anything the library created outside of SET_ALL_DATA
+        self._add_devices([device for device in devs.values() if device.device_id not in self.index.devices])
+        self.log("loaded %s devices", len(self.index.devices))
+
+        self.index.add(rooms=rooms.values())
+        self._add_to_platforms(DeviceIndex(rooms=rooms.values()))
+        self.timings["rooms"] = time.monotonic() - start
+        self.log("loaded %s rooms", len(self.index.rooms))
+
+        self._known_version = self.bridge.topology_version
+        self._known_devices, self._known_rooms = self._reported_topology()
+        await self._save_topology()
+        self.timings["load"] = time.monotonic() - start
+
+    @callback
+    def _on_all_data(self, devices: list, rooms: list) -> None:
+        """Streams devices to the platforms as SET_ALL_DATA messages come in."""
+        if devices and "first_devices" not in self.timings:
+            self.timings["first_devices"] = time.monotonic() - self._load_start
+        self._add_devices(devices)
+
+    def _add_devices(self, devices: list) -> None:
+        if devices:
+            self.index.add(devices)
+            self._add_to_platforms(DeviceIndex(devices))
+            self.timings["devices"] = time.monotonic() - self._load_start
+
+    def log_timings(self) -> None:
+        """Logs how long each startup phase took."""
+        if self.bridge.connect_time is not None:
+            self.timings["connect"] = self.bridge.connect_time
+        self.log("startup timings: %s", ", ".join(f"{k} {v:.3f}s" for k, v in self.timings.items()))
+
+    @property
+    def devices(self) -> list:
+        return list(self.index.devices.values())
+
+    @property
+    def rooms(self) -> list:
+        return list(self.index.rooms.values())
+
+    def _update_topology(self):
+        self.index = DeviceIndex(self.bridge._devices.values(), self.bridge._rooms.values())
+
+    async def _save_topology(self):
+        if self._store is not None:
+            await self._store.async_save(snapshot_topology(self.bridge))
+
+    def _reported_topology(self) -> tuple[dict, dict]:
+        # Room payloads are merged in place as SET_ALL_DATA messages come in, so copy them
+        return (
+            dict(self.bridge.device_payloads),
+            {room_id: dict(payload) for room_id, payload in self.bridge.room_payloads.items()},
+        )
+
+    @callback
+    def start_reconciling(self) -> None:
+        """Runs reconcile every TOPOLOGY_RECONCILE_INTERVAL and whenever the bridge
+        finished reporting its topology, starting now if it already has."""
+        self.bridge.on_topology = self._on_topology
+        self._stop_reconciling = async_track_time_interval(
+            self.hass, self.schedule_reconcile, timedelta(seconds=TOPOLOGY_RECONCILE_INTERVAL)
+        )
+        if self.bridge.topology_complete:
+            self.schedule_reconcile()
+
+    @callback
+    def _on_topology(self) -> None:
+        self.schedule_reconcile()
+
+    @callback
+    def _on_connection_state(self) -> None:
+        if self.supervisor.state != STATE_CONNECTED:
+            # What the rooms use while the bridge is unreachable is not known
+            self.statistics.pause()
+
+    @callback
+    def schedule_reconcile(self, now=None) -> None:
+        """Starts reconcile in the background, or once more after the pass that is running.
+        Does nothing before start_reconciling."""
+        if self._stop_reconciling is None:
+            return
+        if self._reconcile_task is not None:
+            self._reconcile_again = True
+            return
+        self._reconcile_task = asyncio.create_task(self._run_reconcile())
+
+    async def _run_reconcile(self) -> None:
+        try:
+            while True:
+                self._reconcile_again = False
+                await self.reconcile()
+                if not self._reconcile_again:
+                    break
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception(f"{self.identifier}: error reconciling devices and rooms")
+        finally:
+            self._reconcile_task = None
+
+    async def reconcile(self) -> None:
+        """Adds, removes and replaces the entities of devices and rooms that differ
+        from what the bridge reports, leaving the others alone.
+
+        Payloads are only compared when the bridge reported its topology again
+        since the last pass. Rooms are also checked for capabilities they did not
+        have when their entities were made, like a setpoint reported after startup.
+        Rooms of changed or removed devices are made again too, as their entities
+        follow the device objects they were made with."""
+        if not self.bridge.topology_complete:
+            return
+        start = time.perf_counter()
+        self.metrics.increment("reconcile_passes")
+
+        added_devices = removed_devices = changed_devices = set()
+        added_rooms = removed_rooms = changed_rooms = set()
+        version = self.bridge.topology_version
+        new_topology = version != self._known_version
+        if new_topology:
+            devices, rooms = self._reported_topology()
+            if not devices and not rooms and self.index:
+                _LOGGER.warning(f"{self.identifier}: bridge reported no devices and rooms, keeping entities")
+                self._known_version = version
+                return
+            added_devices, removed_devices, changed_devices = diff_payloads(
+                self._known_devices, devices, DEVICE_IDENTITY
+            )
+            added_rooms, removed_rooms, changed_rooms = diff_payloads(self._known_rooms, rooms, ROOM_IDENTITY)
 
-        log(f"loaded {len(self.devices)} devices")
+        grown_rooms = {
+            room_id
+            for room_id, room in self.index.rooms.items()
+            if room_capabilities(room) - self.index.capabilities_of(room_id)
+        } - removed_rooms - changed_rooms
+        member_rooms = {
+            room.room_id
+            for room in map(self.index.room_of, removed_devices | changed_devices)
+            if room is not None
+        } - removed_rooms - changed_rooms
+        # Rooms made again from the room objects the bridge already has
+        rebuilt_rooms = grown_rooms | member_rooms
 
-        log("loading rooms")
+        changes = (added_devices, removed_devices, changed_devices, added_rooms, removed_rooms, changed_rooms)
+        if not any(changes) and not grown_rooms:
+            if new_topology:
+                self._known_version = version
+                self._known_devices, self._known_rooms = devices, rooms
+                await self._save_topology()
+            self.metrics.record("reconcile", time.perf_counter() - start)
+            return
 
-        rooms = await self.bridge.get_rooms()
-        self.rooms = rooms.values()
+        for device_id in removed_devices | changed_devices:
+            await self._remove_entities("device", device_id, device_id in removed_devices)
+            self.bridge._devices.pop(device_id, None)
+            self.index.remove_device(device_id)
+        for room_id in removed_rooms | changed_rooms | rebuilt_rooms:
+            await self._remove_entities("room", room_id, room_id in removed_rooms)
+            self.index.remove_room(room_id)
+            if room_id not in rebuilt_rooms:
+                self.bridge._rooms.pop(room_id, None)
 
-        log(f"loaded {len(self.rooms)} rooms")
+        # The library updates objects of known ids in place, so rebuild changed ones as reported now
+        for device_id in changed_devices:
+            self.bridge._handle_device_payload(devices[device_id])
+        for room_id in changed_rooms:
+            self.bridge._handle_room_payload(rooms[room_id])
+
+        batch = DeviceIndex(
+            [self.bridge._devices[i] for i in added_devices | changed_devices if i in self.bridge._devices],
+            [self.bridge._rooms[i] for i in added_rooms | changed_rooms | rebuilt_rooms if i in self.bridge._rooms],
+        )
+        self.index.add(batch.devices.values(), batch.rooms.values())
+        self._add_to_platforms(batch)
+
+        self.metrics.increment("reconcile_changes")
+        self.metrics.record("reconcile", time.perf_counter() - start)
+        self.log(
+            "reconciled topology: %s/%s/%s devices and %s/%s/%s rooms added/removed/changed, %s rooms gained capabilities",
+            len(added_devices),
+            len(removed_devices),
+            len(changed_devices),
+            len(added_rooms),
+            len(removed_rooms),
+            len(changed_rooms),
+            len(grown_rooms),
+        )
+
+        if new_topology:
+            self._known_version = version
+            self._known_devices, self._known_rooms = devices, rooms
+        await self._save_topology()
+
+    @callback
+    def add_entity_factory(self, factory: Callable) -> None:
+        """Registers a platform's entity factory and calls it with the loaded devices and rooms.
+        The factory is called with a DeviceIndex, adds entities for its devices and rooms, and
+        returns those entities. It is called again with an index of devices and rooms that
+        show up later. The index of everything loaded is `index`."""
+        self._entity_factories.append(factory)
+        self._add_entities(factory, self.index)
+
+    @callback
+    def forward_platforms(self, platforms) -> None:
+        """Starts setting up those of platforms that are not set up for the entry yet."""
+        new = [platform for platform in platforms if platform not in self.platforms]
+        if not new or self.entry_id is None:
+            return
+        entry = self.hass.config_entries.async_get_entry(self.entry_id)
+        if entry is None:
+            return
+        self.platforms.update(new)
+        self.log("setting up platforms %s", ', '.join(new))
+        self._platform_setups.append(self.hass.async_create_task(self._setup_platforms(entry, new)))
+
+    async def _setup_platforms(self, entry: ConfigEntry, platforms: list) -> None:
+        await self.hass.config_entries.async_forward_entry_setups(entry, platforms)
+        for platform in platforms:
+            self.timings[f"platform_{platform}"] = time.monotonic() - self._load_start
+
+    async def wait_for_platforms(self) -> None:
+        """Waits until every platform started by forward_platforms is set up."""
+        while self._platform_setups:
+            setups, self._platform_setups = self._platform_setups, list()
+            await asyncio.gather(*setups)
+
+    def _add_to_platforms(self, batch: DeviceIndex) -> None:
+        # Platforms are set up once there is something for them, and register
+        # their factory, which gets every device and room loaded by then
+        self.forward_platforms(platforms_for(batch))
+        if self.statistics is not None:
+            for room in batch.rooms_with(CAP_POWER):
+                self.subscribe_room(room, self.statistics.room_callback(room))
+        if batch:
+            for factory in self._entity_factories:
+                self._add_entities(factory, batch)
+
+    def _add_entities(self, factory: Callable, batch: DeviceIndex) -> None:
+        for entity in factory(batch):
+            if getattr(entity, "device_id", None) is not None:
+                key = ("device", entity.device_id)
+            else:
+                key = ("room", entity.room_id)
+            self._entities.setdefault(key, list()).append(entity)
+
+    async def _remove_entities(self, kind: str, key, remove_from_registry: bool) -> None:
+        """Removes the entities and the subscription of a device or room."""
+        registry = er.async_get(self.hass)
+        for entity in self._entities.pop((kind, key), ()):
+            if entity.hass is not None:
+                await entity.async_remove(force_remove=True)
+            if remove_from_registry and entity.entity_id is not None and registry.async_get(entity.entity_id):
+                registry.async_remove(entity.entity_id)
+
+        index = self._device_callbacks if kind == "device" else self._room_callbacks
+        index.pop(key, None)
+        subscription = self._subscriptions.pop((kind, key), None)
+        if subscription is not None:
+            subscription.dispose()
+
+    def subscribe_device(self, device, listener: Callable) -> Callable[[], None]:
+        """Registers listener for state updates of a device. Returns a function
+        that unregisters it, e.g. for Entity.async_on_remove."""
+        return self._subscribe("device", self._device_callbacks, device.device_id, device, listener)
+
+    def subscribe_room(self, room, listener: Callable) -> Callable[[], None]:
+        """Registers listener for state updates of a room, see subscribe_device."""
+        return self._subscribe("room", self._room_callbacks, room.room_id, room, listener)
+
+    def _subscribe(self, kind: str, index: dict, key, obj, listener: Callable) -> Callable[[], None]:
+        """Adds listener to the index, subscribing to obj once per bridge object.
+        Like a direct subscription, the listener is called with the current state.
+        The subscription to obj is disposed once its last listener is removed."""
+        callbacks = index.get(key)
+        if callbacks is None:
+            callbacks = index[key] = list()
+            self._subscriptions[(kind, key)] = obj.state.subscribe(
+                lambda state: self._dispatch((kind, key), callbacks, state)
+            )
+        callbacks.append(listener)
+        listener(obj.state.value)
+
+        def unsubscribe() -> None:
+            if listener in callbacks:
+                callbacks.remove(listener)
+            # The callbacks may be stale, after the device or room was removed or the hub stopped
+            if not callbacks and index.get(key) is callbacks:
+                del index[key]
+                subscription = self._subscriptions.pop((kind, key), None)
+                if subscription is not None:
+                    subscription.dispose()
+
+        return unsubscribe
+
+    @property
+    def subscription_counts(self) -> dict:
+        """The number of bridge subscriptions, and of the callbacks they deliver to."""
+        return {
+            "bridge": len(self._subscriptions),
+            "callbacks": sum(len(c) for c in self._device_callbacks.values())
+            + sum(len(c) for c in self._room_callbacks.values()),
+        }
+
+    def _dispatch(self, target: tuple, callbacks: list, state) -> None:
+        """Delivers one state update to every registered listener, after checking
+        it against the acknowledgement pending for target."""
+        start = time.perf_counter()
+        self.acks.check(target, state)
+        if target[0] == "room" and target[1] in self.index.rooms:
+            if state_capabilities(state) - self.index.capabilities_of(target[1]):
+                self.schedule_reconcile()
+        for listener in callbacks:
+            try:
+                listener(state)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception(f"{self.identifier}: error dispatching state {state}")
+        self.metrics.record("dispatch", time.perf_counter() - start)
+
+    def schedule_write(self, entity) -> None:
+        """Requests a coalesced state write for entity."""
+        self.writer.schedule(entity)
+
+    def dimm(self, device: Light, value: int) -> None:
+        """Queues a dimm command. Per device, commands are sent at most once per
+        dimm_interval, and a queued value is replaced by newer ones."""
+        sender = self._dimm_senders.get(device.device_id)
+        if sender is None:
+            sender = LatestValueSender(device.dimm, self.dimm_interval)
+            self._dimm_senders[device.device_id] = sender
+        sender.submit(value)
+
+    def discard_dimm(self, device: Light) -> None:
+        """Drops a queued dimm command, so it does not override a later switch."""
+        sender = self._dimm_senders.get(device.device_id)
+        if sender is not None:
+            sender.discard()
+
+    def start_recording(self, path: str) -> None:
+        """Records the messages exchanged with the bridge to path, see MessageRecorder."""
+        self.log("Recording bridge messages to %s", path)
+        self.bridge.recorder = MessageRecorder(path)
+        self._stop_recording_flush = async_track_time_interval(
+            self.hass, self._flush_recording, timedelta(seconds=RECORDING_FLUSH_INTERVAL)
+        )
+
+    async def stop_recording(self) -> None:
+        """Writes what is left of the recording and stops recording."""
+        if self._stop_recording_flush is not None:
+            self._stop_recording_flush()
+            self._stop_recording_flush = None
+        await self._flush_recording()
+        self.bridge.recorder = None
+
+    async def _flush_recording(self, now=None) -> None:
+        recorder = self.bridge.recorder
+        if recorder is None:
+            return
+        async with self._recording_lock:
+            try:
+                await self.hass.async_add_executor_job(recorder.write, recorder.take())
+            except OSError as e:
+                _LOGGER.warning(f"{self.identifier}: failed writing recording {recorder.path}: {e!r}")
 
     @property
     def hub_id(self) -> str:
         return self._id
 
-    async def test_connection(self) -> bool:
-        await asyncio.sleep(1)
-        return True
+    @property
+    def device_info(self):
+        return {
+            "identifiers": {(DOMAIN, self.hub_id)},
+            "name": self.identifier,
+            "manufacturer": "Eaton",
+            "model": "xComfort Bridge",
+        }
+
+    def diagnostics(self) -> dict:
+        """Returns metrics and timings of this hub."""
+        metrics = self.metrics.as_dict()
+        metrics["counters"]["state_writes_requested"] = self.writer.requested
+        metrics["counters"]["state_writes"] = self.writer.written
+        metrics["counters"]["command_queue_max_depth"] = self.scheduler.max_depth
+        return {
+            "identifier": self.identifier,
+            "devices": len(self.index.devices),
+            "rooms": len(self.index.rooms),
+            "bridge_state": self.bridge.state.name,
+            "connection": {
+                "state": self.supervisor.state,
+                "last_error": self.supervisor.last_error,
+                "last_time_to_recovery": self.supervisor.last_time_to_recovery,
+            },
+            "commands": {
+                "waiting": self.scheduler.depth,
+                "in_flight": self.scheduler.in_flight,
+            },
+            "subscriptions": self.subscription_counts,
+            "slowest_confirmations": {
+                f"{kind}/{key}": latency for (kind, key), latency in self.acks.slowest()
+            },
+            "recording": {
+                "path": self.bridge.recorder.path,
+                "messages": self.bridge.recorder.recorded,
+            }
+            if self.bridge.recorder is not None
+            else None,
+            "timings": self.timings,
+            "metrics": metrics,
+        }
+
+    @staticmethod
+    async def remove_cache(hass: HomeAssistant, entry: ConfigEntry) -> None:
+        await Store(hass, TOPOLOGY_STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}.topology").async_remove()
+        await Store(hass, SESSION_STORAGE_VERSION, session_storage_key(entry.entry_id)).async_remove()
 
     @staticmethod
     def get_hub(hass: HomeAssistant, entry: ConfigEntry) -> XComfortHub:
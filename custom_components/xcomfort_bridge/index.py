@@ -0,0 +1,139 @@
+"""Classification of xComfort devices and rooms, for lookups without scanning."""
+
+from __future__ import annotations
+
+from collections import defaultdict
+
+from xcomfort.devices import RcTouch, Shade
+
+CAP_DIMMABLE = "dimmable"
+CAP_GO_TO = "go_to"
+CAP_HUMIDITY = "humidity"
+CAP_POWER = "power"
+CAP_SETPOINT = "setpoint"
+CAP_TEMPERATURE = "temperature"
+
+
+def device_capabilities(device) -> set:
+    capabilities = set()
+    if getattr(device, "dimmable", False):
+        capabilities.add(CAP_DIMMABLE)
+    if isinstance(device, Shade) and device.supports_go_to:
+        capabilities.add(CAP_GO_TO)
+    if isinstance(device, RcTouch):
+        capabilities.add(CAP_HUMIDITY)
+    return capabilities
+
+
+def room_capabilities(room) -> set:
+    return state_capabilities(room.state.value)
+
+
+def state_capabilities(state) -> set:
+    """The capabilities of a room in state, see room_capabilities."""
+    capabilities = set()
+    if state is not None:
+        if state.setpoint is not None:
+            capabilities.add(CAP_SETPOINT)
+        if state.power is not None:
+            capabilities.add(CAP_POWER)
+        if state.temperature is not None:
+            capabilities.add(CAP_TEMPERATURE)
+    return capabilities
+
+
+class DeviceIndex:
+    """Devices and rooms by id, with their type, room and capabilities worked out
+    once when they are added.
+
+    Devices are indexed under every class they are an instance of, rooms with
+    the device ids the bridge lists for them. A room's devices are looked up
+    when asked for, so it does not matter whether a room or its devices are
+    added first."""
+
+    def __init__(self, devices: list = (), rooms: list = ()):
+        self.devices = dict()
+        self.rooms = dict()
+        self._by_type = defaultdict(dict)
+        self._device_capabilities = defaultdict(dict)
+        self._room_capabilities = defaultdict(dict)
+        self._capabilities_of_room = dict()
+        self._room_devices = dict()
+        self._device_room = dict()
+        self.add(devices, rooms)
+
+    def __bool__(self) -> bool:
+        return bool(self.devices or self.rooms)
+
+    def add(self, devices: list = (), rooms: list = ()) -> None:
+        for device in devices:
+            self.remove_device(device.device_id)
+            self.devices[device.device_id] = device
+            for cls in type(device).__mro__:
+                self._by_type[cls][device.device_id] = device
+            for capability in device_capabilities(device):
+                self._device_capabilities[capability][device.device_id] = device
+
+        for room in rooms:
+            self.remove_room(room.room_id)
+            self.rooms[room.room_id] = room
+            self._capabilities_of_room[room.room_id] = room_capabilities(room)
+            for capability in self._capabilities_of_room[room.room_id]:
+                self._room_capabilities[capability][room.room_id] = room
+            state = room.state.value
+            device_ids = tuple(state.raw.get("devices", ())) if state is not None else ()
+            self._room_devices[room.room_id] = device_ids
+            for device_id in device_ids:
+                self._device_room[device_id] = room.room_id
+
+    def remove_device(self, device_id) -> None:
+        if self.devices.pop(device_id, None) is None:
+            return
+        for devices in self._by_type.values():
+            devices.pop(device_id, None)
+        for devices in self._device_capabilities.values():
+            devices.pop(device_id, None)
+
+    def remove_room(self, room_id) -> None:
+        if self.rooms.pop(room_id, None) is None:
+            return
+        del self._capabilities_of_room[room_id]
+        for rooms in self._room_capabilities.values():
+            rooms.pop(room_id, None)
+        for device_id in self._room_devices.pop(room_id, ()):
+            if self._device_room.get(device_id) == room_id:
+                del self._device_room[device_id]
+
+    def device(self, device_id):
+        return self.devices.get(device_id)
+
+    def room(self, room_id):
+        return self.rooms.get(room_id)
+
+    def of_type(self, cls) -> list:
+        """The devices that are instances of cls."""
+        return list(self._by_type.get(cls, {}).values())
+
+    def has_type(self, cls) -> bool:
+        return bool(self._by_type.get(cls))
+
+    def with_capability(self, capability: str) -> list:
+        """The devices with capability, see CAP_*."""
+        return list(self._device_capabilities.get(capability, {}).values())
+
+    def rooms_with(self, capability: str) -> list:
+        """The rooms with capability, see CAP_*."""
+        return list(self._room_capabilities.get(capability, {}).values())
+
+    def capabilities_of(self, room_id) -> set:
+        """The capabilities room_id had when it was added."""
+        return self._capabilities_of_room.get(room_id, set())
+
+    def in_room(self, room_id, cls=None) -> list:
+        """The devices the bridge lists for a room, optionally only instances of cls."""
+        devices = self._by_type.get(cls, {}) if cls is not None else self.devices
+        return [devices[i] for i in self._room_devices.get(room_id, ()) if i in devices]
+
+    def room_of(self, device_id):
+        """The room the bridge lists device_id in, if any."""
+        return self.rooms.get(self._device_room.get(device_id))
@@ -2,6 +2,8 @@ import asyncio
 import logging
 from math import ceil
 
+from xcomfort.bridge import Room
+from xcomfort.connection import Messages
 from xcomfort.devices import Light
 
 from homeassistant.components.light import (
@@ -10,19 +12,23 @@ from homeassistant.components.light import (
     LightEntity,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
-from .const import DOMAIN, VERBOSE
+from .const import DOMAIN, ROOM_FANOUT_LIMIT
 from .hub import XComfortHub
+from .index import DeviceIndex
+from .optimistic import OptimisticEntity
+from .scheduler import PrioritizedEntity
+from .trace import get_tracer
 
 _LOGGER = logging.getLogger(__name__)
 
 
-def log(msg: str):
-    if VERBOSE:
-        _LOGGER.info(msg)
+# Commands are ordered and limited by the hub's CommandScheduler, so Home
+# Assistant need not run service calls of these entities one at a time
+PARALLEL_UPDATES = 0
 
 
 # PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
@@ -36,26 +42,36 @@ async def async_setup_entry(
 ) -> None:
 
     hub = XComfortHub.get_hub(hass, entry)
+    log = get_tracer(__name__, hub.identifier)
 
-    devices = hub.devices
+    log("Found %s xcomfort lights", len(hub.index.of_type(Light)))
 
-    _LOGGER.info(f"Found {len(devices)} xcomfort devices")
-
-    lights = list()
-    for device in devices:
-        if isinstance(device,Light):
-            _LOGGER.info(f"Adding {device}")
+    @callback
+    def create_lights(batch: DeviceIndex):
+        lights = list()
+        for device in batch.of_type(Light):
+            log("Adding %s", device)
             light = HASSXComfortLight(hass, hub, device)
             lights.append(light)
 
-    _LOGGER.info(f"Added {len(lights)} lights")
-    async_add_entities(lights)
+        for room in batch.rooms.values():
+            members = hub.index.in_room(room.room_id, Light)
+            if members:
+                log("Adding light group for room %s", room.name)
+                lights.append(HASSXComfortRoomLight(hass, hub, room, members))
+
+        log("Added %s lights", len(lights))
+        async_add_entities(lights)
+        return lights
 
+    hub.add_entity_factory(create_lights)
 
-class HASSXComfortLight(LightEntity):
+
+class HASSXComfortLight(PrioritizedEntity, OptimisticEntity, LightEntity):
     def __init__(self, hass: HomeAssistant, hub: XComfortHub, device: Light):
         self.hass = hass
         self.hub = hub
+        self.log = get_tracer(__name__, hub.identifier)
 
         self._device = device
         self._name = device.name
@@ -68,21 +84,25 @@ class HASSXComfortLight(LightEntity):
         self._unique_id = f"light_{DOMAIN}_{hub.identifier}-{device.device_id}"
 
     async def async_added_to_hass(self):
-        log(f"Added to hass {self._name} ")
+        self.log("Added to hass %s", self._name)
         if self._device.state is None:
-            log(f"State is null for {self._name}")
+            self.log("State is null for %s", self._name)
         else:
-            self._device.state.subscribe(lambda state: self._state_change(state))
+            self.async_on_remove(self.hub.subscribe_device(self._device, self._state_change))
 
     def _state_change(self, state):
         self._state = state
 
         should_update = self._state is not None
 
-        log(f"State changed {self._name} : {state}")
+        self.log("State changed %s : %s", self._name, state)
 
         if should_update:
-            self.schedule_update_ha_state()
+            self.hub.schedule_write(self)
+
+    @property
+    def _ack_key(self):
+        return ("device", self.device_id)
 
     @property
     def device_info(self):
@@ -116,12 +136,13 @@ class HASSXComfortLight(LightEntity):
         This method is optional. Removing it indicates to Home Assistant
         that brightness is not supported for this light.
         """
-        return int(255.0 * self._state.dimmvalue / 99.0)
+        dimmvalue = self._optimistic_value("dimmvalue", self._state.dimmvalue)
+        return int(255.0 * dimmvalue / 99.0)
 
     @property
     def is_on(self):
         """Return true if light is on."""
-        return self._state.switch
+        return self._optimistic_value("switch", self._state.switch)
 
     @property
     def supported_features(self):
@@ -131,30 +152,163 @@ class HASSXComfortLight(LightEntity):
         return 0
 
     async def async_turn_on(self, **kwargs):
-        log(f"async_turn_on {self._name} : {kwargs}")
+        self.log("async_turn_on %s : %s", self._name, kwargs)
         if ATTR_BRIGHTNESS in kwargs and self._device.dimmable:
             br = ceil(kwargs[ATTR_BRIGHTNESS] * 99 / 255.0)
-            log(f"async_turn_on br {self._name} : {br}")
-            await self._device.dimm(br)
-            self._state.dimmvalue = br
-            self.schedule_update_ha_state()
+            self.log("async_turn_on br %s : %s", self._name, br)
+            self._set_optimistic(switch=True, dimmvalue=br)
+            self.hub.dimm(self._device, br)
+            return
+
+        await self._switch(True)
+
+    async def async_turn_off(self, **kwargs):
+        self.log("async_turn_off %s : %s", self._name, kwargs)
+        await self._switch(False)
+
+    async def _switch(self, switch: bool):
+        self.hub.discard_dimm(self._device)
+        self._set_optimistic(switch=switch)
+        try:
+            await self._device.switch(switch)
+        except Exception:
+            self._clear_optimistic()
+            raise
+
+    def update(self):
+        pass
+
+
+class HASSXComfortRoomLight(PrioritizedEntity, LightEntity):
+    """All lights of an xComfort room, switched with one room command."""
+
+    def __init__(self, hass: HomeAssistant, hub: XComfortHub, room: Room, members: list):
+        self.hass = hass
+        self.hub = hub
+        self.log = get_tracer(__name__, hub.identifier)
+
+        self._room = room
+        self._name = f"{room.name} lights"
+        self.room_id = room.room_id
+        self._members = members
+        self._member_states = dict()
+
+        self._unique_id = f"light_room_{DOMAIN}_{hub.identifier}-{room.room_id}"
+
+    async def async_added_to_hass(self):
+        self.log("Added to hass %s", self._name)
+        for device in self._members:
+            self.async_on_remove(
+                self.hub.subscribe_device(
+                    device, lambda state, device_id=device.device_id: self._member_state_change(device_id, state)
+                )
+            )
+
+    def _member_state_change(self, device_id, state):
+        if state is None:
             return
+        self._member_states[device_id] = state
+        if self.hass is not None:
+            self.hub.schedule_write(self)
 
-        switch_task = self._device.switch(True)
-        # switch_task = self.hub.bridge.switch_device(self.device_id,True)
-        await switch_task
+    @property
+    def device_info(self):
+        return {
+            "identifiers": {(DOMAIN, self.unique_id)},
+            "name": self.name,
+            "manufacturer": "Eaton",
+            "model": "Room",
+            "via_device": self.hub.hub_id,
+        }
 
-        self._state.switch = True
-        self.schedule_update_ha_state()
+    @property
+    def name(self):
+        """Return the display name of this light group."""
+        return self._name
+
+    @property
+    def unique_id(self):
+        """Return the unique ID."""
+        return self._unique_id
+
+    @property
+    def should_poll(self) -> bool:
+        return False
+
+    @property
+    def _dimmable(self):
+        return [d for d in self._members if d.dimmable]
+
+    @property
+    def is_on(self):
+        """Return true if any light in the room is on."""
+        if not self._member_states:
+            return None
+        return any(state.switch for state in self._member_states.values())
+
+    @property
+    def brightness(self):
+        """Return the average brightness of the dimmable lights that are on."""
+        values = [
+            self._member_states[d.device_id].dimmvalue
+            for d in self._dimmable
+            if d.device_id in self._member_states and self._member_states[d.device_id].switch
+        ]
+        if not values:
+            return None
+        return int(255.0 * sum(values) / len(values) / 99.0)
+
+    @property
+    def supported_features(self):
+        """Flag supported features."""
+        if self._dimmable:
+            return SUPPORT_BRIGHTNESS
+        return 0
+
+    async def async_turn_on(self, **kwargs):
+        self.log("async_turn_on %s : %s", self._name, kwargs)
+        if ATTR_BRIGHTNESS in kwargs and self._dimmable:
+            br = ceil(kwargs[ATTR_BRIGHTNESS] * 99 / 255.0)
+            if len(self._dimmable) == len(self._members):
+                for device in self._members:
+                    self.hub.discard_dimm(device)
+                await self._room.bridge.send_message(
+                    Messages.ACTION_SLIDE_ROOM, {"roomId": self.room_id, "dimmvalue": br}
+                )
+                return
+
+            # A room slide would leave the switching lights alone, so address each light
+            async def turn_on(device):
+                if device.dimmable:
+                    self.hub.dimm(device, br)
+                else:
+                    await device.switch(True)
+
+            await self._fan_out(turn_on)
+            return
+
+        await self._switch(True)
 
     async def async_turn_off(self, **kwargs):
-        log(f"async_turn_off {self._name} : {kwargs}")
-        switch_task = self._device.switch(False)
-        # switch_task = self.hub.bridge.switch_device(self.device_id,True)
-        await switch_task
+        self.log("async_turn_off %s : %s", self._name, kwargs)
+        await self._switch(False)
+
+    async def _switch(self, switch: bool):
+        for device in self._members:
+            self.hub.discard_dimm(device)
+        await self._room.bridge.send_message(
+            Messages.ACTION_SWITCH_ROOM, {"roomId": self.room_id, "switch": switch}
+        )
+
+    async def _fan_out(self, command):
+        """Runs command for every member, with at most ROOM_FANOUT_LIMIT in flight."""
+        semaphore = asyncio.Semaphore(ROOM_FANOUT_LIMIT)
+
+        async def run(device):
+            async with semaphore:
+                await command(device)
 
-        self._state.switch = False
-        self.schedule_update_ha_state()
+        await asyncio.gather(*[run(device) for device in self._members])
 
     def update(self):
         pass
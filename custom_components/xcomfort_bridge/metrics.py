@@ -0,0 +1,118 @@
+"""Counters and latency histograms for an xComfort bridge connection."""
+
+from __future__ import annotations
+
+import bisect
+import math
+import time
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the histogram buckets
+LATENCY_BUCKETS = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    math.inf,
+)
+
+
+class LatencyHistogram:
+    """Fixed bucket histogram of durations in seconds."""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float | None:
+        """Estimates the q-th percentile (0-100), interpolating within its bucket."""
+        if self.count == 0:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = min(self.buckets[i], self.max)
+                return lower + (upper - lower) * max(rank - seen, 0) / count
+            seen += count
+        return self.max
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+            "buckets": {
+                str(bound): count for bound, count in zip(self.buckets, self.counts) if count
+            },
+        }
+
+
+class Metrics:
+    """Named counters and latency histograms."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counters = dict()
+        self.histograms = dict()
+
+    def increment(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def record(self, name: str, seconds: float) -> None:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.record(seconds)
+
+    @contextmanager
+    def timed(self, name: str):
+        """Records the time spent in the with block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def counter(self, name: str) -> int:
+        return self.counters.get(name, 0)
+
+    def percentile(self, name: str, q: float) -> float | None:
+        histogram = self.histograms.get(name)
+        return histogram.percentile(q) if histogram is not None else None
+
+    def as_dict(self) -> dict:
+        return {
+            "uptime": time.monotonic() - self.started,
+            "counters": dict(sorted(self.counters.items())),
+            "histograms": {name: h.as_dict() for name, h in sorted(self.histograms.items())},
+        }
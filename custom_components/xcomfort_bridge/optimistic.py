@@ -0,0 +1,143 @@
+"""Optimistic state for xComfort actuators, with acknowledgement tracking."""
+
+from __future__ import annotations
+
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import ACK_TIMEOUT
+from .metrics import Metrics
+from .trace import get_tracer
+
+
+class AckTracker:
+    """Tracks, per device or room, the state a command is expected to result in.
+
+    The hub checks every state update against the pending expectation. When one
+    matches, the command is confirmed and its latency recorded. When none does
+    within the timeout, the expectation is dropped, so the entity can fall back
+    to what the bridge reported."""
+
+    def __init__(
+        self, hass: HomeAssistant, metrics: Metrics, timeout: float = ACK_TIMEOUT, context: str | None = None
+    ):
+        self.hass = hass
+        self.metrics = metrics
+        self.timeout = timeout
+        self.log = get_tracer(__name__, context)
+        self._pending = dict()
+        # Last confirmation latency per device or room
+        self.latencies = dict()
+
+    @callback
+    def expect(
+        self,
+        key,
+        matches: Callable[[Any], bool],
+        on_done: Callable[[bool], None],
+        timeout: float | None = None,
+    ) -> None:
+        """Waits for a state of key for which matches returns True.
+        on_done is called with True when it arrives, or False on timeout.
+        Replaces any earlier expectation for key, without calling its on_done."""
+        self.discard(key)
+        handle = self.hass.loop.call_later(timeout or self.timeout, self._expire, key)
+        self._pending[key] = (matches, on_done, time.monotonic(), handle)
+        self.metrics.increment("acks_expected")
+
+    @callback
+    def check(self, key, state) -> None:
+        """Confirms the expectation for key if state matches it."""
+        pending = self._pending.get(key)
+        if pending is None or state is None:
+            return
+        matches, on_done, start, handle = pending
+        try:
+            confirmed = matches(state)
+        except Exception:  # pylint: disable=broad-except
+            confirmed = False
+        if not confirmed:
+            self.metrics.increment("acks_unmatched_updates")
+            return
+
+        del self._pending[key]
+        handle.cancel()
+        latency = time.monotonic() - start
+        self.latencies[key] = latency
+        self.metrics.record("confirmation", latency)
+        self.metrics.increment("acks_confirmed")
+        on_done(True)
+
+    @callback
+    def discard(self, key) -> None:
+        """Drops the expectation for key, if any, without calling its on_done."""
+        pending = self._pending.pop(key, None)
+        if pending is not None:
+            pending[3].cancel()
+            self.metrics.increment("acks_superseded")
+
+    @callback
+    def _expire(self, key) -> None:
+        pending = self._pending.pop(key, None)
+        if pending is not None:
+            self.metrics.increment("acks_timed_out")
+            self.log("No confirmation from bridge for %s", key)
+            pending[1](False)
+
+    def cancel(self) -> None:
+        for pending in self._pending.values():
+            pending[3].cancel()
+        self._pending.clear()
+
+    def slowest(self, count: int = 10) -> list:
+        """The devices and rooms with the highest last confirmation latency."""
+        return sorted(self.latencies.items(), key=lambda item: item[1], reverse=True)[:count]
+
+
+class OptimisticEntity(ABC):
+    """Mixin for entities that show a requested state until the bridge confirms it.
+
+    Subclasses set `hub`, and provide `_ack_key` and `_reported_value`."""
+
+    _optimistic = None
+
+    @property
+    @abstractmethod
+    def _ack_key(self):
+        """The device or room the acknowledgements are about, like ("device", id)."""
+
+    def _reported_value(self, name: str, state):
+        return getattr(state, name)
+
+    def _optimistic_value(self, name: str, reported):
+        if self._optimistic is not None and name in self._optimistic:
+            return self._optimistic[name]
+        return reported
+
+    @callback
+    def _set_optimistic(self, timeout: float | None = None, **values) -> None:
+        """Shows values right away, until the bridge reports them or timeout passes.
+        Replaces what an earlier command asked for."""
+        self._optimistic = expected = values
+        self.hub.acks.expect(
+            self._ack_key,
+            lambda state: all(self._reported_value(k, state) == v for k, v in expected.items()),
+            self._optimistic_done,
+            timeout,
+        )
+        self.async_write_ha_state()
+
+    @callback
+    def _clear_optimistic(self) -> None:
+        """Goes back to the reported state, e.g. because the command failed."""
+        self._optimistic = None
+        self.hub.acks.discard(self._ack_key)
+        self.hub.schedule_write(self)
+
+    @callback
+    def _optimistic_done(self, confirmed: bool) -> None:
+        self._optimistic = None
+        self.hub.schedule_write(self)
@@ -0,0 +1,75 @@
+"""Recording of decoded xComfort bridge messages, for replaying them later."""
+
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import time
+from typing import Iterator
+
+_LOGGER = logging.getLogger(__name__)
+
+DIRECTION_IN = "in"
+DIRECTION_OUT = "out"
+
+
+class MessageRecorder:
+    """Appends messages to a gzip compressed file of JSON lines.
+
+    Each line holds the wall clock time `t`, the direction `d` and the message
+    `m`. Messages are buffered in memory by `record`, which is cheap enough for
+    the event loop. `take` hands the buffer over, on the event loop, to `write`,
+    which does the file IO and belongs in an executor. Every write appends a
+    gzip member, so a recording can be extended across restarts, and a crash
+    loses at most the buffered messages."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._buffer = list()
+        self.recorded = 0
+
+    def record(self, direction: str, message: dict, now: float | None = None) -> None:
+        self._buffer.append(
+            json.dumps(
+                {"t": time.time() if now is None else now, "d": direction, "m": message},
+                separators=(",", ":"),
+                default=str,
+            )
+        )
+        self.recorded += 1
+
+    def take(self) -> list[str]:
+        """Returns and clears the buffered lines, for passing to write."""
+        lines, self._buffer = self._buffer, list()
+        return lines
+
+    def write(self, lines: list[str]) -> None:
+        """Appends lines to the file."""
+        if not lines:
+            return
+        with gzip.open(self.path, "at", encoding="utf-8") as file:
+            file.write("\n".join(lines))
+            file.write("\n")
+
+    def flush(self) -> None:
+        """Writes buffered messages to the file."""
+        self.write(self.take())
+
+
+def read_recording(path: str) -> Iterator[tuple[float, str, dict]]:
+    """Yields (time, direction, message) from a recording. A truncated last
+    member, as left by a crash during flush, ends the recording."""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        try:
+            for line in file:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    _LOGGER.warning(f"Skipping malformed line in {path}")
+                    continue
+                yield record["t"], record["d"], record["m"]
+        except EOFError:
+            _LOGGER.warning(f"Recording {path} ends in a truncated write")
@@ -0,0 +1,234 @@
+"""Reporting policies deciding when sensor values are written."""
+
+from __future__ import annotations
+
+import time
+from typing import Callable
+
+from homeassistant.core import callback
+
+from .const import DEFAULT_REPORTING, REPORTING_FIELDS
+from .metrics import Metrics
+
+_NOTHING = object()
+
+
+class ReportingPolicy:
+    """When a changed sensor value is worth a state write.
+
+    A value is written when it differs from the last written one by at least
+    deadband, or by deadband_percent of the last written one, but not sooner than
+    min_interval after the last write. Once max_interval passed since the last
+    write, the current value is written again, also a smaller change or none, as
+    a heartbeat. Zero disables each, so the default policy writes every change."""
+
+    def __init__(
+        self,
+        deadband: float = 0.0,
+        deadband_percent: float = 0.0,
+        min_interval: float = 0.0,
+        max_interval: float = 0.0,
+    ):
+        self.deadband = deadband
+        self.deadband_percent = deadband_percent
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+    def significant(self, old, new) -> bool:
+        """Whether new differs enough from old to be written."""
+        if old is None or new is None:
+            return True
+        change = abs(new - old)
+        if not self.deadband and not self.deadband_percent:
+            return change > 0
+        if self.deadband and change >= self.deadband:
+            return True
+        return bool(self.deadband_percent) and change >= abs(old) * self.deadband_percent / 100
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{field}={getattr(self, field)}" for field in REPORTING_FIELDS)
+        return f"ReportingPolicy({fields})"
+
+
+def policies_from_options(options: dict) -> dict[str, ReportingPolicy]:
+    """The policy of each sensor kind in DEFAULT_REPORTING, with <kind>_<field> options applied."""
+    return {
+        kind: ReportingPolicy(
+            **{field: float(options.get(f"{kind}_{field}", default)) for field, default in defaults.items()}
+        )
+        for kind, defaults in DEFAULT_REPORTING.items()
+    }
+
+
+class ReportFilter:
+    """Applies a ReportingPolicy to the values of one sensor.
+
+    `value` is the last value written. A value that may not be written yet is
+    kept as pending, and offer says when to call flush to write it. Written and
+    dropped values are counted per kind in metrics, as reports_emitted.<kind>
+    and reports_suppressed.<kind>.
+
+    Timestamps default to a monotonic clock, but can be passed explicitly."""
+
+    def __init__(
+        self,
+        policy: ReportingPolicy,
+        metrics: Metrics,
+        kind: str,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.policy = policy
+        self.metrics = metrics
+        self.value = None
+        self._emitted = f"reports_emitted.{kind}"
+        self._suppressed = f"reports_suppressed.{kind}"
+        self._clock = clock
+        self._time = None
+        self._pending = _NOTHING
+
+    def offer(self, value, now: float | None = None) -> float | None:
+        """Takes a new value. Returns 0 if it is to be written now, the seconds
+        until flush should write it, or None if it is not to be written."""
+        now = self._clock() if now is None else now
+        self._drop_pending()
+        if self._time is None:
+            self._emit(value, now)
+            return 0
+        if value == self.value:
+            self.metrics.increment(self._suppressed)
+            return None
+
+        elapsed = now - self._time
+        if self.policy.significant(self.value, value):
+            due = self.policy.min_interval - elapsed
+        elif self.policy.max_interval:
+            due = self.policy.max_interval - elapsed
+        else:
+            self.metrics.increment(self._suppressed)
+            return None
+
+        if due <= 0:
+            self._emit(value, now)
+            return 0
+        self._pending = value
+        return due
+
+    def set(self, value, now: float | None = None) -> None:
+        """Takes value as written, like one restored from before a restart."""
+        self._pending = _NOTHING
+        self.value = value
+        self._time = self._clock() if now is None else now
+
+    def flush(self, now: float | None = None) -> bool:
+        """Writes the pending value, if any. Returns whether there was one."""
+        if self._pending is _NOTHING:
+            return False
+        value, self._pending = self._pending, _NOTHING
+        self._emit(value, self._clock() if now is None else now)
+        return True
+
+    def heartbeat(self, now: float | None = None) -> bool:
+        """Writes the pending value, or else the written one again, because
+        max_interval passed. Returns whether there was a value."""
+        if self._pending is not _NOTHING:
+            return self.flush(now)
+        if self._time is None:
+            return False
+        self._emit(self.value, self._clock() if now is None else now)
+        return True
+
+    def _emit(self, value, now: float) -> None:
+        self.value = value
+        self._time = now
+        self.metrics.increment(self._emitted)
+
+    def _drop_pending(self) -> None:
+        if self._pending is not _NOTHING:
+            self._pending = _NOTHING
+            self.metrics.increment(self._suppressed)
+
+
+class ReportingSensor:
+    """Mixin for sensors whose values are written according to a ReportingPolicy.
+
+    Subclasses set `hub`, call _init_reporting with their kind, and pass every
+    new value to _report instead of scheduling a write. The value to show is
+    `_reported`. With a max_interval, the value is written again that long after
+    the last write, also if it did not change."""
+
+    _report_timer = None
+    _heartbeat_timer = None
+
+    def _init_reporting(self, kind: str) -> None:
+        self._reporting = ReportFilter(self.hub.reporting[kind], self.hub.metrics, kind)
+
+    @property
+    def _reported(self):
+        return self._reporting.value
+
+    @property
+    def force_update(self) -> bool:
+        # Otherwise Home Assistant drops a heartbeat that did not change the state
+        return bool(self._reporting.policy.max_interval)
+
+    @callback
+    def _report(self, value) -> None:
+        """Writes value now, later, or not at all, as the policy says."""
+        due = self._reporting.offer(value)
+        if self._heartbeat_timer is None:
+            self._schedule_heartbeat()
+        if due is None or due == 0:
+            self._cancel_report_timer()
+            if due == 0:
+                self._write_report()
+            return
+        # A pending value is written at the earliest time it may be
+        loop = self.hub.hass.loop
+        when = loop.time() + due
+        if self._report_timer is not None:
+            if self._report_timer.when() <= when:
+                return
+            self._report_timer.cancel()
+        self._report_timer = loop.call_at(when, self._flush_report)
+
+    @callback
+    def _flush_report(self) -> None:
+        self._report_timer = None
+        if self._reporting.flush():
+            self._write_report()
+
+    @callback
+    def _heartbeat(self) -> None:
+        self._heartbeat_timer = None
+        if self._reporting.heartbeat():
+            self._cancel_report_timer()
+            self._write_report()
+        else:
+            self._schedule_heartbeat()
+
+    def _write_report(self) -> None:
+        if self.hass is not None:
+            self.hub.schedule_write(self)
+        self._schedule_heartbeat()
+
+    def _schedule_heartbeat(self) -> None:
+        """Restarts the heartbeat, max_interval from now."""
+        if self._heartbeat_timer is not None:
+            self._heartbeat_timer.cancel()
+            self._heartbeat_timer = None
+        if self._reporting.policy.max_interval:
+            self._heartbeat_timer = self.hub.hass.loop.call_later(
+                self._reporting.policy.max_interval, self._heartbeat
+            )
+
+    def _cancel_report_timer(self) -> None:
+        if self._report_timer is not None:
+            self._report_timer.cancel()
+            self._report_timer = None
+
+    async def async_will_remove_from_hass(self) -> None:
+        self._cancel_report_timer()
+        if self._heartbeat_timer is not None:
+            self._heartbeat_timer.cancel()
+            self._heartbeat_timer = None
+        await super().async_will_remove_from_hass()
@@ -0,0 +1,214 @@
+"""Ordering of the commands sent to an xComfort bridge."""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Callable
+
+from homeassistant.core import Context, callback
+
+from .const import COMMAND_SLOT_TIMEOUT, COMMAND_WINDOW
+from .metrics import Metrics
+from .trace import get_tracer
+
+# Priority classes, most urgent first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_AUTOMATION = 1
+PRIORITY_BACKGROUND = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_AUTOMATION: "automation",
+    PRIORITY_BACKGROUND: "background",
+}
+
+# Priority of the commands sent by the current task, see PrioritizedEntity
+_priority: ContextVar[int] = ContextVar("xcomfort_command_priority", default=PRIORITY_BACKGROUND)
+
+
+def priority_for(context: Context | None) -> int:
+    """The priority class of commands sent for a service call with context.
+    Calls made by a user are interactive, other calls, like those of automations
+    and scripts, are automation. Without a call, commands are background."""
+    if context is None:
+        return PRIORITY_BACKGROUND
+    if context.user_id is not None:
+        return PRIORITY_INTERACTIVE
+    return PRIORITY_AUTOMATION
+
+
+def set_priority(priority: int) -> None:
+    """Sets the priority of commands sent by the current task, and tasks it starts."""
+    _priority.set(priority)
+
+
+class PrioritizedEntity:
+    """Mixin for entities that send commands, so they are scheduled with the
+    priority of the service call that asked for them.
+
+    Home Assistant sets the context of the call on the entity in the task that
+    runs the entity's service method, so the priority is set for that task."""
+
+    @callback
+    def async_set_context(self, context: Context) -> None:
+        super().async_set_context(context)
+        set_priority(priority_for(context))
+
+
+class CommandScheduler:
+    """Sends commands in priority order, with at most `window` in flight.
+
+    A command is in flight from when it is sent until the bridge reports a state
+    for the device or room it addressed, or for at most `slot_timeout` seconds,
+    so a burst of commands does not overrun the bridge. Commands waiting for a
+    slot are sent most urgent priority class first, and in order of submission
+    within a class."""
+
+    def __init__(
+        self,
+        metrics: Metrics,
+        window: int = COMMAND_WINDOW,
+        slot_timeout: float = COMMAND_SLOT_TIMEOUT,
+        context: str | None = None,
+    ):
+        self.metrics = metrics
+        self.log = get_tracer(__name__, context)
+        self.window = window
+        self.slot_timeout = slot_timeout
+        self.in_flight = 0
+        # Commands waiting for a slot
+        self.depth = 0
+        self.max_depth = 0
+        self._queue = list()
+        self._order = itertools.count()
+        self._held = dict()
+        # Bumped by cancel, which empties the queue
+        self._generation = 0
+
+    @property
+    def holding(self) -> bool:
+        """Whether commands keep their slot until the bridge reports a state."""
+        return bool(self._held)
+
+    async def run(self, send: Callable[[], Awaitable], target=None, priority: int | None = None) -> None:
+        """Sends a command by awaiting send() once it gets a slot. With a target,
+        the ("device", id) or ("room", id) addressed, the slot is kept until
+        confirmed is called for it. Priority defaults to that of the current task."""
+        if priority is None:
+            priority = _priority.get()
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        self.metrics.increment(f"commands.{name}")
+
+        start = time.monotonic()
+        await self._acquire(priority, name)
+        wait = time.monotonic() - start
+        self.metrics.record("command_wait", wait)
+        self.metrics.record(f"command_wait.{name}", wait)
+
+        slot = _Slot(self._release)
+        if target is not None:
+            self._held.setdefault(target, list()).append(slot)
+        try:
+            await send()
+        except BaseException:
+            self._unhold(target, slot)
+            slot.release()
+            raise
+        if target is None or not self._is_held(target, slot):
+            slot.release()
+        else:
+            slot.timer = asyncio.get_running_loop().call_later(self.slot_timeout, self._expire, target, slot)
+
+    @callback
+    def confirmed(self, target) -> None:
+        """Frees the slots of the commands sent to target, because the bridge reported its state."""
+        for slot in self._held.pop(target, ()):
+            slot.release()
+
+    def cancel(self) -> None:
+        """Fails the waiting commands and frees every slot."""
+        for *_, waiter in self._queue:
+            waiter.cancel()
+        self._queue.clear()
+        for slots in self._held.values():
+            for slot in slots:
+                slot.discard()
+        self._held.clear()
+        self.in_flight = 0
+        self.depth = 0
+        self._generation += 1
+
+    async def _acquire(self, priority: int, name: str) -> None:
+        if self.in_flight < self.window and not self.depth:
+            self.in_flight += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        generation = self._generation
+        heapq.heappush(self._queue, (priority, next(self._order), waiter))
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        self.metrics.increment("commands_queued")
+        self.log("queued %s command, %s waiting and %s in flight", name, self.depth, self.in_flight)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if not waiter.cancelled():
+                # Got the slot just as it was cancelled, so pass it on
+                self._release()
+            elif generation == self._generation:
+                # Left in the queue, where _release skips it
+                self.depth -= 1
+            raise
+
+    def _release(self) -> None:
+        """Hands the slot to the most urgent waiting command, if any."""
+        while self._queue:
+            *_, waiter = heapq.heappop(self._queue)
+            if not waiter.done():
+                self.depth -= 1
+                waiter.set_result(None)
+                return
+        self.in_flight = max(self.in_flight - 1, 0)
+
+    def _is_held(self, target, slot: _Slot) -> bool:
+        return slot in self._held.get(target, ())
+
+    def _unhold(self, target, slot: _Slot) -> None:
+        slots = self._held.get(target)
+        if slots is not None and slot in slots:
+            slots.remove(slot)
+            if not slots:
+                del self._held[target]
+
+    @callback
+    def _expire(self, target, slot: _Slot) -> None:
+        slot.timer = None
+        if self._is_held(target, slot):
+            self._unhold(target, slot)
+            self.metrics.increment("command_slots_timed_out")
+            slot.release()
+
+
+class _Slot:
+    """The place of one command in the window, freed once."""
+
+    def __init__(self, release: Callable[[], None]):
+        self._release = release
+        self.timer = None
+
+    def release(self) -> None:
+        if self._release is not None:
+            self._release()
+        self.discard()
+
+    def discard(self) -> None:
+        """Forgets the slot without freeing it, because the window was reset."""
+        self._release = None
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
@@ -1,10 +1,9 @@
 """Support for Xcomfort sensors."""
 from __future__ import annotations
 
-import time
-import math
 import logging
-from typing import cast
+from datetime import timedelta
+from decimal import Decimal
 
 from homeassistant.components.sensor import (
     RestoreSensor,
@@ -22,11 +21,20 @@ from homeassistant.const import (
     ENERGY_KILO_WATT_HOUR,
     ENERGY_WATT_HOUR,
     PERCENTAGE,
+    TIME_MILLISECONDS,
+    TIME_SECONDS,
 )
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.entity import EntityCategory
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_track_time_interval
 
+from .const import DOMAIN, ENERGY_CHECKPOINT_INTERVAL
+from .energy import EnergyIntegrator
 from .hub import XComfortHub
+from .index import CAP_HUMIDITY, CAP_POWER, CAP_TEMPERATURE, DeviceIndex
+from .reporting import ReportingSensor
+from .trace import get_tracer
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -35,36 +43,140 @@ async def async_setup_entry(
     hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
 ) -> None:
     hub = XComfortHub.get_hub(hass, entry)
-
-    rooms = hub.rooms
-    devices = hub.devices
-
-    _LOGGER.info(f"Found {len(rooms)} xcomfort rooms")
-    _LOGGER.info(f"Found {len(devices)} xcomfort devices")
-
-    sensors = list()
-    for room in rooms:
-        if room.state.value is not None:
-            if room.state.value.power is not None:
-                _LOGGER.info(f"Adding power sensor for room {room.name}")
-                sensors.append(XComfortPowerSensor(room))
-
-            if room.state.value.temperature is not None:
-                _LOGGER.info(f"Adding temperature sensor for room {room.name}")
-                sensors.append(XComfortEnergySensor(room))
-
-    for device in devices:
-        if isinstance(device, RcTouch):
-            _LOGGER.info(f"Adding humidity sensor for device {device}")
-            sensors.append(XComfortHumiditySensor(device))
-
-    _LOGGER.info(f"Added {len(sensors)} rc touch units")
-    async_add_entities(sensors)
-    return
+    log = get_tracer(__name__, hub.identifier)
+
+    log("Found %s xcomfort rooms", len(hub.index.rooms))
+    log("Found %s xcomfort devices", len(hub.index.devices))
+
+    @callback
+    def create_sensors(batch: DeviceIndex):
+        sensors = list()
+        for room in batch.rooms_with(CAP_POWER):
+            log("Adding power sensor for room %s", room.name)
+            sensors.append(XComfortPowerSensor(hub, room))
+
+        for room in batch.rooms_with(CAP_TEMPERATURE):
+            log("Adding temperature sensor for room %s", room.name)
+            sensors.append(XComfortEnergySensor(hub, room))
+
+        for device in batch.with_capability(CAP_HUMIDITY):
+            log("Adding humidity sensor for device %s", device)
+            sensors.append(XComfortHumiditySensor(hub, device))
+
+        log("Added %s rc touch units", len(sensors))
+        async_add_entities(sensors)
+        return sensors
+
+    hub.add_entity_factory(create_sensors)
+
+    async_add_entities(
+        [XComfortMetricSensor(hub, *description) for description in METRIC_SENSORS]
+        + [XComfortConnectionSensor(hub)]
+    )
+
+
+def _milliseconds(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+# key, name, unit, state class, value
+METRIC_SENSORS = (
+    (
+        "messages_received",
+        "Messages received",
+        None,
+        SensorStateClass.TOTAL_INCREASING,
+        lambda hub: hub.metrics.counter("messages_received"),
+    ),
+    (
+        "messages_sent",
+        "Messages sent",
+        None,
+        SensorStateClass.TOTAL_INCREASING,
+        lambda hub: hub.metrics.counter("messages_sent"),
+    ),
+    (
+        "state_writes",
+        "State writes",
+        None,
+        SensorStateClass.TOTAL_INCREASING,
+        lambda hub: hub.writer.written,
+    ),
+    (
+        "reconnects",
+        "Reconnects",
+        None,
+        SensorStateClass.TOTAL_INCREASING,
+        lambda hub: hub.metrics.counter("disconnects"),
+    ),
+    (
+        "time_to_recovery",
+        "Time to recovery",
+        TIME_SECONDS,
+        None,
+        lambda hub: hub.supervisor.last_time_to_recovery and round(hub.supervisor.last_time_to_recovery, 1),
+    ),
+    (
+        "command_latency_p50",
+        "Command latency p50",
+        TIME_MILLISECONDS,
+        SensorStateClass.MEASUREMENT,
+        lambda hub: _milliseconds(hub.metrics.percentile("command_rtt", 50)),
+    ),
+    (
+        "command_latency_p99",
+        "Command latency p99",
+        TIME_MILLISECONDS,
+        SensorStateClass.MEASUREMENT,
+        lambda hub: _milliseconds(hub.metrics.percentile("command_rtt", 99)),
+    ),
+    (
+        "confirmation_latency_p99",
+        "Confirmation latency p99",
+        TIME_MILLISECONDS,
+        SensorStateClass.MEASUREMENT,
+        lambda hub: _milliseconds(hub.metrics.percentile("confirmation", 99)),
+    ),
+    (
+        "confirmations_timed_out",
+        "Confirmations timed out",
+        None,
+        SensorStateClass.TOTAL_INCREASING,
+        lambda hub: hub.metrics.counter("acks_timed_out"),
+    ),
+    (
+        "command_queue_depth",
+        "Commands waiting",
+        None,
+        SensorStateClass.MEASUREMENT,
+        lambda hub: hub.scheduler.depth,
+    ),
+    (
+        "command_wait_p99",
+        "Command wait p99",
+        TIME_MILLISECONDS,
+        SensorStateClass.MEASUREMENT,
+        lambda hub: _milliseconds(hub.metrics.percentile("command_wait", 99)),
+    ),
+    (
+        "message_handling_p99",
+        "Message handling p99",
+        TIME_MILLISECONDS,
+        SensorStateClass.MEASUREMENT,
+        lambda hub: _milliseconds(hub.metrics.percentile("message_handling", 99)),
+    ),
+    (
+        "dispatch_p99",
+        "Dispatch p99",
+        TIME_MILLISECONDS,
+        SensorStateClass.MEASUREMENT,
+        lambda hub: _milliseconds(hub.metrics.percentile("dispatch", 99)),
+    ),
+)
 
 
-class XComfortPowerSensor(SensorEntity):
-    def __init__(self, room: Room):
+class XComfortPowerSensor(ReportingSensor, SensorEntity):
+    def __init__(self, hub: XComfortHub, room: Room):
         self._attr_device_class = SensorEntityDescription(
             key="current_consumption",
             device_class=SensorDeviceClass.ENERGY,
@@ -72,19 +184,21 @@ class XComfortPowerSensor(SensorEntity):
             state_class=SensorStateClass.MEASUREMENT,
             name="Current consumption",
         )
+        self.hub = hub
         self._room = room
+        self.room_id = room.room_id
         self._attr_name = self._room.name
-        self._attr_unique_id = f"energy_{self._room.room_id}"
+        self._attr_unique_id = f"energy_{DOMAIN}_{hub.identifier}-{room.room_id}"
         self._state = None
-        self._room.state.subscribe(lambda state: self._state_change(state))
+        self._init_reporting("power")
 
-    def _state_change(self, state):
-
-        should_update = self._state is not None
+    async def async_added_to_hass(self) -> None:
+        self.async_on_remove(self.hub.subscribe_room(self._room, self._state_change))
 
+    def _state_change(self, state):
         self._state = state
-        if should_update:
-            self.async_write_ha_state()
+        if state is not None:
+            self._report(state.power)
 
     @property
     def device_class(self):
@@ -96,14 +210,14 @@ class XComfortPowerSensor(SensorEntity):
 
     @property
     def native_value(self):
-        return self._state.power
+        return self._reported
 
 
-class XComfortEnergySensor(RestoreSensor):
+class XComfortEnergySensor(ReportingSensor, RestoreSensor):
 
     _attr_state_class = SensorStateClass.TOTAL
 
-    def __init__(self, room: Room):
+    def __init__(self, hub: XComfortHub, room: Room):
         self._attr_device_class = SensorEntityDescription(
             key="energy_used",
             device_class=SensorDeviceClass.ENERGY,
@@ -111,36 +225,42 @@ class XComfortEnergySensor(RestoreSensor):
             state_class=SensorStateClass.TOTAL_INCREASING,
             name="Energy consumption",
         )
+        self.hub = hub
         self._room = room
+        self.room_id = room.room_id
         self._attr_name = self._room.name
-        self._attr_unique_id = f"energy_kwh_{self._room.room_id}"
+        self._attr_unique_id = f"energy_kwh_{DOMAIN}_{hub.identifier}-{room.room_id}"
         self._state = None
-        self._room.state.subscribe(lambda state: self._state_change(state))
-        self._updateTime = time.time()
-        self._consumption = 0
+        self._integrator = EnergyIntegrator()
+        self._init_reporting("energy")
 
     async def async_added_to_hass(self) -> None:
         """Call when entity about to be added to hass."""
         await super().async_added_to_hass()
         savedstate = await self.async_get_last_sensor_data()
-        if savedstate:
-            self._consumption = cast(float, savedstate.native_value)
+        # Unavailable or unknown when it was saved, e.g. at a shutdown while the bridge was down
+        if savedstate is not None and isinstance(savedstate.native_value, (int, float, Decimal)):
+            self._integrator.total += float(savedstate.native_value)
+        # The total is only shown once it includes the restored one, so it never looks reset
+        self._reporting.set(self._integrator.total)
+        self.async_on_remove(self.hub.subscribe_room(self._room, self._state_change))
+        self.async_on_remove(
+            async_track_time_interval(
+                self.hass, self._checkpoint, timedelta(seconds=ENERGY_CHECKPOINT_INTERVAL)
+            )
+        )
 
     def _state_change(self, state):
-
-        should_update = self._state is not None
         self._state = state
-        if should_update:
-            self.async_write_ha_state()
-
-    def calculate(self):
-        timediff = math.floor(
-            time.time() - self._updateTime
-        )  # number of seconds since last update
-        self._consumption += (
-            self._state.power / 3600 / 1000 * timediff
-        )  # Calculate, in kWh, energy consumption since last update.
-        self._updateTime = time.time()
+        if state is not None:
+            self._integrator.update(state.power)
+            self._report(self._integrator.total)
+
+    @callback
+    def _checkpoint(self, now=None):
+        """Integrates up to now and reports the total, also while power is constant."""
+        self._integrator.advance()
+        self._report(self._integrator.total)
 
     @property
     def device_class(self):
@@ -152,12 +272,11 @@ class XComfortEnergySensor(RestoreSensor):
 
     @property
     def native_value(self):
-        self.calculate()
-        return self._consumption
+        return self._reported
 
 
-class XComfortHumiditySensor(SensorEntity):
-    def __init__(self, device: RcTouch):
+class XComfortHumiditySensor(ReportingSensor, SensorEntity):
+    def __init__(self, hub: XComfortHub, device: RcTouch):
         self._attr_device_class = SensorEntityDescription(
             key="humidity",
             device_class=SensorDeviceClass.HUMIDITY,
@@ -165,19 +284,21 @@ class XComfortHumiditySensor(SensorEntity):
             state_class=SensorStateClass.MEASUREMENT,
             name="Humidity",
         )
+        self.hub = hub
         self._device = device
+        self.device_id = device.device_id
         self._attr_name = self._device.name
-        self._attr_unique_id = f"humidity_{self._device.name}_{self._device.device_id}"
+        self._attr_unique_id = f"humidity_{DOMAIN}_{hub.identifier}-{device.device_id}"
         self._state = None
-        self._device.state.subscribe(lambda state: self._state_change(state))
+        self._init_reporting("humidity")
 
-    def _state_change(self, state):
-
-        should_update = self._state is not None
+    async def async_added_to_hass(self) -> None:
+        self.async_on_remove(self.hub.subscribe_device(self._device, self._state_change))
 
+    def _state_change(self, state):
         self._state = state
-        if should_update:
-            self.async_write_ha_state()
+        if state is not None:
+            self._report(state.humidity)
 
     @property
     def device_class(self):
@@ -189,4 +310,49 @@ class XComfortHumiditySensor(SensorEntity):
 
     @property
     def native_value(self):
-        return self._state.humidity
+        return self._reported
+
+
+class XComfortMetricSensor(SensorEntity):
+    """Diagnostic sensor for one metric of the bridge connection. Polled."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, hub: XComfortHub, key, name, unit, state_class, value):
+        self.hub = hub
+        self._value = value
+        self._attr_name = f"{hub.identifier} {name}"
+        self._attr_unique_id = f"metric_{DOMAIN}_{hub.identifier}-{key}"
+        self._attr_native_unit_of_measurement = unit
+        self._attr_state_class = state_class
+
+    @property
+    def device_info(self):
+        return self.hub.device_info
+
+    @property
+    def native_value(self):
+        return self._value(self.hub)
+
+
+class XComfortConnectionSensor(SensorEntity):
+    """Diagnostic sensor for the state of the bridge connection."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_should_poll = False
+
+    def __init__(self, hub: XComfortHub):
+        self.hub = hub
+        self._attr_name = f"{hub.identifier} Connection"
+        self._attr_unique_id = f"metric_{DOMAIN}_{hub.identifier}-connection"
+
+    async def async_added_to_hass(self) -> None:
+        self.async_on_remove(self.hub.supervisor.add_listener(self.async_write_ha_state))
+
+    @property
+    def device_info(self):
+        return self.hub.device_info
+
+    @property
+    def native_value(self):
+        return self.hub.supervisor.state
@@ -0,0 +1,82 @@
+"""Authenticated bridge connections, opened before the hub that uses them."""
+
+from __future__ import annotations
+
+import asyncio
+import importlib
+import logging
+
+import aiohttp
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import aiohttp_client
+
+from .const import CONNECT_TIMEOUT, DOMAIN, SESSION_HANDOFF_TIMEOUT
+
+_LOGGER = logging.getLogger(__name__)
+
+# Handshakes handed off to the setup of an entry, by unique ID
+_HANDOFFS = f"{DOMAIN}_handoffs"
+
+
+class ConnectError(HomeAssistantError):
+    """Connecting to a bridge failed. The reason is an error key of the config flow,
+    detail what the bridge or the network said, if anything."""
+
+    def __init__(self, reason: str, detail: str = ""):
+        super().__init__(f"{reason}: {detail}" if detail else reason)
+        self.reason = reason
+        self.detail = detail
+
+
+async def async_connect(hass: HomeAssistant, ip_address: str, auth_key: str, timeout: float = CONNECT_TIMEOUT):
+    """Connects to the bridge at ip_address and logs in with auth_key, giving up
+    after timeout seconds. Returns the Handshake, with the connection ready to pump,
+    or raises ConnectError."""
+    # Like the hub, the handshake pulls in the crypto stack, so it is imported off the event loop
+    handshake = await hass.async_add_executor_job(importlib.import_module, f"{__package__}.handshake")
+    session = aiohttp_client.async_get_clientsession(hass)
+
+    try:
+        return await asyncio.wait_for(handshake.connect(session, ip_address, auth_key), timeout)
+    except asyncio.TimeoutError as e:
+        raise ConnectError("timeout") from e
+    except (aiohttp.ClientError, OSError) as e:
+        raise ConnectError("cannot_connect", repr(e)) from e
+    except handshake.HandshakeError as e:
+        raise ConnectError(e.reason, e.detail) from e
+
+
+@callback
+def async_hand_off(hass: HomeAssistant, unique_id: str, handshake) -> None:
+    """Keeps the connection of handshake for the setup of the entry with unique_id,
+    see async_take. It is closed if not taken within SESSION_HANDOFF_TIMEOUT seconds."""
+    handoffs = hass.data.setdefault(_HANDOFFS, {})
+    _discard(hass, handoffs.pop(unique_id, None))
+
+    @callback
+    def expire() -> None:
+        if handoffs.get(unique_id, (None,))[0] is handshake:
+            _LOGGER.debug(f"Closing the unused connection to {unique_id}")
+            _discard(hass, handoffs.pop(unique_id))
+
+    handoffs[unique_id] = (handshake, hass.loop.call_later(SESSION_HANDOFF_TIMEOUT, expire))
+
+
+@callback
+def async_take(hass: HomeAssistant, unique_id: str | None):
+    """The handshake handed off for the entry with unique_id, if any."""
+    handoff = hass.data.get(_HANDOFFS, {}).pop(unique_id, None)
+    if handoff is None:
+        return None
+    handshake, timer = handoff
+    timer.cancel()
+    return handshake
+
+
+def _discard(hass: HomeAssistant, handoff) -> None:
+    if handoff is not None:
+        handshake, timer = handoff
+        timer.cancel()
+        hass.async_create_task(handshake.connection.close())
@@ -0,0 +1,195 @@
+"""Bulk import of hourly room energy and power statistics into the recorder."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Callable
+
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import async_add_external_statistics, get_last_statistics
+from homeassistant.const import ENERGY_KILO_WATT_HOUR, POWER_WATT
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.event import async_track_utc_time_change
+from homeassistant.util import dt as dt_util, slugify
+
+from .const import DOMAIN, STATISTICS_IMPORT_DELAY
+from .energy import HourlyEnergy
+from .metrics import Metrics
+from .trace import get_tracer
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RoomStatistics:
+    """Imports the energy and power of rooms as hourly external statistics.
+
+    Power readings are collected per room in memory, see HourlyEnergy, and the
+    hours that ended are imported in bulk, as an energy statistic with a running
+    sum and a power statistic with mean, min and max per room. They can be picked
+    in the Energy dashboard, and stay accurate however rarely the energy sensors
+    are written.
+
+    Hours are imported shortly after every full hour, and on stop, which
+    includes the current hour. Sums continue from the last imported one, and an
+    hour imported on stop is completed with what is collected after a restart.
+    Collecting is paused while the bridge is unreachable, so hours without a
+    connection are left out instead of estimated."""
+
+    def __init__(self, hass: HomeAssistant, identifier: str, metrics: Metrics):
+        self.hass = hass
+        self.metrics = metrics
+        self.log = get_tracer(__name__, identifier)
+        self._prefix = slugify(identifier)
+        self._rooms = dict()
+        # Statistic id -> [start of the last imported hour, sum before it, energy of it]
+        self._sums = dict()
+        # Statistic id -> bucket of the last imported hour, to merge the power of an hour imported twice
+        self._last_power = dict()
+        self._lock = asyncio.Lock()
+        self._stop_hourly = None
+
+    def start(self) -> None:
+        self._stop_hourly = async_track_utc_time_change(
+            self.hass, self._hourly, minute=0, second=STATISTICS_IMPORT_DELAY
+        )
+
+    async def stop(self) -> None:
+        if self._stop_hourly is not None:
+            self._stop_hourly()
+            self._stop_hourly = None
+        await self.flush(include_current=True)
+
+    def statistic_ids(self, room_id) -> tuple[str, str]:
+        """The ids of the energy and the power statistic of room_id."""
+        base = f"{DOMAIN}:{self._prefix}_room_{room_id}"
+        return f"{base}_energy", f"{base}_power"
+
+    def room_callback(self, room) -> Callable:
+        """A state callback collecting the power of room."""
+        # A room that is added again, e.g. after it changed, keeps collecting where it was
+        previous = self._rooms.get(room.room_id)
+        hourly = previous[1] if previous is not None else HourlyEnergy()
+        self._rooms[room.room_id] = (room.name, hourly)
+
+        def update(state):
+            if state is not None:
+                hourly.update(state.power)
+
+        return update
+
+    def pause(self) -> None:
+        """Stops collecting until the rooms report their power again, e.g. after a disconnect."""
+        now = time.time()
+        for _, hourly in self._rooms.values():
+            hourly.pause(now)
+
+    async def _hourly(self, now=None) -> None:
+        await self.flush()
+
+    async def flush(self, include_current: bool = False) -> None:
+        """Imports the hours that ended, and the current hour too if include_current."""
+        async with self._lock:
+            start = time.perf_counter()
+            now = time.time()
+            hours = 0
+            for room_id, (name, hourly) in list(self._rooms.items()):
+                buckets = hourly.take(now, include_current)
+                if buckets:
+                    hours += await self._import(room_id, name, buckets)
+            if hours:
+                self.metrics.increment("statistics_hours_imported", hours)
+                self.metrics.record("statistics_import", time.perf_counter() - start)
+                self.log("imported %s hours of room statistics", hours)
+
+    async def _import(self, room_id, name: str, buckets: list) -> int:
+        energy_id, power_id = self.statistic_ids(room_id)
+        if energy_id not in self._sums:
+            self._sums[energy_id] = await self._last_sum(energy_id)
+        last = self._sums[energy_id]
+
+        energy_rows = list()
+        power_rows = list()
+        for bucket in buckets:
+            if last[0] is not None and bucket["start"] < last[0]:
+                continue
+            if bucket["start"] == last[0]:
+                # Completes an hour imported before, on stop or a reconnect
+                last[2] += bucket["energy"]
+                bucket = _merge(self._last_power.get(power_id), bucket)
+            else:
+                last[:] = [bucket["start"], last[1] + last[2], bucket["energy"]]
+            self._last_power[power_id] = bucket
+            start = dt_util.utc_from_timestamp(bucket["start"])
+            total = last[1] + last[2]
+            energy_rows.append(StatisticData(start=start, state=total, sum=total))
+            power_rows.append(
+                StatisticData(start=start, mean=bucket["mean"], min=bucket["min"], max=bucket["max"])
+            )
+
+        if not energy_rows:
+            return 0
+        async_add_external_statistics(
+            self.hass,
+            StatisticMetaData(
+                has_mean=False,
+                has_sum=True,
+                name=f"{name} energy",
+                source=DOMAIN,
+                statistic_id=energy_id,
+                unit_of_measurement=ENERGY_KILO_WATT_HOUR,
+            ),
+            energy_rows,
+        )
+        async_add_external_statistics(
+            self.hass,
+            StatisticMetaData(
+                has_mean=True,
+                has_sum=False,
+                name=f"{name} power",
+                source=DOMAIN,
+                statistic_id=power_id,
+                unit_of_measurement=POWER_WATT,
+            ),
+            power_rows,
+        )
+        return len(energy_rows)
+
+    async def _last_sum(self, statistic_id: str) -> list:
+        try:
+            rows = await get_instance(self.hass).async_add_executor_job(
+                get_last_statistics, self.hass, 2, statistic_id, True, {"sum"}
+            )
+        except Exception as e:  # pylint: disable=broad-except
+            _LOGGER.warning(f"Failed reading the last statistics of {statistic_id}, starting from 0: {e!r}")
+            return [None, 0.0, 0.0]
+
+        rows = rows.get(statistic_id, [])
+        if not rows:
+            return [None, 0.0, 0.0]
+        last_sum = rows[0]["sum"] or 0.0
+        before = (rows[1]["sum"] or 0.0) if len(rows) > 1 else 0.0
+        return [_timestamp(rows[0]["start"]), before, last_sum - before]
+
+
+def _merge(before: dict | None, bucket: dict) -> dict:
+    """The power of an hour from the buckets of two parts of it. Only the
+    second is known if the first was imported before a restart."""
+    if before is None or before["start"] != bucket["start"]:
+        return bucket
+    seconds = before["seconds"] + bucket["seconds"]
+    if not seconds:
+        return bucket
+    return {
+        **bucket,
+        "seconds": seconds,
+        "mean": (before["mean"] * before["seconds"] + bucket["mean"] * bucket["seconds"]) / seconds,
+        "min": min(before["min"], bucket["min"]),
+        "max": max(before["max"], bucket["max"]),
+    }
+
+
+def _timestamp(start) -> float:
+    return start.timestamp() if hasattr(start, "timestamp") else float(start)
@@ -0,0 +1,141 @@
+"""Supervision of the websocket connection to an xComfort bridge."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from typing import Callable
+
+from xcomfort.bridge import Bridge, State
+
+from .const import RECONNECT_INITIAL_DELAY, RECONNECT_MAX_DELAY, RECONNECT_STABLE_AFTER
+from .metrics import Metrics
+
+_LOGGER = logging.getLogger(__name__)
+
+STATE_CONNECTING = "connecting"
+STATE_CONNECTED = "connected"
+STATE_DISCONNECTED = "disconnected"
+STATE_STOPPED = "stopped"
+
+
+class ConnectionSupervisor:
+    """Owns the task that runs the bridge connection, and reconnects with
+    jittered exponential backoff when it drops.
+
+    Takes the place of `Bridge.run`, which retries every 5 seconds without
+    limit or reporting. Device and room objects are kept across reconnects,
+    and the bridge sends their full state again after each connect, so entities
+    resync without being set up again."""
+
+    def __init__(
+        self,
+        bridge: Bridge,
+        metrics: Metrics,
+        initial_delay: float = RECONNECT_INITIAL_DELAY,
+        max_delay: float = RECONNECT_MAX_DELAY,
+        stable_after: float = RECONNECT_STABLE_AFTER,
+    ):
+        self.bridge = bridge
+        self.metrics = metrics
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.stable_after = stable_after
+        self.state = STATE_STOPPED
+        self.last_error = None
+        self.last_time_to_recovery = None
+        self._disconnected_at = None
+        self._task = None
+        self._listeners = list()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Closes the connection and stops reconnecting."""
+        try:
+            await self.bridge.close()
+        finally:
+            # Even if closing failed, nothing may reconnect afterwards
+            if self._task is not None:
+                self._task.cancel()
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
+                self._task = None
+            self._set_state(STATE_STOPPED)
+
+    def add_listener(self, listener: Callable[[], None]) -> Callable[[], None]:
+        """Calls listener on every connection state change. Returns a function removing it."""
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+    def _set_state(self, state: str) -> None:
+        if state == self.state:
+            return
+        self.state = state
+        for listener in list(self._listeners):
+            listener()
+
+    def backoff(self, attempt: int) -> float:
+        """Seconds to wait before reconnect attempt number attempt (from 0)."""
+        delay = min(self.max_delay, self.initial_delay * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _run(self):
+        bridge = self.bridge
+        bridge.state = State.Initializing
+        attempt = 0
+
+        while bridge.state != State.Closing:
+            connected_at = None
+            try:
+                self._set_state(STATE_CONNECTING)
+                await bridge._connect()
+                connected_at = time.monotonic()
+                self.metrics.increment("connects")
+                if self._disconnected_at is not None:
+                    self.last_time_to_recovery = connected_at - self._disconnected_at
+                    self.metrics.record("time_to_recovery", self.last_time_to_recovery)
+                    _LOGGER.info(
+                        f"Reconnected to bridge {bridge.ip_address} after {self.last_time_to_recovery:.1f}s"
+                    )
+                    self._disconnected_at = None
+                self._set_state(STATE_CONNECTED)
+
+                await bridge.connection.pump()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # pylint: disable=broad-except
+                self.last_error = repr(e)
+                self.metrics.increment("connection_errors")
+                if bridge.state != State.Closing:
+                    _LOGGER.warning(f"Bridge {bridge.ip_address} connection error: {e!r}")
+            finally:
+                if bridge.connection_subscription is not None:
+                    bridge.connection_subscription.dispose()
+                    bridge.connection_subscription = None
+                # The library's close would dispose the subscription of a connection that is still set
+                bridge.connection = None
+
+            if bridge.state == State.Closing:
+                break
+
+            if connected_at is not None:
+                self.metrics.increment("disconnects")
+                if time.monotonic() - connected_at >= self.stable_after:
+                    attempt = 0
+            if self._disconnected_at is None:
+                self._disconnected_at = time.monotonic()
+            self._set_state(STATE_DISCONNECTED)
+
+            delay = self.backoff(attempt)
+            attempt += 1
+            _LOGGER.info(f"Reconnecting to bridge {bridge.ip_address} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        bridge.state = State.Uninitialized
@@ -0,0 +1,70 @@
+"""Rate limiting of outgoing xComfort commands."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+_LOGGER = logging.getLogger(__name__)
+
+_NOTHING = object()
+
+
+class LatestValueSender:
+    """Sends values through a coroutine function at most once per interval.
+
+    A value submitted while an older one is still waiting replaces it, so only
+    the latest value is guaranteed to be sent."""
+
+    def __init__(self, send: Callable[[Any], Awaitable], interval: float):
+        self._send = send
+        self.interval = interval
+        self._pending = _NOTHING
+        self._task = None
+        self._last_sent = None
+        self.sent = 0
+        self.dropped = 0
+
+    def submit(self, value) -> None:
+        """Queues value for sending, replacing any value still waiting."""
+        if self._pending is not _NOTHING:
+            self.dropped += 1
+        self._pending = value
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def discard(self) -> None:
+        """Drops the waiting value, if any, e.g. because a newer command overrides it."""
+        if self._pending is not _NOTHING:
+            self.dropped += 1
+            self._pending = _NOTHING
+
+    def cancel(self) -> None:
+        """Drops the waiting value and stops sending."""
+        self._pending = _NOTHING
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        try:
+            while self._pending is not _NOTHING:
+                if self._last_sent is not None:
+                    wait = self._last_sent + self.interval - time.monotonic()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                        if self._pending is _NOTHING:
+                            break
+
+                value, self._pending = self._pending, _NOTHING
+                self._last_sent = time.monotonic()
+                try:
+                    await self._send(value)
+                    self.sent += 1
+                except Exception:  # pylint: disable=broad-except
+                    _LOGGER.exception(f"Error sending {value}")
+        finally:
+            if self._task is asyncio.current_task():
+                self._task = None
@@ -0,0 +1,70 @@
+"""Device and room topology cache for xComfort bridges."""
+
+from __future__ import annotations
+
+import logging
+
+from .bridge import XComfortBridge
+
+_LOGGER = logging.getLogger(__name__)
+
+# Payload fields that decide which object and entities are created for a device or room
+DEVICE_IDENTITY = ("name", "devType", "compId", "dimmable", "shRuntime")
+ROOM_IDENTITY = ("name", "devices")
+
+
+def snapshot_topology(bridge: XComfortBridge) -> dict:
+    """Builds a json serializable snapshot of what the bridge reported,
+    including the latest known state of every device and room."""
+
+    def with_state(payload: dict, obj) -> dict:
+        state = obj.state.value if obj is not None else None
+        raw = getattr(state, "raw", None)
+        return {**payload, **raw} if raw else dict(payload)
+
+    return {
+        "comps": list(bridge.comp_payloads.values()),
+        "devices": [
+            with_state(payload, bridge._devices.get(device_id))
+            for device_id, payload in bridge.device_payloads.items()
+        ],
+        "rooms": [
+            with_state(payload, bridge._rooms.get(room_id))
+            for room_id, payload in bridge.room_payloads.items()
+        ],
+    }
+
+
+def restore_topology(bridge: XComfortBridge, topology: dict) -> None:
+    """Creates devices and rooms on bridge from a snapshot, as if it had reported them.
+    When the bridge later reports the same ids, these objects are updated in place."""
+    for comp_payload in topology.get("comps", ()):
+        try:
+            bridge._handle_comp_payload(comp_payload)
+        except Exception as e:  # pylint: disable=broad-except
+            _LOGGER.warning(f"Failed to restore comp payload: {e!r}")
+
+    for device_payload in topology.get("devices", ()):
+        try:
+            bridge._handle_device_payload(device_payload)
+        except Exception as e:  # pylint: disable=broad-except
+            _LOGGER.warning(f"Failed to restore device payload: {e!r}")
+
+    for room_payload in topology.get("rooms", ()):
+        try:
+            bridge._handle_room_payload(room_payload)
+        except Exception as e:  # pylint: disable=broad-except
+            _LOGGER.warning(f"Failed to restore room payload: {e!r}")
+
+
+def diff_payloads(old: dict, new: dict, identity: tuple) -> tuple[set, set, set]:
+    """Compares two id -> payload dicts.
+    Returns the ids that were added, removed, and changed in one of the identity fields."""
+    added = new.keys() - old.keys()
+    removed = old.keys() - new.keys()
+    changed = {
+        key
+        for key in old.keys() & new.keys()
+        if any(old[key].get(field) != new[key].get(field) for field in identity)
+    }
+    return added, removed, changed
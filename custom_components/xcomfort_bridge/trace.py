@@ -0,0 +1,94 @@
+"""In-memory trace of recent events, for debugging without log IO."""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import time
+from collections import deque
+from datetime import datetime
+
+from .const import TRACE_BUFFER_SIZE
+
+# A ring buffer per context, so a busy bridge does not push the events of
+# another out. Events without a context have a buffer of their own
+_BUFFERS: dict[str | None, deque] = dict()
+
+_TRACERS: dict[tuple[str, str | None], Tracer] = dict()
+
+
+class Tracer:
+    """Records events of one module into the ring buffer of its context.
+
+    Called like a logger, with a %-style message and its arguments. Only a
+    tuple is stored, and the message is formatted when the buffer is dumped, so
+    the arguments are shown as they are at that time, or when freeze is called.
+    With debug logging enabled for the module, events also go to its logger."""
+
+    def __init__(self, name: str, context: str | None = None):
+        self.name = name.rsplit(".", 1)[-1]
+        if context is not None:
+            self.name = f"{self.name}[{context}]"
+        self._buffer = _buffer(context)
+        self._logger = logging.getLogger(name)
+
+    def __call__(self, msg: str, *args) -> None:
+        self._buffer.append((time.time(), self.name, msg, args))
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug("%s: " + msg, self.name, *args)
+
+
+def get_tracer(name: str, context: str | None = None) -> Tracer:
+    """A tracer for module name. Events of an object with a context, like the hub
+    of one bridge and its entities, are kept and shown with it."""
+    tracer = _TRACERS.get((name, context))
+    if tracer is None:
+        tracer = _TRACERS[(name, context)] = Tracer(name, context)
+    return tracer
+
+
+def _buffer(context: str | None) -> deque:
+    buffer = _BUFFERS.get(context)
+    if buffer is None:
+        buffer = _BUFFERS[context] = deque(maxlen=TRACE_BUFFER_SIZE)
+    return buffer
+
+
+def _buffers(context: str | None) -> list[deque]:
+    if context is None:
+        return list(_BUFFERS.values())
+    return [_buffer(context)]
+
+
+def _timestamp(event: tuple) -> float:
+    return event[0]
+
+
+def _format(msg: str, args: tuple) -> str:
+    try:
+        return msg % args if args else msg
+    except Exception as e:  # pylint: disable=broad-except
+        return f"{msg} {args!r} ({e!r})"
+
+
+def dump(context: str | None = None) -> list[str]:
+    """Formats the events of context, or of all contexts, oldest first."""
+    lines = list()
+    for timestamp, name, msg, args in heapq.merge(*(list(buffer) for buffer in _buffers(context)), key=_timestamp):
+        lines.append(f"{datetime.fromtimestamp(timestamp).isoformat()} {name}: {_format(msg, args)}")
+    return lines
+
+
+def freeze(context: str | None = None) -> None:
+    """Formats the arguments of the events of context, or of all contexts, now,
+    so the buffer no longer references them, e.g. the devices of a hub that is unloaded."""
+    for buffer in _buffers(context):
+        for i, (timestamp, name, msg, args) in enumerate(buffer):
+            if args:
+                buffer[i] = (timestamp, name, _format(msg, args), ())
+
+
+def clear(context: str | None = None) -> None:
+    """Empties the buffer of context, or of all contexts."""
+    for buffer in _buffers(context):
+        buffer.clear()
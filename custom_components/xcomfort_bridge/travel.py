@@ -0,0 +1,147 @@
+"""Position of shades while they move, estimated from how long they take to travel."""
+
+from __future__ import annotations
+
+import time
+from typing import Callable
+
+from .const import DEFAULT_SHADE_TRAVEL_TIME, SHADE_ACK_TIMEOUT, SHADE_LEARN_MIN_TRAVEL
+
+# Weight of a new observation in the learned travel times, once there are a few
+LEARN_WEIGHT = 0.3
+
+# Seconds no shade travels all the way in. A move reported done sooner was not
+# reported when the shade got there
+MIN_TRAVEL_TIME = 2
+
+
+class TravelModel:
+    """Estimates the position of a shade while it moves, from the time it takes
+    to travel all the way open and all the way closed.
+
+    Positions are in xcomfort terms, 0 being open and 100 closed. A move starts
+    at a known position towards a target. Until the bridge reports where the
+    shade ended up, the estimate is where the shade would be by now, and after
+    a stop, where it was when stopped.
+
+    Travel times start at DEFAULT_SHADE_TRAVEL_TIME, and are learned from moves
+    that the bridge reports reaching their target. They are averaged over the
+    first moves, and then follow changes with weight LEARN_WEIGHT.
+
+    Timestamps default to a monotonic clock, but can be passed explicitly."""
+
+    def __init__(
+        self,
+        open_time: float = DEFAULT_SHADE_TRAVEL_TIME,
+        close_time: float = DEFAULT_SHADE_TRAVEL_TIME,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.open_time = open_time
+        self.close_time = close_time
+        self.moves_learned = {"open": 0, "close": 0}
+        self._clock = clock
+        # (start position, target, start time) of the move in progress
+        self._move = None
+        # Where a stopped shade is estimated to be, until the bridge reports it
+        self._held = None
+
+    @property
+    def active(self) -> bool:
+        """Whether there is an estimate, because a move has not been reported to end."""
+        return self._move is not None or self._held is not None
+
+    @property
+    def moving(self) -> bool:
+        return self._move is not None
+
+    @property
+    def start_position(self) -> int | None:
+        return self._move[0] if self._move is not None else None
+
+    @property
+    def opening(self) -> bool:
+        return self._move is not None and self._move[1] < self._move[0]
+
+    @property
+    def closing(self) -> bool:
+        return self._move is not None and self._move[1] > self._move[0]
+
+    def _travel_time(self, start: int, target: int) -> float:
+        return self.close_time if target > start else self.open_time
+
+    def start(self, position: int | None, target: int, now: float | None = None) -> None:
+        """Starts a move from position towards target. Starting while moving
+        continues from the estimated position."""
+        now = self._clock() if now is None else now
+        if self.active:
+            position = self.position(now)
+        self._held = None
+        self._move = None
+        if position is not None and position != target:
+            self._move = (position, target, now)
+
+    def position(self, now: float | None = None) -> int | None:
+        """The estimated position, or None without an active move."""
+        if self._move is None:
+            return self._held
+        start, target, started = self._move
+        now = self._clock() if now is None else now
+        travelled = (now - started) * 100 / self._travel_time(start, target)
+        if target > start:
+            return min(target, round(start + travelled))
+        return max(target, round(start - travelled))
+
+    def arrived(self, now: float | None = None) -> bool:
+        """Whether a moving shade would have reached its target by now."""
+        return self._move is not None and self.position(now) == self._move[1]
+
+    def stop(self, now: float | None = None) -> None:
+        """Holds the estimated position, until the bridge reports where the shade stopped."""
+        if self._move is not None:
+            self._held = self.position(now)
+            self._move = None
+
+    def cancel(self) -> None:
+        """Drops the estimate, e.g. because the bridge never reported the move."""
+        self._move = None
+        self._held = None
+
+    def finish(self, position: int | None, now: float | None = None) -> bool:
+        """Ends the move at the position the bridge reported. If it reached its
+        target far enough from where it started, the travel time in its direction
+        is learned. Returns whether it was."""
+        move = self._move
+        self.cancel()
+        if move is None or position is None:
+            return False
+
+        start, target, started = move
+        distance = abs(position - start)
+        if position != target or distance < SHADE_LEARN_MIN_TRAVEL:
+            return False
+        now = self._clock() if now is None else now
+        observed = (now - started) * 100 / distance
+        if observed < MIN_TRAVEL_TIME or observed > SHADE_ACK_TIMEOUT:
+            # Reported too soon or too late to tell how long the shade took, e.g. after a reconnect
+            return False
+
+        direction = "close" if target > start else "open"
+        learned = self.moves_learned[direction]
+        weight = max(1 / (learned + 1), LEARN_WEIGHT)
+        current = getattr(self, f"{direction}_time")
+        setattr(self, f"{direction}_time", current + weight * (observed - current))
+        self.moves_learned[direction] = learned + 1
+        return True
+
+    def as_dict(self) -> dict:
+        """The learned travel times, to restore with from_dict."""
+        return {
+            "open_time": self.open_time,
+            "close_time": self.close_time,
+            "moves_learned": dict(self.moves_learned),
+        }
+
+    def from_dict(self, data: dict) -> None:
+        self.open_time = float(data.get("open_time", self.open_time))
+        self.close_time = float(data.get("close_time", self.close_time))
+        self.moves_learned.update(data.get("moves_learned", {}))
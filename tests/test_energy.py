@@ -0,0 +1,96 @@
+"""Tests of the energy integration of room power readings."""
+
+import pytest
+
+from custom_components.xcomfort_bridge.energy import (
+    HOUR,
+    METHOD_TRAPEZOIDAL,
+    EnergyIntegrator,
+    HourlyEnergy,
+)
+
+
+def test_left_rule_applies_previous_reading():
+    integrator = EnergyIntegrator(clock=lambda: 0)
+    integrator.update(100, now=0)
+    integrator.update(200, now=HOUR)
+    total = integrator.update(0, now=2 * HOUR)
+
+    # 100 W for an hour, then 200 W for an hour
+    assert total == pytest.approx(0.3)
+
+
+def test_trapezoidal_rule_averages_readings():
+    integrator = EnergyIntegrator(METHOD_TRAPEZOIDAL, clock=lambda: 0)
+    integrator.update(100, now=0)
+    total = integrator.update(200, now=HOUR)
+
+    assert total == pytest.approx(0.15)
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        EnergyIntegrator("midpoint")
+
+
+def test_advance_at_constant_power():
+    integrator = EnergyIntegrator(total=2.0, clock=lambda: 0)
+    integrator.update(1000, now=0)
+
+    assert integrator.advance(now=HOUR / 2) == pytest.approx(2.5)
+    assert integrator.advance(now=HOUR) == pytest.approx(3.0)
+    # Advancing to the same time again adds nothing
+    assert integrator.advance(now=HOUR) == pytest.approx(3.0)
+    assert integrator.power == 1000
+
+
+def test_ignores_missing_readings_and_time_going_back():
+    integrator = EnergyIntegrator(clock=lambda: 0)
+    assert integrator.advance(now=HOUR) == 0
+    integrator.update(1000, now=HOUR)
+    integrator.update(None, now=2 * HOUR)
+    integrator.update(1000, now=HOUR / 2)
+
+    assert integrator.total == 0
+    # 1000 W from the first reading on
+    assert integrator.update(0, now=3 * HOUR) == pytest.approx(2.0)
+
+
+def test_hourly_splits_across_hour_boundaries():
+    hourly = HourlyEnergy(clock=lambda: 0)
+    hourly.update(1000, now=HOUR / 2)
+    hourly.update(2000, now=2 * HOUR + HOUR / 4)
+
+    buckets = hourly.take(now=3 * HOUR)
+
+    assert [bucket["start"] for bucket in buckets] == [0, HOUR, 2 * HOUR]
+    assert [bucket["energy"] for bucket in buckets] == pytest.approx([0.5, 1.0, 1.75])
+    assert [bucket["seconds"] for bucket in buckets] == [HOUR / 2, HOUR, HOUR]
+    assert buckets[2]["mean"] == pytest.approx(1750)
+    assert (buckets[2]["min"], buckets[2]["max"]) == (1000, 2000)
+
+
+def test_hourly_takes_current_hour_only_when_asked():
+    hourly = HourlyEnergy(clock=lambda: 0)
+    hourly.update(1000, now=HOUR - 60)
+
+    buckets = hourly.take(now=HOUR + 60)
+    assert [bucket["start"] for bucket in buckets] == [0]
+
+    buckets = hourly.take(now=HOUR + 120, include_current=True)
+    assert [bucket["start"] for bucket in buckets] == [HOUR]
+    assert buckets[0]["energy"] == pytest.approx(1000 * 120 / 3600 / 1000)
+    # Taken buckets are gone
+    assert hourly.take(now=HOUR + 120, include_current=True) == []
+
+
+def test_hourly_leaves_out_hours_while_paused():
+    hourly = HourlyEnergy(clock=lambda: 0)
+    hourly.update(1000, now=HOUR / 2)
+    hourly.pause(now=HOUR + HOUR / 2)
+    hourly.update(500, now=4 * HOUR + HOUR / 4)
+
+    buckets = hourly.take(now=5 * HOUR)
+
+    assert [bucket["start"] for bucket in buckets] == [0, HOUR, 4 * HOUR]
+    assert [bucket["energy"] for bucket in buckets] == pytest.approx([0.5, 0.5, 0.375])
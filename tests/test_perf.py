@@ -0,0 +1,69 @@
+"""Performance tests of the hot paths, against the simulated bridge.
+
+Absolute timings depend on the machine, so each test compares timings taken
+in the same run: the same path with few and with many devices, or two paths
+with each other. Each compares the fastest of many rounds, which other load on
+the machine can only slow down, so it is the least noisy."""
+
+import asyncio
+import contextlib
+import os
+
+import pytest
+
+from tools.perf_benchmark import run
+
+FEW_DEVICES = 20
+MANY_DEVICES = 200
+ROOMS = 5
+
+SETUP_ROUNDS = 10
+UPDATES = 2000
+COMMANDS = 200
+
+# How much slower than with FEW_DEVICES a path may be with MANY_DEVICES, where
+# its work does not depend on the number of devices. Work that grows with the
+# number of devices, like a lookup by scanning, is MANY_DEVICES / FEW_DEVICES slower
+MAX_SLOWDOWN = 3
+
+
+def _benchmark(devices: int) -> dict:
+    # xcomfort prints every state it handles
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        result = asyncio.run(run(devices, ROOMS, SETUP_ROUNDS, UPDATES, COMMANDS))
+    return {**result["benchmarks"], "entities": result["entities"]}
+
+
+@pytest.fixture(scope="module")
+def few() -> dict:
+    return _benchmark(FEW_DEVICES)
+
+
+@pytest.fixture(scope="module")
+def many() -> dict:
+    return _benchmark(MANY_DEVICES)
+
+
+def test_state_update_does_not_depend_on_devices(few, many):
+    assert many["state_update"]["min"] < few["state_update"]["min"] * MAX_SLOWDOWN
+
+
+def test_command_rtt_does_not_depend_on_devices(few, many):
+    assert many["command_rtt"]["min"] < few["command_rtt"]["min"] * MAX_SLOWDOWN
+
+
+def test_setup_grows_at_most_linearly(few, many):
+    for name in ("setup", "setup_cached"):
+        per_entity_few = few[name]["min"] / few["entities"]
+        per_entity_many = many[name]["min"] / many["entities"]
+        assert per_entity_many < per_entity_few * MAX_SLOWDOWN, name
+
+
+def test_cached_setup_is_faster(few):
+    # With few devices, the setup is mostly the connect the cache saves waiting for
+    assert few["setup_cached"]["min"] < few["setup"]["min"] / 2
+
+
+def test_memory_per_entity_does_not_depend_on_devices(few, many):
+    # Memory is counted, not timed, so it hardly varies
+    assert many["memory_entity"]["min"] < few["memory_entity"]["min"] * 1.5
@@ -0,0 +1,93 @@
+"""Tests of the reporting policies of sensors."""
+
+from custom_components.xcomfort_bridge.metrics import Metrics
+from custom_components.xcomfort_bridge.reporting import (
+    ReportFilter,
+    ReportingPolicy,
+    policies_from_options,
+)
+
+
+def _filter(**policy) -> ReportFilter:
+    return ReportFilter(ReportingPolicy(**policy), Metrics(), "power", clock=lambda: 0)
+
+
+def test_default_policy_writes_every_change():
+    report = _filter()
+
+    assert report.offer(10, now=0) == 0
+    assert report.offer(10, now=1) is None
+    assert report.offer(10.5, now=2) == 0
+    assert report.value == 10.5
+    assert report.metrics.counter("reports_emitted.power") == 2
+    assert report.metrics.counter("reports_suppressed.power") == 1
+
+
+def test_deadband():
+    report = _filter(deadband=5)
+    report.offer(100, now=0)
+
+    assert report.offer(104, now=1) is None
+    assert report.offer(95, now=2) == 0
+    assert report.value == 95
+
+
+def test_deadband_percent():
+    report = _filter(deadband_percent=10)
+    report.offer(200, now=0)
+
+    assert report.offer(215, now=1) is None
+    assert report.offer(220, now=2) == 0
+
+
+def test_min_interval_delays_a_change_until_flush():
+    report = _filter(min_interval=10)
+    report.offer(1, now=0)
+
+    assert report.offer(2, now=4) == 6
+    # A newer value replaces the pending one
+    assert report.offer(3, now=5) == 5
+    assert report.value == 1
+    assert report.flush(now=10)
+    assert report.value == 3
+    assert not report.flush(now=11)
+    assert report.metrics.counter("reports_suppressed.power") == 1
+
+
+def test_max_interval_writes_a_small_change_when_due():
+    report = _filter(deadband=5, max_interval=60)
+    report.offer(100, now=0)
+
+    assert report.offer(101, now=20) == 40
+    assert report.offer(102, now=70) == 0
+    assert report.value == 102
+
+
+def test_heartbeat_writes_the_value_again():
+    report = _filter(deadband=5, max_interval=60)
+    assert not report.heartbeat(now=0)
+    report.offer(100, now=0)
+
+    assert report.heartbeat(now=60)
+    assert report.value == 100
+    # The pending value, if there is one
+    report.offer(101, now=70)
+    assert report.heartbeat(now=120)
+    assert report.value == 101
+    assert report.metrics.counter("reports_emitted.power") == 3
+
+
+def test_set_takes_a_restored_value_as_written():
+    report = _filter(min_interval=10)
+    report.set(5, now=0)
+
+    assert report.offer(5, now=1) is None
+    assert report.offer(6, now=2) == 8
+
+
+def test_policies_from_options():
+    policies = policies_from_options({"power_deadband": "2.5", "humidity_max_interval": 0})
+
+    assert policies["power"].deadband == 2.5
+    assert policies["humidity"].max_interval == 0
+    assert policies["energy"].min_interval > 0
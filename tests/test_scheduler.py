@@ -0,0 +1,138 @@
+"""Tests of the ordering and window of commands sent to the bridge."""
+
+import asyncio
+
+import pytest
+from homeassistant.core import Context
+
+from custom_components.xcomfort_bridge.metrics import Metrics
+from custom_components.xcomfort_bridge.scheduler import (
+    PRIORITY_AUTOMATION,
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    CommandScheduler,
+    priority_for,
+)
+
+
+def _command(sent: list, name: str):
+    async def send():
+        sent.append(name)
+
+    return send
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_priority_for():
+    assert priority_for(None) == PRIORITY_BACKGROUND
+    assert priority_for(Context()) == PRIORITY_AUTOMATION
+    assert priority_for(Context(user_id="user")) == PRIORITY_INTERACTIVE
+
+
+def test_waiting_commands_are_sent_most_urgent_first():
+    async def scenario():
+        scheduler = CommandScheduler(Metrics(), window=1, slot_timeout=10)
+        sent = list()
+        tasks = [asyncio.create_task(scheduler.run(_command(sent, "first"), ("device", 0), PRIORITY_BACKGROUND))]
+        await _settle()
+        commands = (
+            ("background 1", PRIORITY_BACKGROUND),
+            ("automation", PRIORITY_AUTOMATION),
+            ("interactive 1", PRIORITY_INTERACTIVE),
+            ("background 2", PRIORITY_BACKGROUND),
+            ("interactive 2", PRIORITY_INTERACTIVE),
+        )
+        targets = {"first": ("device", 0)}
+        for i, (name, priority) in enumerate(commands, 1):
+            targets[name] = ("device", i)
+            tasks.append(asyncio.create_task(scheduler.run(_command(sent, name), targets[name], priority)))
+        await _settle()
+        assert sent == ["first"]
+        assert scheduler.depth == len(commands)
+
+        # Every state the bridge reports for the last command lets the next one go
+        while len(sent) <= len(commands):
+            scheduler.confirmed(targets[sent[-1]])
+            await _settle()
+        scheduler.confirmed(targets[sent[-1]])
+        await asyncio.gather(*tasks)
+        assert scheduler.in_flight == 0
+        return sent
+
+    assert asyncio.run(scenario()) == [
+        "first",
+        "interactive 1",
+        "interactive 2",
+        "automation",
+        "background 1",
+        "background 2",
+    ]
+
+
+def test_window_limits_commands_in_flight():
+    async def scenario():
+        scheduler = CommandScheduler(Metrics(), window=2, slot_timeout=10)
+        sent = list()
+        tasks = [
+            asyncio.create_task(scheduler.run(_command(sent, str(i)), ("device", i), PRIORITY_AUTOMATION))
+            for i in range(3)
+        ]
+        await _settle()
+        assert sent == ["0", "1"]
+        assert (scheduler.in_flight, scheduler.depth, scheduler.max_depth) == (2, 1, 1)
+
+        scheduler.confirmed(("device", 1))
+        await _settle()
+        assert sent == ["0", "1", "2"]
+        assert scheduler.in_flight == 2
+
+        scheduler.confirmed(("device", 0))
+        scheduler.confirmed(("device", 2))
+        await asyncio.gather(*tasks)
+        assert scheduler.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_commands_without_target_free_their_slot_when_sent():
+    async def scenario():
+        scheduler = CommandScheduler(Metrics(), window=1)
+        sent = list()
+        await asyncio.gather(*(scheduler.run(_command(sent, str(i)), priority=PRIORITY_AUTOMATION) for i in range(3)))
+        assert sorted(sent) == ["0", "1", "2"]
+        assert scheduler.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_unconfirmed_slot_times_out():
+    async def scenario():
+        metrics = Metrics()
+        scheduler = CommandScheduler(metrics, window=1, slot_timeout=0.01)
+        sent = list()
+        await scheduler.run(_command(sent, "lost"), ("device", 1), PRIORITY_AUTOMATION)
+        await asyncio.wait_for(scheduler.run(_command(sent, "next"), None, PRIORITY_AUTOMATION), 1)
+        assert sent == ["lost", "next"]
+        assert metrics.counter("command_slots_timed_out") == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancel_fails_waiting_commands():
+    async def scenario():
+        scheduler = CommandScheduler(Metrics(), window=1, slot_timeout=10)
+        sent = list()
+        await scheduler.run(_command(sent, "held"), ("device", 1), PRIORITY_AUTOMATION)
+        waiting = asyncio.create_task(scheduler.run(_command(sent, "waiting"), None, PRIORITY_AUTOMATION))
+        await _settle()
+        scheduler.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert sent == ["held"]
+        assert (scheduler.in_flight, scheduler.depth) == (0, 0)
+
+    asyncio.run(scenario())
@@ -0,0 +1,99 @@
+"""Tests of the position estimate of moving shades."""
+
+import pytest
+
+from custom_components.xcomfort_bridge.travel import LEARN_WEIGHT, TravelModel
+
+
+def _model() -> TravelModel:
+    return TravelModel(open_time=20, close_time=40, clock=lambda: 0)
+
+
+def test_position_while_closing_and_opening():
+    travel = _model()
+    travel.start(0, 100, now=0)
+
+    assert travel.closing and not travel.opening
+    assert travel.position(now=10) == 25
+    assert not travel.arrived(now=39)
+    assert travel.position(now=60) == 100
+    assert travel.arrived(now=60)
+
+    travel = _model()
+    travel.start(100, 0, now=0)
+    assert travel.opening
+    assert travel.position(now=5) == 75
+    assert travel.position(now=30) == 0
+
+
+def test_no_move_to_where_the_shade_is():
+    travel = _model()
+    travel.start(50, 50, now=0)
+
+    assert not travel.active
+    assert travel.position(now=1) is None
+
+
+def test_start_while_moving_continues_from_estimate():
+    travel = _model()
+    travel.start(0, 100, now=0)
+    travel.start(None, 0, now=20)
+
+    assert travel.start_position == 50
+    assert travel.position(now=25) == 25
+
+
+def test_stop_holds_estimate_until_reported():
+    travel = _model()
+    travel.start(0, 100, now=0)
+    travel.stop(now=20)
+
+    assert travel.active and not travel.moving
+    assert travel.position(now=100) == 50
+    assert not travel.finish(50, now=100)
+    assert not travel.active
+
+
+def test_first_move_sets_travel_time():
+    travel = _model()
+    travel.start(0, 100, now=0)
+
+    assert travel.finish(100, now=30)
+    assert travel.close_time == pytest.approx(30)
+    assert travel.open_time == 20
+    assert travel.moves_learned == {"open": 0, "close": 1}
+
+
+def test_later_moves_are_weighted():
+    travel = _model()
+    for _ in range(5):
+        travel.start(0, 100, now=0)
+        travel.finish(100, now=30)
+    travel.start(0, 100, now=0)
+    travel.finish(100, now=40)
+
+    assert travel.close_time == pytest.approx(30 + LEARN_WEIGHT * 10)
+
+
+def test_short_or_unreached_moves_are_not_learned():
+    travel = _model()
+    travel.start(0, 10, now=0)
+    assert not travel.finish(10, now=4)
+
+    travel.start(0, 100, now=0)
+    assert not travel.finish(60, now=20)
+
+    # Reported sooner than any shade travels
+    travel.start(0, 100, now=0)
+    assert not travel.finish(100, now=1)
+    assert travel.close_time == 40
+
+
+def test_as_dict_round_trip():
+    travel = _model()
+    travel.start(100, 0, now=0)
+    travel.finish(0, now=25)
+
+    restored = TravelModel(clock=lambda: 0)
+    restored.from_dict(travel.as_dict())
+    assert restored.as_dict() == travel.as_dict()
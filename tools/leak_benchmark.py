@@ -0,0 +1,222 @@
+"""Sets the integration up and unloads it again, over and over, against the
+simulated bridge, and checks nothing is left behind.
+
+Every cycle sets up a config entry in an in-process Home Assistant instance,
+lets a burst of state changes go through the entities, removes one entity,
+which must unsubscribe it, and unloads the entry.
+After each unload, no hub, bridge or entity object of the integration may be
+alive anymore. While loaded, every cycle must have as many bridge subscriptions
+and callbacks as the first. And once the first cycles have warmed up caches, the
+memory still allocated by the integration and xcomfort, measured with tracemalloc
+as the blocks with their code on the stack when allocated, may not grow anymore.
+What Home Assistant keeps of every unloaded entry itself, like its emptied
+EntityPlatform objects, is not counted.
+
+    python -m tools.leak_benchmark
+    python -m tools.leak_benchmark --cycles 50 --lights 200 --shades 40 --rooms 30
+
+Exits with status 1 when a check fails.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import enum
+import gc
+import json
+import logging
+import os
+import sys
+import tempfile
+import tracemalloc
+from collections import Counter
+
+from homeassistant import bootstrap, loader
+from homeassistant.config_entries import ConfigEntries, ConfigEntry
+from homeassistant.const import CONF_IP_ADDRESS
+from homeassistant.core import CoreState, HomeAssistant
+
+from custom_components.xcomfort_bridge import trace
+from custom_components.xcomfort_bridge.const import CONF_AUTH_KEY, CONF_IDENTIFIER, DOMAIN
+
+from .simulator import BridgeSimulator
+
+# Memory blocks of the integration that may be left per cycle after warming up.
+# The count varies by some dozens between cycles, with the states written last,
+# so over the default cycles its growth is within a few blocks of 0 without a
+# leak. Leaking one object per entity adds as many blocks per cycle as there are entities
+ALLOWED_GROWTH_PER_CYCLE = 8
+
+# Frames kept per allocation, enough to reach the integration's code from where
+# Home Assistant or a library allocates for it
+TRACEBACK_FRAMES = 20
+
+# Allocations with code of the integration or of xcomfort on the stack
+_OWN_ALLOCATIONS = [
+    tracemalloc.Filter(True, "*/custom_components/xcomfort_bridge/*", all_frames=True),
+    tracemalloc.Filter(True, "*/xcomfort/*", all_frames=True),
+]
+
+INTEGRATION_MODULE = "custom_components.xcomfort_bridge"
+
+
+def live_objects() -> Counter:
+    """The number of live instances per class of the integration and of xcomfort,
+    other than enum members."""
+    gc.collect()
+    counts = Counter()
+    for obj in gc.get_objects():
+        module = type(obj).__module__
+        if (
+            isinstance(module, str)
+            and module.startswith((INTEGRATION_MODULE, "xcomfort."))
+            and not isinstance(obj, enum.Enum)
+        ):
+            counts[type(obj).__name__] += 1
+    return counts
+
+
+def _slope(values: list) -> float:
+    """The least squares growth of values per step, which is less noisy than first to last."""
+    n = len(values)
+    mean_x = (n - 1) / 2
+    mean_y = sum(values) / n
+    spread = sum((x - mean_x) ** 2 for x in range(n))
+    return sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values)) / spread
+
+
+async def start_hass(config_dir: str) -> HomeAssistant:
+    hass = HomeAssistant()
+    hass.config.config_dir = config_dir
+    hass.config.skip_pip = True
+    # Custom integrations are found by importing custom_components, which is this checkout
+    hass.data.pop(loader.DATA_CUSTOM_COMPONENTS, None)
+    hass.config_entries = ConfigEntries(hass, {})
+    await hass.config_entries.async_initialize()
+    await bootstrap.load_registries(hass)
+    hass.state = CoreState.running
+    return hass
+
+
+async def _cycle(hass: HomeAssistant, entry: ConfigEntry, sim: BridgeSimulator, storm: int) -> dict:
+    """Sets entry up, storms it, removes one of its entities, unloads it, and returns
+    the hub's subscription counts while loaded."""
+    if not await hass.config_entries.async_setup(entry.entry_id):
+        raise RuntimeError(f"Setting up {entry.title} failed")
+    await hass.async_block_till_done()
+    hub = hass.data[DOMAIN][entry.entry_id]
+    if storm:
+        await sim.storm(storm, batch=20)
+        await asyncio.sleep(hub.writer.window * 2)
+        await hass.async_block_till_done()
+    counts = dict(hub.subscription_counts, entities=len(hass.states.async_all()))
+
+    # An entity removed while the hub keeps running, like a disabled one, unsubscribes
+    entity = next(entity for entities in hub._entities.values() for entity in entities)
+    await entity.async_remove()
+    counts["callbacks_after_removal"] = hub.subscription_counts["callbacks"]
+    del hub, entity
+
+    if not await hass.config_entries.async_unload(entry.entry_id):
+        raise RuntimeError(f"Unloading {entry.title} failed")
+    await hass.async_block_till_done()
+    return counts
+
+
+async def run(
+    cycles: int, warmup: int, storm: int, lights: int, shades: int, rc_touches: int, rooms: int
+) -> dict:
+    failures = list()
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = await start_hass(config_dir)
+        async with BridgeSimulator(
+            lights=lights, shades=shades, rc_touches=rc_touches, rooms=rooms, seed=1
+        ) as sim:
+            entry = ConfigEntry(
+                version=2,
+                domain=DOMAIN,
+                title="benchmark",
+                data={CONF_IP_ADDRESS: sim.address, CONF_AUTH_KEY: sim.auth_key, CONF_IDENTIFIER: "benchmark"},
+                source="user",
+                options={},
+            )
+            await hass.config_entries.async_add(entry)
+            await hass.async_block_till_done()
+            # Adding the entry sets it up, start every cycle from unloaded
+            await hass.config_entries.async_unload(entry.entry_id)
+            await hass.async_block_till_done()
+
+            tracemalloc.start(TRACEBACK_FRAMES)
+            first = None
+            blocks = list()
+            memory = list()
+            for cycle in range(cycles):
+                counts = await _cycle(hass, entry, sim, storm)
+                if counts["callbacks_after_removal"] != counts["callbacks"] - 1:
+                    failures.append(
+                        f"cycle {cycle}: removing an entity left {counts['callbacks_after_removal']}"
+                        f" of {counts['callbacks']} callbacks"
+                    )
+                if first is None:
+                    first = counts
+                elif counts != first:
+                    failures.append(f"cycle {cycle}: subscriptions {counts}, first cycle had {first}")
+
+                left = live_objects()
+                # The integration's log tracers are kept, once per module and bridge
+                left = {name: count for name, count in left.items() if name != "Tracer"}
+                if left:
+                    failures.append(f"cycle {cycle}: left behind {left}")
+                # The trace is bounded by TRACE_BUFFER_SIZE, but grows until it is full
+                trace.clear()
+                # What the simulator received, for checks of commands, is not the integration's
+                sim.received.clear()
+                own = tracemalloc.take_snapshot().filter_traces(_OWN_ALLOCATIONS).statistics("filename")
+                blocks.append(sum(stat.count for stat in own))
+                memory.append(sum(stat.size for stat in own))
+            tracemalloc.stop()
+
+        await hass.async_stop(force=True)
+
+    growth = _slope(blocks[warmup:])
+    if growth > ALLOWED_GROWTH_PER_CYCLE:
+        failures.append(f"the integration kept {growth:.1f} more memory blocks per cycle after warming up")
+
+    return {
+        "cycles": cycles,
+        "subscriptions": first,
+        "memory_blocks": blocks,
+        "memory_bytes": memory,
+        "growth_per_cycle_blocks": round(growth, 1),
+        "growth_per_cycle_bytes": round(_slope(memory[warmup:])),
+        "failures": failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cycles", type=int, default=30, help="setup and unload cycles")
+    parser.add_argument("--warmup", type=int, default=5, help="cycles before memory growth is measured")
+    parser.add_argument("--storm", type=int, default=200, help="state changes per cycle")
+    parser.add_argument("--lights", type=int, default=20)
+    parser.add_argument("--shades", type=int, default=5)
+    parser.add_argument("--rc-touches", type=int, default=2)
+    parser.add_argument("--rooms", type=int, default=5)
+    args = parser.parse_args()
+    if args.cycles < args.warmup + 2:
+        parser.error("--cycles must be at least --warmup + 2")
+
+    logging.basicConfig(level=logging.WARNING)
+    # xcomfort prints every state it handles
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        result = asyncio.run(
+            run(args.cycles, args.warmup, args.storm, args.lights, args.shades, args.rc_touches, args.rooms)
+        )
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if result["failures"] else 0)
+
+
+if __name__ == "__main__":
+    main()
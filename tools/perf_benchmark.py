@@ -0,0 +1,236 @@
+"""Benchmarks the hot paths of the integration against the simulated bridge.
+
+A bridge with the given number of devices and rooms is simulated in-process,
+and the integration is set up against it in an in-process Home Assistant
+instance. Nothing leaves the machine. Measured, each over several rounds:
+
+    setup           async_setup_entry, without the topology cache
+    setup_cached    async_setup_entry, with the topology cache of the last setup
+    state_update    one state message of the bridge, through the library, the
+                    entities' _state_change and the state writes it leads to
+    command_rtt     a light switched through its entity, until the bridge
+                    reported the new state
+    memory_entity   bytes allocated while setting up, per entity
+
+Prints the statistics of each as JSON. Timings depend on the machine, so
+tests/test_perf.py does not compare them with stored ones, but checks how they
+relate within one run, e.g. that a state update takes as long with many
+devices as with a few:
+
+    python -m tools.perf_benchmark
+    python -m tools.perf_benchmark --devices 500 --rooms 40
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from xcomfort.messages import Messages
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_IP_ADDRESS
+from homeassistant.core import HomeAssistant
+
+from custom_components.xcomfort_bridge.const import CONF_AUTH_KEY, CONF_IDENTIFIER, DOMAIN
+from custom_components.xcomfort_bridge.hub import XComfortHub
+from custom_components.xcomfort_bridge.light import HASSXComfortLight
+
+from .leak_benchmark import start_hass
+from .simulator import BridgeSimulator
+
+def summarize(values: list, unit: str) -> dict:
+    """Statistics of the rounds of a benchmark, like pytest-benchmark reports them.
+    The min and the interquartile range are the least disturbed by other load."""
+    q1, _, q3 = statistics.quantiles(values, n=4) if len(values) > 1 else (values[0],) * 3
+    return {
+        "unit": unit,
+        "rounds": len(values),
+        "min": min(values),
+        "max": max(values),
+        "mean": statistics.fmean(values),
+        "median": statistics.median(values),
+        "stddev": statistics.stdev(values) if len(values) > 1 else 0.0,
+        "iqr": q3 - q1,
+    }
+
+
+def scenario_name(devices: int, rooms: int) -> str:
+    return f"devices={devices},rooms={rooms}"
+
+
+def _device_mix(devices: int) -> dict:
+    """Simulator arguments for devices devices, mostly lights, like a typical installation."""
+    shades = devices // 5
+    rc_touches = devices // 20
+    return {"lights": max(devices - shades - rc_touches, 1), "shades": shades, "rc_touches": rc_touches}
+
+
+async def _setup(hass: HomeAssistant, entry: ConfigEntry) -> XComfortHub:
+    """Sets entry up, and waits until its bridge reported the topology, which a
+    setup from the topology cache does not wait for."""
+    if not await hass.config_entries.async_setup(entry.entry_id):
+        raise RuntimeError(f"Setting up {entry.title} failed")
+    await hass.async_block_till_done()
+    hub = hass.data[DOMAIN][entry.entry_id]
+    deadline = time.monotonic() + 10
+    while not hub.bridge.topology_complete:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"{entry.title} did not connect")
+        await asyncio.sleep(0.01)
+    await hass.async_block_till_done()
+    return hub
+
+
+async def _unload(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    if not await hass.config_entries.async_unload(entry.entry_id):
+        raise RuntimeError(f"Unloading {entry.title} failed")
+    await hass.async_block_till_done()
+
+
+async def bench_setup(hass: HomeAssistant, entry: ConfigEntry, rounds: int) -> tuple[list, list]:
+    """The seconds async_setup_entry took, without and with the topology cache."""
+    cold = list()
+    cached = list()
+    for _ in range(rounds):
+        await XComfortHub.remove_cache(hass, entry)
+        hub = await _setup(hass, entry)
+        cold.append(hub.timings["setup"])
+        await _unload(hass, entry)
+
+        hub = await _setup(hass, entry)
+        cached.append(hub.timings["setup"])
+        await _unload(hass, entry)
+    return cold, cached
+
+
+def bench_state_update(hub: XComfortHub, sim: BridgeSimulator, count: int) -> list:
+    """The seconds each of count random state messages took, from decoding until
+    the states of the entities it changed were written."""
+    # Without a window every update is written right away, instead of coalesced
+    window, hub.writer.window = hub.writer.window, 0
+    durations = list()
+    for _ in range(count):
+        message = {"type_int": Messages.SET_STATE_INFO, "mc": -1, "payload": {"item": sim.random_update()}}
+        start = time.perf_counter()
+        hub.bridge._onMessage(message)
+        hub.writer.flush()
+        durations.append(time.perf_counter() - start)
+    hub.writer.window = window
+    return durations
+
+
+async def bench_command_rtt(hub: XComfortHub, count: int) -> list:
+    """The seconds from switching a light through its entity until the bridge
+    reported it switched, for count switches of lights in turn."""
+    lights = [
+        entity
+        for entities in hub._entities.values()
+        for entity in entities
+        if isinstance(entity, HASSXComfortLight) and entity.hass is not None
+    ]
+    if not lights:
+        return []
+
+    durations = list()
+    for i in range(count):
+        entity = lights[i % len(lights)]
+        switch = not entity.is_on
+        reported = asyncio.Event()
+
+        def on_state(state, switch=switch):
+            if state is not None and state.switch == switch:
+                reported.set()
+
+        unsubscribe = hub.subscribe_device(entity._device, on_state)
+        try:
+            start = time.perf_counter()
+            if switch:
+                await entity.async_turn_on()
+            else:
+                await entity.async_turn_off()
+            await asyncio.wait_for(reported.wait(), 5)
+            durations.append(time.perf_counter() - start)
+        finally:
+            unsubscribe()
+    return durations
+
+
+async def bench_memory(hass: HomeAssistant, entry: ConfigEntry) -> tuple[float, int]:
+    """The bytes allocated by a setup per entity, and the number of entities."""
+    await XComfortHub.remove_cache(hass, entry)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    await _setup(hass, entry)
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    entities = len(hass.states.async_all())
+    await _unload(hass, entry)
+    return allocated / entities, entities
+
+
+async def run(devices: int, rooms: int, setup_rounds: int, updates: int, commands: int) -> dict:
+    results = dict()
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = await start_hass(config_dir)
+        async with BridgeSimulator(rooms=rooms, seed=1, **_device_mix(devices)) as sim:
+            entry = ConfigEntry(
+                version=2,
+                domain=DOMAIN,
+                title="benchmark",
+                data={CONF_IP_ADDRESS: sim.address, CONF_AUTH_KEY: sim.auth_key, CONF_IDENTIFIER: "benchmark"},
+                source="user",
+                options={},
+            )
+            await hass.config_entries.async_add(entry)
+            await hass.async_block_till_done()
+            # Adding the entry sets it up, and warms up imports and the registries
+            await _unload(hass, entry)
+
+            cold, cached = await bench_setup(hass, entry, setup_rounds)
+            results["setup"] = summarize(cold, "s")
+            results["setup_cached"] = summarize(cached, "s")
+
+            hub = await _setup(hass, entry)
+            results["state_update"] = summarize(bench_state_update(hub, sim, updates), "s")
+            await hass.async_block_till_done()
+            durations = await bench_command_rtt(hub, commands)
+            if durations:
+                results["command_rtt"] = summarize(durations, "s")
+            del hub
+            await _unload(hass, entry)
+
+            per_entity, entities = await bench_memory(hass, entry)
+            results["memory_entity"] = summarize([per_entity], "B")
+
+        await hass.async_stop(force=True)
+
+    return {"scenario": scenario_name(devices, rooms), "entities": entities, "benchmarks": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=100, help="devices of the simulated bridge")
+    parser.add_argument("--rooms", type=int, default=10, help="rooms of the simulated bridge")
+    parser.add_argument("--setup-rounds", type=int, default=10, help="setups measured, of each kind")
+    parser.add_argument("--updates", type=int, default=2000, help="state messages measured")
+    parser.add_argument("--commands", type=int, default=200, help="light switches measured")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    # xcomfort prints every state it handles
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        result = asyncio.run(run(args.devices, args.rooms, args.setup_rounds, args.updates, args.commands))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
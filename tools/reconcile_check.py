@@ -0,0 +1,158 @@
+"""Changes the topology of the simulated bridge while the integration runs, and
+checks the entities follow.
+
+Every case sets up a config entry in an in-process Home Assistant instance,
+changes the simulated topology, lets the bridge reconnect so it reports the
+topology again, and checks the entities against what the bridge reports:
+
+    renamed_member  a light of a room is renamed. The room's light group must
+                    follow the light object made for it, and its state
+    removed_member  a light of a room is removed. The room's light group must
+                    drop it, and keep following the other lights
+
+    python -m tools.reconcile_check
+
+Exits with status 1 when a check fails.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import sys
+import tempfile
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_IP_ADDRESS, STATE_OFF, STATE_ON
+from homeassistant.core import HomeAssistant
+
+from custom_components.xcomfort_bridge.const import CONF_AUTH_KEY, CONF_IDENTIFIER, DOMAIN
+from custom_components.xcomfort_bridge.hub import XComfortHub
+from custom_components.xcomfort_bridge.light import HASSXComfortRoomLight
+
+from .leak_benchmark import start_hass
+from .simulator import BridgeSimulator
+
+# Seconds the bridge gets to report a state, or its topology after a reconnect
+SETTLE_TIME = 1.0
+
+
+def _room_light(hub: XComfortHub) -> HASSXComfortRoomLight:
+    return next(
+        entity
+        for entities in hub._entities.values()
+        for entity in entities
+        if isinstance(entity, HASSXComfortRoomLight)
+    )
+
+
+async def _settle(hass: HomeAssistant, condition) -> bool:
+    """Waits up to SETTLE_TIME for condition to hold."""
+    for _ in range(int(SETTLE_TIME / 0.05)):
+        await hass.async_block_till_done()
+        if condition():
+            return True
+        await asyncio.sleep(0.05)
+    return condition()
+
+
+async def _reconnect(hass: HomeAssistant, hub: XComfortHub, sim: BridgeSimulator) -> bool:
+    """Drops the connection, and waits until the topology was reported and reconciled again."""
+    passes = hub.metrics.counter("reconcile_passes")
+    await sim.disconnect_all()
+    return await _settle(
+        hass, lambda: hub.bridge.topology_complete and hub.metrics.counter("reconcile_passes") > passes
+    )
+
+
+async def _switch(hass: HomeAssistant, sim: BridgeSimulator, device_id: int, switch: bool) -> None:
+    await sim.broadcast(sim._apply_device(device_id, switch=switch))
+    await asyncio.sleep(0.1)
+    await hass.async_block_till_done()
+
+
+async def renamed_member(hass: HomeAssistant, hub: XComfortHub, sim: BridgeSimulator) -> list:
+    failures = list()
+    sim.devices[1]["name"] = "Renamed light"
+    if not await _reconnect(hass, hub, sim):
+        return ["the bridge did not reconnect"]
+
+    group = _room_light(hub)
+    if not any(member is hub.bridge._devices[1] for member in group._members):
+        failures.append("the light group kept the light object from before the rename")
+    await _switch(hass, sim, 1, True)
+    if not await _settle(hass, lambda: hass.states.get(group.entity_id).state == STATE_ON):
+        failures.append("the light group stayed off when the renamed light was switched on")
+    await _switch(hass, sim, 1, False)
+    return failures
+
+
+async def removed_member(hass: HomeAssistant, hub: XComfortHub, sim: BridgeSimulator) -> list:
+    failures = list()
+    del sim.devices[2]
+    for room in sim.rooms.values():
+        if 2 in room["devices"]:
+            room["devices"].remove(2)
+    if not await _reconnect(hass, hub, sim):
+        return ["the bridge did not reconnect"]
+
+    group = _room_light(hub)
+    if any(member.device_id == 2 for member in group._members):
+        failures.append("the light group kept the removed light")
+    await _switch(hass, sim, 1, True)
+    if not await _settle(hass, lambda: hass.states.get(group.entity_id).state == STATE_ON):
+        failures.append("the light group stopped following the remaining lights")
+    await _switch(hass, sim, 1, False)
+    return failures
+
+
+CASES = (renamed_member, removed_member)
+
+
+async def run() -> dict:
+    failures = dict()
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = await start_hass(config_dir)
+        for case in CASES:
+            async with BridgeSimulator(lights=3, rooms=1, seed=1) as sim:
+                for device in sim.devices.values():
+                    device["switch"] = False
+                entry = ConfigEntry(
+                    version=2,
+                    domain=DOMAIN,
+                    title=case.__name__,
+                    data={CONF_IP_ADDRESS: sim.address, CONF_AUTH_KEY: sim.auth_key, CONF_IDENTIFIER: case.__name__},
+                    source="user",
+                    options={},
+                )
+                await hass.config_entries.async_add(entry)
+                await hass.async_block_till_done()
+                hub = hass.data[DOMAIN][entry.entry_id]
+                hub.supervisor.initial_delay = 0.05
+                if not await _settle(hass, lambda: hub.bridge.topology_complete):
+                    failures[case.__name__] = ["the bridge did not connect"]
+                elif hass.states.get(_room_light(hub).entity_id).state != STATE_OFF:
+                    failures[case.__name__] = ["the light group was not off to begin with"]
+                else:
+                    failures[case.__name__] = await case(hass, hub, sim)
+                await hass.config_entries.async_remove(entry.entry_id)
+                await hass.async_block_till_done()
+        await hass.async_stop(force=True)
+
+    return {"failures": {name: messages for name, messages in failures.items() if messages}}
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    # xcomfort prints every state it handles
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        result = asyncio.run(run())
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if result["failures"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Replays a recording of bridge messages into an XComfortHub and its entities.
+
+Recordings are made by enabling "Record bridge messages" in the integration's
+options, which writes `<config>/xcomfort_bridge.<entry_id>.jsonl.gz`. The
+received messages are fed to the hub's bridge as if they came off the
+websocket, with the light, climate, sensor and cover platforms set up against
+an in-process Home Assistant instance, so every state update goes through
+dispatch, the entities and the state machine.
+
+    python -m tools.replay xcomfort_bridge.<entry_id>.jsonl.gz
+    python -m tools.replay recording.jsonl.gz --speed 1
+
+By default messages are replayed as fast as possible, which measures dispatch
+throughput. With --speed they keep their recorded spacing, scaled by the given
+factor, which reproduces storms and odd sequences as they happened.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import tempfile
+import time
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from custom_components.xcomfort_bridge import PLATFORMS
+from custom_components.xcomfort_bridge.const import DOMAIN
+from custom_components.xcomfort_bridge.hub import XComfortHub
+from custom_components.xcomfort_bridge.recorder import DIRECTION_IN, read_recording
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def replay(bridge, records, speed: float | None = None) -> dict:
+    """Feeds the received messages of records into bridge, as fast as possible,
+    or spaced as recorded and divided by speed. Returns throughput figures."""
+    inbound = [(t, message) for t, direction, message in records if direction == DIRECTION_IN]
+    if not inbound:
+        return {"messages": 0, "seconds": 0.0, "messages_per_second": None}
+
+    first = inbound[0][0]
+    start = time.perf_counter()
+    for t, message in inbound:
+        if speed:
+            delay = (t - first) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        bridge._onMessage(message)
+        # Like websocket frames, every message gets its own pass of the event loop
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "messages": len(inbound),
+        "seconds": elapsed,
+        "messages_per_second": len(inbound) / elapsed if elapsed else None,
+    }
+
+
+def _entity_adder(hass: HomeAssistant, entities: list):
+    """An async_add_entities stand-in that gives entities an id and subscribes them."""
+
+    def add_entities(new_entities, update_before_add=False):
+        for entity in new_entities:
+            domain = type(entity).__module__.rsplit(".", 1)[-1]
+            entity.hass = hass
+            entity.entity_id = f"{domain}.replay_{len(entities)}"
+            entities.append(entity)
+            hass.async_create_task(entity.async_added_to_hass())
+
+    return add_entities
+
+
+async def replay_into_hub(path: str, speed: float | None = None) -> dict:
+    """Sets up a hub and its platforms without a bridge connection, replays the
+    recording at path into it and returns throughput figures and hub metrics."""
+    records = list(read_recording(path))
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant()
+        hass.config.config_dir = config_dir
+        entry = ConfigEntry(
+            version=1, domain=DOMAIN, title="replay", data={}, source="user", options={}
+        )
+
+        # Without an entry id the hub neither reads nor writes the topology cache
+        hub = XComfortHub(hass, identifier="replay", ip="replay", auth_key="replay")
+        hass.data[DOMAIN] = {entry.entry_id: hub}
+
+        entities = list()
+        for platform in PLATFORMS:
+            module = importlib.import_module(f"custom_components.xcomfort_bridge.{platform}")
+            await module.async_setup_entry(hass, entry, _entity_adder(hass, entities))
+
+        loading = asyncio.create_task(hub.load_devices())
+        result = await replay(hub.bridge, records, speed)
+        try:
+            # The library polls for its initialization every 100 ms
+            await asyncio.wait_for(loading, 1)
+        except asyncio.TimeoutError:
+            _LOGGER.warning("The recording has no complete topology, nothing was loaded")
+
+        await hass.async_block_till_done()
+        # Let coalesced state writes go out
+        await asyncio.sleep(hub.writer.window * 2)
+        await hass.async_block_till_done()
+
+        result["entities"] = len(entities)
+        result["states"] = len(hass.states.async_all())
+        result["hub"] = hub.diagnostics()
+
+        await hub.stop()
+        await hass.async_stop(force=True)
+
+    return result
+
+
+async def _main(args):
+    result = await replay_into_hub(args.recording, args.speed)
+    if not args.verbose:
+        result["hub"] = {
+            "counters": result["hub"]["metrics"]["counters"],
+            "dispatch": result["hub"]["metrics"]["histograms"].get("dispatch"),
+            "message_handling": result["hub"]["metrics"]["histograms"].get("message_handling"),
+        }
+    print(json.dumps(result, indent=2, default=str))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="recording written by the integration")
+    parser.add_argument(
+        "--speed", type=float, default=None, help="replay at recorded spacing divided by this factor"
+    )
+    parser.add_argument("--verbose", action="store_true", help="print all hub diagnostics")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
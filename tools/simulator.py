@@ -0,0 +1,620 @@
+"""Local stand-in for an Eaton xComfort bridge.
+
+Runs an in-process websocket server that speaks the same handshake, secure
+channel and message protocol that `xcomfort.bridge.Bridge` expects, and serves
+a synthetic topology of lights, shades, RC Touch units and rooms.
+
+Usage from a test or script:
+
+    async with BridgeSimulator(lights=200, shades=50, rc_touches=20, rooms=30) as sim:
+        bridge = Bridge(sim.address, sim.auth_key)
+        ...
+        await sim.storm(1000)
+
+Or standalone, so a development Home Assistant can connect to it:
+
+    python -m tools.simulator --port 8080 --lights 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import secrets
+import time
+from base64 import b64decode, b64encode
+from typing import Iterable
+
+from aiohttp import WSMsgType, web
+from Crypto.Cipher import AES, PKCS1_v1_5
+from Crypto.PublicKey import RSA
+
+from xcomfort.connection import hash as auth_hash
+from xcomfort.messages import Messages, ShadeOperationState
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_AUTH_KEY = "simulator"
+
+# Seconds a login token is valid for, as a bridge reports it
+TOKEN_LIFETIME = 8640000
+
+DEVTYPE_SWITCH = 100
+DEVTYPE_DIMMER = 101
+DEVTYPE_SHADE = 102
+DEVTYPE_RC_TOUCH = 450
+
+COMPTYPE_SHADE_ACTUATOR = 86
+COMPTYPE_RC_TOUCH = 87
+
+
+def _pad(value: bytes) -> bytes:
+    pad_size = AES.block_size - (len(value) % AES.block_size)
+    return value.ljust(len(value) + pad_size, b"\x00")
+
+
+class SimulatedSession:
+    """One client connection, from handshake to close."""
+
+    def __init__(self, simulator: BridgeSimulator, ws: web.WebSocketResponse):
+        self.simulator = simulator
+        self.ws = ws
+        self.key = None
+        self.iv = None
+        self.mc = 0
+        self.ready = False
+
+    async def send_plain(self, data: dict):
+        await self.ws.send_str(json.dumps(data) + "\u0004")
+
+    async def receive_plain(self) -> dict:
+        msg = await self.ws.receive()
+        return json.loads(msg.data.rstrip("\u0004"))
+
+    def _cipher(self):
+        return AES.new(self.key, AES.MODE_CBC, self.iv)
+
+    def decrypt(self, data: str) -> dict:
+        data = self._cipher().decrypt(b64decode(data)).rstrip(b"\x00")
+        if not data:
+            return {}
+        return json.loads(data.decode())
+
+    async def send(self, data: dict):
+        msg = self._cipher().encrypt(_pad(json.dumps(data).encode()))
+        await self.ws.send_str(b64encode(msg).decode() + "\u0004")
+
+    async def send_message(self, message_type: Messages, payload: dict):
+        self.mc += 1
+        await self.send({"type_int": int(message_type), "mc": self.mc, "payload": payload})
+
+    async def receive(self) -> dict:
+        msg = await self.ws.receive()
+        return self.decrypt(msg.data)
+
+    async def handshake(self) -> bool:
+        sim = self.simulator
+        connection_id = secrets.token_hex(8)
+
+        await self.send_plain(
+            {
+                "type_int": Messages.CONNECTION_START,
+                "mc": -1,
+                "payload": {"device_id": sim.device_id, "connection_id": connection_id},
+            }
+        )
+
+        msg = await self.receive_plain()
+        if msg.get("type_int") != Messages.CONNECTION_CONFIRM:
+            return False
+        await self.send_plain({"type_int": Messages.CONNECTION_ESTABLISHED, "mc": -1, "payload": {}})
+
+        msg = await self.receive_plain()
+        if msg.get("type_int") != Messages.SC_INIT:
+            return False
+        await self.send_plain(
+            {
+                "type_int": Messages.SC_PUBKEY,
+                "mc": -1,
+                "payload": {"public_key": sim.public_key},
+            }
+        )
+
+        msg = await self.receive_plain()
+        if msg.get("type_int") != Messages.SC_SECRET:
+            return False
+        secret = PKCS1_v1_5.new(sim.rsa).decrypt(b64decode(msg["payload"]["secret"]), None)
+        key, iv = secret.decode().split(":::")
+        self.key = bytes.fromhex(key)
+        self.iv = bytes.fromhex(iv)
+        await self.send({"type_int": Messages.SC_ESTABLISHED, "mc": -1})
+
+        msg = await self.receive()
+        payload = msg.get("payload", {})
+        if msg.get("type_int") == Messages.AUTH_APPLY_TOKEN:
+            # Resuming with the token of an earlier login
+            valid = payload.get("token") in sim.tokens
+            await self.send(
+                {
+                    "type_int": Messages.AUTH_APPLY_TOKEN_RESPONSE,
+                    "mc": -1,
+                    "payload": {"valid": valid, "remaining": TOKEN_LIFETIME if valid else 0},
+                }
+            )
+            if valid:
+                sim.resumes += 1
+            return valid
+
+        expected = auth_hash(
+            sim.device_id.encode(), sim.auth_key.encode(), payload.get("salt", "").encode()
+        )
+        if msg.get("type_int") != Messages.AUTH_LOGIN or payload.get("password") != expected:
+            await self.send({"type_int": Messages.AUTH_LOGIN_DENIED, "mc": -1, "payload": {}})
+            return False
+
+        sim.logins += 1
+        token = secrets.token_hex(16)
+        sim.tokens.add(token)
+        await self.send({"type_int": Messages.AUTH_LOGIN_SUCCESS, "mc": -1, "payload": {"token": token}})
+
+        while True:
+            msg = await self.receive()
+            message_type = msg.get("type_int")
+            if message_type == Messages.AUTH_APPLY_TOKEN:
+                await self.send(
+                    {
+                        "type_int": Messages.AUTH_APPLY_TOKEN_RESPONSE,
+                        "mc": -1,
+                        "payload": {"valid": True, "remaining": TOKEN_LIFETIME},
+                    }
+                )
+                # The client applies the renewed token last, then starts pumping.
+                if token != msg["payload"]["token"]:
+                    return False
+                if self.ready:
+                    return True
+            elif message_type == Messages.AUTH_RENEW_TOKEN:
+                token = secrets.token_hex(16)
+                sim.tokens.add(token)
+                self.ready = True
+                await self.send(
+                    {"type_int": Messages.AUTH_RENEW_TOKEN_RESPONSE, "mc": -1, "payload": {"token": token}}
+                )
+            else:
+                return False
+
+    async def serve(self):
+        async for msg in self.ws:
+            if msg.type != WSMsgType.TEXT:
+                break
+            message = self.decrypt(msg.data)
+            if "mc" in message and message["mc"] >= 0:
+                await self.send({"type_int": Messages.ACK, "ref": message["mc"]})
+            if "payload" in message:
+                await self.simulator.handle_message(self, message["type_int"], message["payload"])
+
+
+class BridgeSimulator:
+    """In-process websocket server emulating an xComfort bridge."""
+
+    def __init__(
+        self,
+        lights: int = 10,
+        shades: int = 0,
+        rc_touches: int = 0,
+        rooms: int = 1,
+        auth_key: str = DEFAULT_AUTH_KEY,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: int | None = None,
+        chunk_size: int = 100,
+        shade_travel_time: float = 0.0,
+    ):
+        self.auth_key = auth_key
+        self.host = host
+        self.port = port
+        self.device_id = secrets.token_hex(8)
+        self.chunk_size = chunk_size
+        # Seconds shades take to travel all the way. With 0 they report their new position at once
+        self.shade_travel_time = shade_travel_time
+        self._shade_moves: dict[int, tuple[int, int, float, asyncio.Task]] = {}
+        self.random = random.Random(seed)
+
+        self.rsa = RSA.generate(2048)
+        self.public_key = self.rsa.publickey().export_key().decode()
+
+        self.devices: dict[int, dict] = {}
+        self.comps: dict[int, dict] = {}
+        self.rooms: dict[int, dict] = {}
+        self.received: list[tuple[int, dict]] = []
+        self.sessions: list[SimulatedSession] = []
+        # Login tokens issued, which clients can resume with, and how often they logged in or resumed
+        self.tokens: set[str] = set()
+        self.logins = 0
+        self.resumes = 0
+
+        self._runner = None
+        self._build_topology(lights, shades, rc_touches, rooms)
+
+    def _build_topology(self, lights: int, shades: int, rc_touches: int, rooms: int):
+        room_ids = list(range(1, rooms + 1))
+        for room_id in room_ids:
+            self.rooms[room_id] = {
+                "roomId": room_id,
+                "name": f"Room {room_id}",
+                "devices": [],
+                "temp": None,
+                "humidity": None,
+                "power": 0.0,
+                "setpoint": None,
+                "currentMode": 3,
+                "mode": 3,
+                "state": 0,
+            }
+
+        device_id = 0
+        comp_id = 0
+
+        def place(device):
+            if room_ids:
+                room = self.rooms[room_ids[device["deviceId"] % len(room_ids)]]
+                room["devices"].append(device["deviceId"])
+
+        for i in range(lights):
+            device_id += 1
+            comp_id += 1
+            dimmable = i % 2 == 0
+            self.comps[comp_id] = {"compId": comp_id, "compType": 17, "name": f"Actuator {comp_id}"}
+            device = {
+                "deviceId": device_id,
+                "name": f"Light {device_id}",
+                "devType": DEVTYPE_DIMMER if dimmable else DEVTYPE_SWITCH,
+                "compId": comp_id,
+                "dimmable": dimmable,
+                "switch": False,
+                "dimmvalue": 0 if dimmable else 99,
+                "power": 10.0 * (1 + i % 6),
+            }
+            self.devices[device_id] = device
+            place(device)
+
+        for i in range(shades):
+            device_id += 1
+            comp_id += 1
+            self.comps[comp_id] = {
+                "compId": comp_id,
+                "compType": COMPTYPE_SHADE_ACTUATOR,
+                "name": f"Shade actuator {comp_id}",
+            }
+            device = {
+                "deviceId": device_id,
+                "name": f"Shade {device_id}",
+                "devType": DEVTYPE_SHADE,
+                "compId": comp_id,
+                "shRuntime": 1 if i % 2 == 0 else 0,
+                "shPos": 0,
+                "curstate": ShadeOperationState.STOP,
+                "shSafety": 0,
+            }
+            self.devices[device_id] = device
+            place(device)
+
+        for i in range(rc_touches):
+            device_id += 1
+            comp_id += 1
+            self.comps[comp_id] = {"compId": comp_id, "compType": COMPTYPE_RC_TOUCH, "name": f"RC Touch {comp_id}"}
+            device = {
+                "deviceId": device_id,
+                "name": f"RC Touch {device_id}",
+                "devType": DEVTYPE_RC_TOUCH,
+                "compId": comp_id,
+                "info": [
+                    {"text": "1222", "value": "21.0"},
+                    {"text": "1223", "value": "45.0"},
+                ],
+            }
+            self.devices[device_id] = device
+            if room_ids:
+                room = self.rooms[room_ids[i % len(room_ids)]]
+                room.update(
+                    {
+                        "temp": 21.0,
+                        "humidity": 45.0,
+                        "setpoint": 21.0,
+                        "modes": [
+                            {"mode": 1, "value": 16.0},
+                            {"mode": 2, "value": 18.0},
+                            {"mode": 3, "value": 21.0},
+                        ],
+                    }
+                )
+
+    @property
+    def address(self) -> str:
+        """Host and port to pass as the ip address of `Bridge`."""
+        return f"{self.host}:{self.port}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/", self._handle_websocket)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        _LOGGER.info(f"Simulated bridge listening on {self.address}")
+
+    async def stop(self):
+        for *_, task in self._shade_moves.values():
+            task.cancel()
+        self._shade_moves.clear()
+        for session in list(self.sessions):
+            await session.ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> BridgeSimulator:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def disconnect_all(self):
+        """Drop every client connection, as a bridge reboot would."""
+        for session in list(self.sessions):
+            await session.ws.close()
+
+    def revoke_tokens(self):
+        """Forget every login token issued, as a factory reset or a new auth key would."""
+        self.tokens.clear()
+
+    async def _handle_websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        session = SimulatedSession(self, ws)
+        try:
+            if await session.handshake():
+                self.sessions.append(session)
+                await session.serve()
+        except (ConnectionError, ValueError, KeyError) as e:
+            _LOGGER.info(f"Simulated session ended: {e!r}")
+        finally:
+            if session in self.sessions:
+                self.sessions.remove(session)
+            await ws.close()
+        return ws
+
+    def _device_state(self, device: dict) -> dict:
+        state = {"deviceId": device["deviceId"]}
+        if device["devType"] in (DEVTYPE_SWITCH, DEVTYPE_DIMMER):
+            state.update(switch=device["switch"], dimmvalue=device["dimmvalue"])
+        elif device["devType"] == DEVTYPE_SHADE:
+            state.update(shPos=device["shPos"], curstate=device["curstate"], shSafety=device["shSafety"])
+        elif device["devType"] == DEVTYPE_RC_TOUCH:
+            state.update(info=device["info"])
+        return state
+
+    def _room_state(self, room: dict) -> dict:
+        state = {k: v for k, v in room.items() if k not in ("name", "devices")}
+        state["power"] = sum(
+            self.devices[d].get("power", 0.0)
+            for d in room["devices"]
+            if self.devices[d].get("switch")
+        )
+        room["power"] = state["power"]
+        return state
+
+    async def _send_all_data(self, session: SimulatedSession):
+        devices = list(self.devices.values())
+        comps = list(self.comps.values())
+        chunks = [devices[i : i + self.chunk_size] for i in range(0, len(devices), self.chunk_size)]
+
+        await session.send_message(Messages.SET_ALL_DATA, {"comps": comps})
+        for chunk in chunks:
+            await session.send_message(Messages.SET_ALL_DATA, {"devices": chunk})
+        await session.send_message(
+            Messages.SET_ALL_DATA,
+            {
+                "rooms": [
+                    dict(self._room_state(r), name=r["name"], devices=list(r["devices"]))
+                    for r in self.rooms.values()
+                ],
+                "roomHeating": [self._room_state(r) for r in self.rooms.values()],
+                "lastItem": True,
+            },
+        )
+
+    async def handle_message(self, session: SimulatedSession, message_type: int, payload: dict):
+        self.received.append((message_type, payload))
+
+        if message_type == Messages.INITIAL_DATA:
+            await self._send_all_data(session)
+            return
+
+        items = []
+        if message_type == Messages.ACTION_SWITCH_DEVICE:
+            items = self._apply_device(payload["deviceId"], switch=payload["switch"])
+        elif message_type == Messages.ACTION_SLIDE_DEVICE:
+            value = payload["dimmvalue"]
+            items = self._apply_device(payload["deviceId"], switch=value > 0, dimmvalue=value)
+        elif message_type == Messages.ACTION_SWITCH_ROOM:
+            for device_id in self.rooms[payload["roomId"]]["devices"]:
+                if self.devices[device_id]["devType"] in (DEVTYPE_SWITCH, DEVTYPE_DIMMER):
+                    items += self._apply_device(device_id, switch=payload["switch"])
+        elif message_type == Messages.ACTION_SLIDE_ROOM:
+            value = payload["dimmvalue"]
+            for device_id in self.rooms[payload["roomId"]]["devices"]:
+                if self.devices[device_id]["devType"] == DEVTYPE_DIMMER:
+                    items += self._apply_device(device_id, switch=value > 0, dimmvalue=value)
+        elif message_type == Messages.SET_DEVICE_SHADING_STATE:
+            items = self._apply_shade(payload)
+        elif message_type == Messages.SET_HEATING_STATE:
+            room = self.rooms[payload["roomId"]]
+            room.update(mode=payload["mode"], currentMode=payload["mode"], setpoint=payload["setpoint"])
+            items = [self._room_state(room)]
+
+        if items:
+            await self.broadcast(items)
+
+    def _apply_device(self, device_id: int, **changes) -> list[dict]:
+        device = self.devices[device_id]
+        if not device.get("dimmable"):
+            changes.pop("dimmvalue", None)
+        device.update(changes)
+        items = [self._device_state(device)]
+        for room in self.rooms.values():
+            if device_id in room["devices"]:
+                items.append(self._room_state(room))
+        return items
+
+    def _apply_shade(self, payload: dict) -> list[dict]:
+        if self.shade_travel_time:
+            return self._start_shade_move(payload)
+        device = self.devices[payload["deviceId"]]
+        state = payload["state"]
+        if state == ShadeOperationState.OPEN:
+            device["shPos"] = 0
+        elif state == ShadeOperationState.CLOSE:
+            device["shPos"] = 100
+        elif state == ShadeOperationState.GO_TO:
+            device["shPos"] = payload["value"]
+        device["curstate"] = state
+        return [self._device_state(device)]
+
+    def _start_shade_move(self, payload: dict) -> list[dict]:
+        """Reports the shade moving, and its position once it would get there,
+        or where it is when stopped."""
+        device_id = payload["deviceId"]
+        device = self.devices[device_id]
+        state = payload["state"]
+        if device_id in self._shade_moves:
+            start, target, started, task = self._shade_moves.pop(device_id)
+            task.cancel()
+            travelled = (time.monotonic() - started) / self.shade_travel_time * 100
+            device["shPos"] = round(min(target, start + travelled) if target > start else max(target, start - travelled))
+
+        target = {
+            ShadeOperationState.OPEN: 0,
+            ShadeOperationState.CLOSE: 100,
+            ShadeOperationState.GO_TO: payload.get("value"),
+        }.get(state)
+        if target is None or target == device["shPos"]:
+            device["curstate"] = ShadeOperationState.STOP
+            return [self._device_state(device)]
+
+        device["curstate"] = state
+        delay = abs(target - device["shPos"]) / 100 * self.shade_travel_time
+        task = asyncio.create_task(self._finish_shade_move(device, target, delay))
+        self._shade_moves[device_id] = (device["shPos"], target, time.monotonic(), task)
+        return [self._device_state(device)]
+
+    async def _finish_shade_move(self, device: dict, target: int, delay: float):
+        await asyncio.sleep(delay)
+        del self._shade_moves[device["deviceId"]]
+        device.update(shPos=target, curstate=ShadeOperationState.STOP)
+        await self.broadcast([self._device_state(device)])
+
+    async def broadcast(self, items: list[dict]):
+        """Push a SET_STATE_INFO message with `items` to every connected client."""
+        for session in list(self.sessions):
+            await session.send_message(Messages.SET_STATE_INFO, {"item": items})
+
+    def random_update(self) -> list[dict]:
+        """Mutate one random device and return the resulting state items."""
+        device = self.random.choice(list(self.devices.values()))
+        if device["devType"] in (DEVTYPE_SWITCH, DEVTYPE_DIMMER):
+            switch = not device["switch"]
+            dimmvalue = self.random.randint(1, 99) if switch else 0
+            return self._apply_device(device["deviceId"], switch=switch, dimmvalue=dimmvalue)
+        if device["devType"] == DEVTYPE_SHADE:
+            return self._apply_shade(
+                {"deviceId": device["deviceId"], "state": ShadeOperationState.GO_TO, "value": self.random.randint(0, 100)}
+            )
+        temperature = round(self.random.uniform(17.0, 25.0), 1)
+        device["info"] = [
+            {"text": "1222", "value": str(temperature)},
+            {"text": "1223", "value": str(round(self.random.uniform(30.0, 60.0), 1))},
+        ]
+        return [self._device_state(device)]
+
+    async def storm(self, count: int, batch: int = 1, interval: float = 0.0):
+        """Send `count` random state changes, `batch` items per message.
+
+        `interval` seconds are waited between messages; 0 sends back to back.
+        """
+        sent = 0
+        while sent < count:
+            items = []
+            for _ in range(min(batch, count - sent)):
+                items += self.random_update()
+                sent += 1
+            await self.broadcast(items)
+            if interval:
+                await asyncio.sleep(interval)
+            else:
+                await asyncio.sleep(0)
+
+    async def replay(self, script: Iterable[tuple[float, list[dict]]]):
+        """Replay a scripted storm.
+
+        `script` yields `(delay, items)` pairs; each entry waits `delay` seconds and
+        then broadcasts `items` as one SET_STATE_INFO message.
+        """
+        for delay, items in script:
+            if delay:
+                await asyncio.sleep(delay)
+            await self.broadcast(items)
+
+
+async def _main(args):
+    simulator = BridgeSimulator(
+        lights=args.lights,
+        shades=args.shades,
+        rc_touches=args.rc_touches,
+        rooms=args.rooms,
+        auth_key=args.auth_key,
+        host=args.host,
+        port=args.port,
+        seed=args.seed,
+        shade_travel_time=args.shade_travel_time,
+    )
+    async with simulator:
+        print(f"Simulated bridge on {simulator.address}, auth key '{simulator.auth_key}'")
+        while True:
+            await asyncio.sleep(args.storm_interval or 3600)
+            if args.storm_interval:
+                await simulator.storm(args.storm_size, batch=args.storm_batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--auth-key", default=DEFAULT_AUTH_KEY)
+    parser.add_argument("--lights", type=int, default=10)
+    parser.add_argument("--shades", type=int, default=0)
+    parser.add_argument(
+        "--shade-travel-time", type=float, default=0.0, help="Seconds shades take to travel all the way, 0 moves at once"
+    )
+    parser.add_argument("--rc-touches", type=int, default=0)
+    parser.add_argument("--rooms", type=int, default=1)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--storm-interval", type=float, default=0.0, help="Seconds between random storms, 0 disables")
+    parser.add_argument("--storm-size", type=int, default=50)
+    parser.add_argument("--storm-batch", type=int, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()